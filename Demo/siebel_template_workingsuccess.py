@@ -8,12 +8,17 @@ Robust Siebel replay script with:
 - Page/Frame-safe helpers to avoid AttributeError: 'Page' object has no attribute 'page'
 """
 import json
+import sys
 import time
 import re
 import traceback
 from pathlib import Path
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout, expect
 
+# shared helpers live at the repo root; this script is run from Demo/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from siebel_activity import page_activity, wait_until_quiet
+
 # -------- Config ----------
 ACTIONS_FILE = "recorded_test_SR.json"
 CONFIG_FILE = "config_workingsuccess.json"
@@ -23,6 +28,9 @@ RETRY_COUNT = 6
 RETRY_DELAY = 0.8
 HOME_STABLE_SECONDS = 3
 HOME_MAX_WAIT = 60
+PICK_FAST_PATH = True      # single-query pick applet engine; False = original frame walk
+HOME_READY_MODE = "event"  # "event": navigation/network quiet + no busy indicator; "legacy": URL-stability polling
+HOME_QUIET_MS = 300        # event mode: no activity for this long means ready
 # ------------------------
 
 # ---------- NEW: helpers for Pick Applet ----------
@@ -153,19 +161,21 @@ def click_ok_in_dialog(dialog_loc):
 
 def pick_applet_select(page, action):
     """
-    Generic pick applet flow:
+    Generic pick applet flow (fast path first, see pick_applet_fast):
     - find the dialog in the swepi frame
     - pick cell by text/title/name (from action: pickValue/value/text/name)
     - click/dblclick, or click + OK
     - returns True on success
     """
+    if PICK_FAST_PATH:
+        ok, timings = pick_applet_fast(page, action)
+        PICK_STATS.append(timings)
+        if ok is not None:
+            return ok
+        print("  ⤷ fast path did not complete the pick; falling back to the frame walk")
+
     # Candidate target from action
-    target = None
-    for key in ("pickValue", "value", "text", "name"):
-        v = action.get(key)
-        if isinstance(v, str) and v.strip() and "{{" not in v:
-            target = v.strip()
-            break
+    target = _pick_target(action)
 
     frame = siebel_main_frame(page)
     dialog = visible_pick_dialog(frame)
@@ -233,6 +243,138 @@ def pick_applet_select(page, action):
         print("  ⚠ pick_applet_select: interaction failed after click/dblclick/OK attempts.")
         return False
 
+# ---------- Pick Applet fast path ----------
+PICK_APPEAR_MS = 3000   # how long the dialog may take to open
+PICK_CLOSE_MS = 4000    # per interaction, the legacy flow's budget (resolves as soon as the dialog closes)
+
+# Evaluated per frame: find the topmost visible pick dialog, the target cell and the
+# OK button in one pass and tag them so they can be clicked through plain locators.
+PICK_LOCATE_JS = """
+([target, token]) => {
+  const vis = el => { const r = el.getBoundingClientRect();
+                      return r.width > 0 && r.height > 0 && getComputedStyle(el).visibility !== 'hidden'; };
+  const dialogs = Array.from(document.querySelectorAll(".ui-dialog, [role='dialog'], .siebui-dialog")).filter(vis);
+  if (!dialogs.length) return null;
+  const dlg = dialogs[dialogs.length - 1];
+  const cells = Array.from(dlg.querySelectorAll('td[role="gridcell"]')).filter(vis);
+  const txt = c => (c.innerText || c.textContent || '').trim();
+  let cell = null, how = null;
+  if (target) {
+    const pick = (h, f) => { if (!cell) { cell = cells.find(f) || null; if (cell) how = h; } };
+    pick('name', c => (c.getAttribute('aria-label') || '').trim() === target);
+    pick('title', c => c.getAttribute('title') === target);
+    pick('text', c => txt(c) === target);
+    pick('contains', c => txt(c).includes(target));
+  }
+  if (!cell) { cell = cells.find(c => txt(c)) || null; how = cell ? 'first' : null; }
+  if (!cell) { cell = Array.from(dlg.querySelectorAll('td')).find(vis) || null; how = cell ? 'first-td' : null; }
+  const ok = Array.from(dlg.querySelectorAll("button, [aria-label='OK']"))
+    .find(b => vis(b) && (b.getAttribute('title') === 'OK' || b.getAttribute('aria-label') === 'OK' || txt(b) === 'OK'));
+  dlg.setAttribute('data-dd-pick', token + '-dialog');
+  if (cell) cell.setAttribute('data-dd-pick', token + '-cell');
+  if (ok) ok.setAttribute('data-dd-pick', token + '-ok');
+  return {how, ok: !!ok};
+}
+"""
+
+PICK_STATS = []   # one {phase: ms} dict per pick, summarized at the end of run_all
+
+def _pick_target(action):
+    for key in ("pickValue", "value", "text", "name"):
+        v = action.get(key)
+        if isinstance(v, str) and v.strip() and "{{" not in v:
+            return v.strip()
+    return None
+
+def _visible(frame, sel):
+    try:
+        return frame.locator(sel).is_visible()
+    except Exception:
+        return False
+
+def _closed(frame, dialog_sel):
+    """Wait (event-driven) for the tagged dialog to hide/detach; True if it did."""
+    try:
+        frame.locator(dialog_sel).wait_for(state="hidden", timeout=PICK_CLOSE_MS)
+        return True
+    except Exception:
+        return False
+
+def pick_applet_fast(page, action):
+    """
+    Pick applet in a handful of round-trips: one evaluate per frame locates the
+    dialog, target cell and OK button together. With an OK button the cell click
+    and OK go back to back (no close wait in between); without one the cell click
+    alone is tried. Either is followed by waiting for the dialog to close, which
+    resolves the moment it does, and dblclick on the cell is the fallback while
+    the dialog is still open. Returns (ok, timings_ms); ok is None when no dialog
+    was found or it did not close, so the caller runs the legacy flow.
+    """
+    t0 = time.perf_counter()
+    timings = {}
+    target = _pick_target(action)
+    token = f"dd{int(t0 * 1000) % 10**9}"
+    frame, found = None, None
+    deadline = t0 + PICK_APPEAR_MS / 1000.0
+    while found is None:
+        for f in page.frames:
+            try:
+                found = f.evaluate(PICK_LOCATE_JS, [target, token])
+            except Exception:
+                continue
+            if found:
+                frame = f
+                break
+        if found or time.perf_counter() >= deadline:
+            break
+        page.wait_for_timeout(100)
+    timings["locate"] = (time.perf_counter() - t0) * 1000
+    if not found:
+        return None, timings
+    if not found.get("how"):
+        print("  ⚠ pick_applet_fast: dialog has no clickable grid cell.")
+        return None, timings
+
+    dialog_sel = f"[data-dd-pick='{token}-dialog']"
+    cell = frame.locator(f"[data-dd-pick='{token}-cell']")
+
+    def click_then_ok():
+        # select and confirm back to back; the close is awaited once, after OK
+        cell.click(timeout=PICK_CLOSE_MS)
+        if _visible(frame, dialog_sel):
+            frame.locator(f"[data-dd-pick='{token}-ok']").click(timeout=PICK_CLOSE_MS)
+
+    if found.get("ok"):
+        steps = [("click_ok", click_then_ok)]
+    else:
+        steps = [("click", lambda: cell.click(timeout=PICK_CLOSE_MS))]
+    steps.append(("dblclick", lambda: cell.dblclick(timeout=PICK_CLOSE_MS)))
+    ok = None
+    for name, act in steps:
+        t = time.perf_counter()
+        if name == "dblclick" and not _visible(frame, dialog_sel):
+            ok = True   # closed just as the previous wait gave up
+            break
+        try:
+            act()
+        except Exception:
+            pass
+        closed = _closed(frame, dialog_sel)
+        timings[name] = (time.perf_counter() - t) * 1000
+        if closed:
+            ok = True
+            break
+    timings["total"] = (time.perf_counter() - t0) * 1000
+    print(f"  [PickApplet] cell via {found['how']}; " + ", ".join(f"{k} {v:.0f}ms" for k, v in timings.items()))
+    return ok, timings
+
+def pick_stats_summary():
+    if not PICK_STATS:
+        return
+    phases = sorted({k for t in PICK_STATS for k in t})
+    avg = ", ".join(f"{k} {sum(t.get(k, 0) for t in PICK_STATS) / len(PICK_STATS):.0f}ms" for k in phases)
+    print(f"Pick applets: {len(PICK_STATS)} picks, avg per phase: {avg}")
+
 # ---------- existing helpers ----------
 def load_config():
     with open(CONFIG_FILE, "r", encoding="utf-8") as f:
@@ -462,7 +604,19 @@ def current_frame_urls(page):
     except Exception:
         return page.url or "", tuple()
 
-def wait_for_home_ready(page, max_wait=HOME_MAX_WAIT, stable_seconds=HOME_STABLE_SECONDS):
+def wait_for_home_ready(page, max_wait=HOME_MAX_WAIT, stable_seconds=HOME_STABLE_SECONDS, quiet_ms=HOME_QUIET_MS):
+    """
+    Return True once no navigation / network activity happened for `quiet_ms`
+    and no frame is loading or showing a Siebel busy indicator; False on timeout.
+    The quiet window starts no earlier than the call, so a navigation triggered
+    by the preceding click is not missed. HOME_READY_MODE = "legacy" restores
+    the URL-stability polling (which uses `stable_seconds`).
+    """
+    if HOME_READY_MODE != "event":
+        return _wait_for_home_ready_polling(page, max_wait, stable_seconds)
+    return wait_until_quiet(page, max_wait, quiet_ms)
+
+def _wait_for_home_ready_polling(page, max_wait=HOME_MAX_WAIT, stable_seconds=HOME_STABLE_SECONDS):
     """
     Wait until the page/frame URLs are stable for `stable_seconds` consecutively OR a known Siebel app element appears.
     Return True if ready, False if timeout.
@@ -561,6 +715,7 @@ def run_all():
         browser = pw.chromium.launch(headless=False, args=["--ignore-certificate-errors"])
         context = browser.new_context(ignore_https_errors=True)
         page = context.new_page()
+        page_activity(page)  # start tracking navigation/network for readiness
 
         # --- navigate to login page ---
         login_action = next((a for a in actions if a.get("type") == "fill" and a.get("selector") == "#s_swepi_1"), None)
@@ -645,7 +800,8 @@ def run_all():
                         save_debug(page, "goto_fail")
                 else:
                     print(f"Skipping noisy/irrelevant goto: {url}")
-                time.sleep(1)
+                if HOME_READY_MODE != "event":
+                    time.sleep(1)
                 continue
 
             if not sel and a_type != "goto":
@@ -663,7 +819,8 @@ def run_all():
                 else:
                     print("Navigation attempt failed; saving debug artifacts.")
                     save_debug(page, f"tab_fail_{idx}")
-                page.wait_for_timeout(1000)
+                if HOME_READY_MODE != "event":
+                    page.wait_for_timeout(1000)
                 continue
 
             # ----- NEW: Detect & handle Pick Applet clicks generically -----
@@ -724,6 +881,7 @@ def run_all():
 
             time.sleep(0.5)
 
+        pick_stats_summary()
         print("\n✅ Replay completed. Browser remains open for 5 minutes for manual checks.")
         page.wait_for_timeout(5 * 60 * 1000)
         browser.close()
@@ -0,0 +1,219 @@
+# browser_server.py
+"""
+Warm browser pool shared by the runners (runtest.py, siebel_template.py,
+runtest_data_driven_template.py / _async.py).
+
+Launching Chromium costs seconds on every CI job. Start the pool once per agent:
+
+    python browser_server.py                  # 2 headless browsers
+    python browser_server.py --browsers 4 --headed
+
+It starts Playwright's Chromium with a remote-debugging port per browser, waits
+until each one answers, opens a throwaway context to warm the renderer, and
+writes the endpoints to .browser_endpoints.json next to this file. Dead browsers
+are restarted; Ctrl+C / SIGTERM shuts the pool down and removes the file.
+
+The runners call launch_browser(pw) / launch_browser_async(pw): it attaches over
+CDP (connect_over_cdp) when a pool is running - Python Playwright has no
+launch_server(), so the CDP endpoint is the reusable handle - and falls back to
+launching its own browser otherwise. Closing an attached browser only drops the
+contexts the runner created; the pool's process keeps running.
+
+HEADLESS (env "1"/"0") overrides the default, which is headless under CI
+(CI / JENKINS_URL set) and headed on a desktop.
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import List, Optional
+
+ENDPOINTS_FILE = Path(os.environ.get("BROWSER_ENDPOINTS", Path(__file__).with_name(".browser_endpoints.json")))
+CONNECT_TIMEOUT = 5000   # ms; a stale/unreachable pool falls back to a local launch
+HEALTH_INTERVAL = 5      # seconds between liveness checks in the server loop
+
+def default_headless() -> bool:
+    env = os.environ.get("HEADLESS")
+    if env is not None:
+        return env.lower() in ("1", "true", "yes")
+    return bool(os.environ.get("CI") or os.environ.get("JENKINS_URL"))
+
+# ---------- client side ----------
+
+def _reachable(endpoint: str) -> bool:
+    """Quick probe so a stale endpoints file (pool gone) costs milliseconds, not CONNECT_TIMEOUT.
+    (os.kill(pid, 0) is not a liveness check on Windows - it terminates the process.)"""
+    try:
+        with urllib.request.urlopen(f"{endpoint}/json/version", timeout=0.5):
+            return True
+    except (OSError, ValueError):
+        return False
+
+def pool_endpoint(slot: int = 0) -> Optional[str]:
+    """CDP endpoint for `slot` (round-robin over the pool), or None if no pool is up."""
+    env = os.environ.get("BROWSER_CDP_ENDPOINT")
+    if env:
+        return env
+    try:
+        with open(ENDPOINTS_FILE, "r", encoding="utf-8") as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    endpoints = info.get("endpoints") or []
+    if not endpoints:
+        return None
+    ep = endpoints[slot % len(endpoints)]
+    return ep if _reachable(ep) else None
+
+def launch_browser(pw, slot: int = 0, headless: Optional[bool] = None, **launch_kwargs):
+    """Attach to the warm pool if one is running, else launch Chromium (sync API)."""
+    ep = pool_endpoint(slot)
+    if ep:
+        try:
+            return pw.chromium.connect_over_cdp(ep, timeout=CONNECT_TIMEOUT)
+        except Exception as e:
+            print(f"  [WARN] browser pool at {ep} unreachable ({e}); launching locally")
+    return pw.chromium.launch(headless=default_headless() if headless is None else headless, **launch_kwargs)
+
+async def launch_browser_async(pw, slot: int = 0, headless: Optional[bool] = None, **launch_kwargs):
+    """Coroutine twin of launch_browser for playwright.async_api."""
+    ep = pool_endpoint(slot)
+    if ep:
+        try:
+            return await pw.chromium.connect_over_cdp(ep, timeout=CONNECT_TIMEOUT)
+        except Exception as e:
+            print(f"  [WARN] browser pool at {ep} unreachable ({e}); launching locally")
+    return await pw.chromium.launch(headless=default_headless() if headless is None else headless, **launch_kwargs)
+
+# ---------- server side ----------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class PooledBrowser:
+    def __init__(self, executable: str, headless: bool, extra_args: List[str]):
+        self.executable = executable
+        self.headless = headless
+        self.extra_args = extra_args
+        self.port = 0
+        self.proc: Optional[subprocess.Popen] = None
+        self.profile_dir: Optional[str] = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, pw, timeout: float = 30.0):
+        self.port = _free_port()
+        self.profile_dir = tempfile.mkdtemp(prefix="dd-browser-")
+        args = [
+            self.executable,
+            f"--remote-debugging-port={self.port}",
+            f"--user-data-dir={self.profile_dir}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            "--ignore-certificate-errors",
+            *self.extra_args,
+        ]
+        if self.headless:
+            args.append("--headless=new")
+        args.append("about:blank")
+        self.proc = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"browser exited with code {self.proc.returncode}")
+            try:
+                with urllib.request.urlopen(f"{self.endpoint}/json/version", timeout=1):
+                    break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            raise RuntimeError(f"browser did not open its debugging port within {timeout}s")
+        # warm-up: first context/page creation pays for renderer start-up and caches
+        browser = pw.chromium.connect_over_cdp(self.endpoint)
+        ctx = browser.new_context()
+        ctx.new_page().goto("about:blank")
+        ctx.close()
+        browser.close()
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def stop(self):
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        if self.profile_dir:
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+def _write_endpoints(pool: List[PooledBrowser], headless: bool):
+    tmp = ENDPOINTS_FILE.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"pid": os.getpid(), "headless": headless, "endpoints": [b.endpoint for b in pool]}, f, indent=2)
+    os.replace(tmp, ENDPOINTS_FILE)
+
+def serve(n_browsers: int, headless: bool, extra_args: List[str]):
+    from playwright.sync_api import sync_playwright
+
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    with sync_playwright() as pw:
+        exe = pw.chromium.executable_path
+        pool = [PooledBrowser(exe, headless, extra_args) for _ in range(n_browsers)]
+        try:
+            for b in pool:
+                b.start(pw)
+            _write_endpoints(pool, headless)
+            print(f"Browser pool ready ({'headless' if headless else 'headed'}): {', '.join(b.endpoint for b in pool)}")
+            print(f"Endpoints written to {ENDPOINTS_FILE}; Ctrl+C to stop")
+            while not stopping:
+                time.sleep(HEALTH_INTERVAL)
+                restarted = False
+                for b in pool:
+                    if not b.alive():
+                        print(f"  [WARN] browser on {b.endpoint} died; restarting")
+                        b.stop()
+                        b.start(pw)
+                        restarted = True
+                if restarted:
+                    _write_endpoints(pool, headless)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            try:
+                ENDPOINTS_FILE.unlink()
+            except OSError:
+                pass
+            for b in pool:
+                b.stop()
+            print("Browser pool stopped")
+
+def main():
+    ap = argparse.ArgumentParser(description="Keep pre-warmed Chromium instances for the test runners.")
+    ap.add_argument("--browsers", type=int, default=int(os.environ.get("BROWSER_POOL_SIZE", "2")))
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--headless", dest="headless", action="store_true", default=None)
+    mode.add_argument("--headed", dest="headless", action="store_false")
+    ap.add_argument("--arg", action="append", default=[], help="extra Chromium command-line switch (repeatable)")
+    args = ap.parse_args()
+    # the pool itself is headless unless asked otherwise (it usually runs on a CI agent)
+    if args.headless is None:
+        args.headless = os.environ.get("HEADLESS", "1").lower() in ("1", "true", "yes")
+    headless = args.headless
+    serve(max(1, args.browsers), headless, args.arg)
+
+if __name__ == "__main__":
+    main()
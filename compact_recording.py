@@ -0,0 +1,128 @@
+# compact_recording.py
+"""
+Dedup / compaction pass for recorder output (recorded_test.json, Demo/recorded_test_SR.json, ...).
+
+The recorder emits a lot of steps that cost a browser round-trip on every replayed
+row but change nothing:
+- focus-only clicks: a click on a field immediately followed by a fill of that field
+- superseded fills: the same field filled again before any click/goto (e.g. "us" then "{{password}}")
+- duplicate gotos: the same URL emitted twice in a row, or a goto emitted by the
+  URL-polling loop in recorder-extension/content.js right after a click already
+  navigated there
+
+Usage:
+    python compact_recording.py recorded_test.json
+    python compact_recording.py Demo/recorded_test_SR.json -o compacted.json --report diff.json
+
+Writes <name>.compact.json and <name>.compact_report.json next to the input by default.
+runtest_data_driven_template.py applies the same pass in memory when COMPACT_ACTIONS is on.
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# content.js polls location.href every 700ms; a goto recorded within this window
+# after a click is the echo of that click's navigation, not a user step.
+GOTO_AFTER_CLICK_MS = 1500
+
+def _page(a: Dict[str, Any]):
+    return a.get("pageUrl") or a.get("url")
+
+def _is_goto(a: Dict[str, Any]) -> bool:
+    return a.get("type") == "goto" or (a.get("type") == "click" and a.get("url") and not a.get("selector"))
+
+def _drop_focus_clicks(items):
+    """click on S immediately followed by fill on S (same page) -> drop the click."""
+    out, removed = [], []
+    for pos, (i, a) in enumerate(items):
+        nxt = items[pos + 1][1] if pos + 1 < len(items) else None
+        if (a.get("type") == "click" and a.get("selector") and not _is_goto(a)
+                and int(a.get("maxClick", 1) or 1) == 1
+                and nxt is not None and nxt.get("type") == "fill"
+                and nxt.get("selector") == a.get("selector")
+                and _page(nxt) == _page(a)):
+            removed.append((i, "focus-only click before fill", a))
+            continue
+        out.append((i, a))
+    return out, removed
+
+def _drop_superseded_fills(items):
+    """fill S followed by another fill S with only fills in between (same page) -> drop the earlier one."""
+    out, removed = [], []
+    for pos, (i, a) in enumerate(items):
+        superseded = False
+        if a.get("type") == "fill" and a.get("selector"):
+            for _, later in items[pos + 1:]:
+                if later.get("type") != "fill" or _page(later) != _page(a):
+                    break
+                if later.get("selector") == a.get("selector"):
+                    superseded = True
+                    break
+        if superseded:
+            removed.append((i, "fill superseded by a later fill of the same field", a))
+            continue
+        out.append((i, a))
+    return out, removed
+
+def _merge_gotos(items):
+    """Drop repeated gotos to the same URL and gotos echoing a click's navigation."""
+    out, removed = [], []
+    for i, a in items:
+        if a.get("type") == "goto" and a.get("url"):
+            prev = out[-1][1] if out else None
+            if prev is not None and prev.get("type") == "goto" and prev.get("url") == a.get("url"):
+                removed.append((i, "duplicate goto", a))
+                continue
+            if (prev is not None and prev.get("type") == "click" and prev.get("selector")
+                    and isinstance(prev.get("timestamp"), (int, float)) and isinstance(a.get("timestamp"), (int, float))
+                    and 0 <= a["timestamp"] - prev["timestamp"] <= GOTO_AFTER_CLICK_MS):
+                removed.append((i, "goto echoing the navigation of the preceding click", a))
+                continue
+        out.append((i, a))
+    return out, removed
+
+def compact_actions(actions: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Return (compacted actions, diff report). The input list is not modified."""
+    items = list(enumerate(actions, start=1))
+    removed = []
+    for rule in (_merge_gotos, _drop_focus_clicks, _drop_superseded_fills):
+        items, dropped = rule(items)
+        removed.extend(dropped)
+    removed.sort(key=lambda r: r[0])
+    report = {
+        "before": len(actions),
+        "after": len(items),
+        "removed": [{"index": i, "reason": reason, "action": a} for i, reason, a in removed],
+    }
+    return [a for _, a in items], report
+
+def main():
+    ap = argparse.ArgumentParser(description="Compact a recorded action JSON file.")
+    ap.add_argument("input", help="recorded actions JSON (list of actions)")
+    ap.add_argument("-o", "--output", help="compacted plan path (default: <input>.compact.json)")
+    ap.add_argument("--report", help="diff report path (default: <input>.compact_report.json)")
+    args = ap.parse_args()
+
+    src = Path(args.input)
+    with open(src, "r", encoding="utf-8") as f:
+        actions = json.load(f)
+    compacted, report = compact_actions(actions)
+    report["source"] = str(src)
+
+    out_path = Path(args.output) if args.output else src.with_suffix(".compact.json")
+    report_path = Path(args.report) if args.report else src.with_suffix(".compact_report.json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(compacted, f, indent=2, ensure_ascii=False)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"{src}: {report['before']} -> {report['after']} actions")
+    for r in report["removed"]:
+        a = r["action"]
+        print(f"  - #{r['index']} {a.get('type')} {a.get('selector') or a.get('url')}: {r['reason']}")
+    print(f"Compacted plan: {out_path}")
+    print(f"Diff report:    {report_path}")
+
+if __name__ == "__main__":
+    main()
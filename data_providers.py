@@ -0,0 +1,154 @@
+# data_providers.py
+"""
+Dataset readers for the data-driven runners.
+
+Every provider yields rows as plain dicts, one at a time, and can project down
+to the columns the action plan actually references (ActionPlan.placeholders), so
+unused columns are never materialized. Values keep their source types (ints,
+floats, NULL -> None); Template.bind() formats them with format_value().
+
+    source                                   provider
+    users.csv / users.csv.gz / users.tsv     CsvProvider
+    rows.jsonl / rows.ndjson (.gz)           JsonlProvider
+    data.db / data.sqlite / data.sqlite3     SqliteProvider (table=... or query=...)
+    data.parquet / data.feather / data.arrow ArrowProvider (needs pyarrow)
+
+open_provider() picks the provider from the file suffix; register_provider()
+adds new ones.
+"""
+import csv
+import gzip
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Set
+
+try:
+    import pyarrow.dataset as pa_ds
+except ImportError:  # optional: only needed for Parquet / Feather / Arrow sources
+    pa_ds = None
+
+def format_value(v: Any) -> str:
+    """String form of a typed value for placeholder substitution."""
+    if v is None:
+        return ""
+    if isinstance(v, bytes):
+        return v.decode("utf-8", "replace")
+    return str(v)
+
+def _suffixes(path: Path) -> str:
+    """'.csv' for users.csv and users.csv.gz alike."""
+    sfx = [s.lower() for s in path.suffixes]
+    if sfx and sfx[-1] == ".gz":
+        sfx = sfx[:-1]
+    return sfx[-1] if sfx else ""
+
+def _open_text(path: Path):
+    if path.suffix.lower() == ".gz":
+        return gzip.open(path, "rt", newline='', encoding="utf-8")
+    return open(path, newline='', encoding="utf-8")
+
+class DataProvider:
+    """Base class: iterate rows as dicts, projected to `columns` when given."""
+    def __init__(self, path: Path, columns: Optional[Iterable[str]] = None, **options):
+        self.path = Path(path)
+        self.columns: Optional[Set[str]] = set(columns) if columns is not None else None
+        self.options = options
+
+    def _project(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        if self.columns is None:
+            return row
+        return {k: v for k, v in row.items() if k in self.columns}
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+class CsvProvider(DataProvider):
+    def __iter__(self):
+        delimiter = "\t" if _suffixes(self.path) == ".tsv" else ","
+        with _open_text(self.path) as f:
+            reader = csv.reader(f, delimiter=delimiter)
+            header = next(reader, None)
+            if header is None:
+                return
+            names = [h.strip() for h in header]
+            keep = [i for i, n in enumerate(names) if self.columns is None or n in self.columns]
+            for rec in reader:
+                yield {names[i]: (rec[i].strip() if i < len(rec) else None) for i in keep}
+
+class JsonlProvider(DataProvider):
+    def __iter__(self):
+        with _open_text(self.path) as f:
+            for line in f:
+                if line.strip():
+                    yield self._project(json.loads(line))
+
+class SqliteProvider(DataProvider):
+    """Rows of `table`, or of an arbitrary `query`; projection is pushed into the SELECT."""
+    BATCH = 500
+
+    def __iter__(self):
+        table, query = self.options.get("table"), self.options.get("query")
+        if not table and not query:
+            raise ValueError(f"{self.path}: SQLite source needs a table or query (DATA_TABLE / DATA_QUERY)")
+        con = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            source = f"({query})" if query else '"' + table.replace('"', '""') + '"'
+            available = [d[0] for d in con.execute(f"SELECT * FROM {source} LIMIT 0").description]
+            cols = [c for c in available if self.columns is None or c in self.columns]
+            if not cols:   # nothing referenced: still one row per record
+                cols_sql = "1"
+                cols = []
+            else:
+                cols_sql = ", ".join('"' + c.replace('"', '""') + '"' for c in cols)
+            cur = con.execute(f"SELECT {cols_sql} FROM {source}")
+            while True:
+                batch = cur.fetchmany(self.BATCH)
+                if not batch:
+                    break
+                for rec in batch:
+                    yield dict(zip(cols, rec))
+        finally:
+            con.close()
+
+class ArrowProvider(DataProvider):
+    """Parquet / Feather / Arrow IPC via pyarrow; only projected columns are read from disk."""
+    FORMATS = {".parquet": "parquet", ".feather": "feather", ".arrow": "ipc", ".ipc": "ipc"}
+    BATCH = 1024
+
+    def __iter__(self):
+        if pa_ds is None:
+            raise ImportError(f"{self.path}: reading {_suffixes(self.path)} data needs pyarrow (pip install pyarrow)")
+        dataset = pa_ds.dataset(str(self.path), format=self.FORMATS[_suffixes(self.path)])
+        names = dataset.schema.names
+        cols = [c for c in names if self.columns is None or c in self.columns]
+        for batch in dataset.to_batches(columns=cols, batch_size=self.BATCH):
+            if cols:
+                yield from batch.to_pylist()
+            else:
+                for _ in range(batch.num_rows):
+                    yield {}
+
+PROVIDERS = {
+    ".csv": CsvProvider,
+    ".tsv": CsvProvider,
+    ".jsonl": JsonlProvider,
+    ".ndjson": JsonlProvider,
+    ".db": SqliteProvider,
+    ".sqlite": SqliteProvider,
+    ".sqlite3": SqliteProvider,
+    ".parquet": ArrowProvider,
+    ".feather": ArrowProvider,
+    ".arrow": ArrowProvider,
+    ".ipc": ArrowProvider,
+}
+
+def register_provider(suffix: str, cls):
+    PROVIDERS[suffix.lower()] = cls
+
+def open_provider(path: Path, columns: Optional[Iterable[str]] = None, **options) -> DataProvider:
+    path = Path(path)
+    cls = PROVIDERS.get(_suffixes(path))
+    if cls is None:
+        raise ValueError(f"No data provider for {path.name}; known: {', '.join(sorted(PROVIDERS))}")
+    return cls(path, columns, **options)
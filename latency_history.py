@@ -0,0 +1,117 @@
+# latency_history.py
+"""
+Historical step latencies -> adaptive timeouts.
+
+Hard-coded WAIT_TIMEOUT / NAV_TIMEOUT are too short on slow environments (false
+failures) and too long on fast ones (a missing element burns the whole budget).
+LatencyHistory keeps the most recent successful latencies per selector and per
+page (fed from actions_log.jsonl `elapsed_ms` / `wait_ms`, or the Siebel latency log) and
+derives a timeout of p99 x TIMEOUT_FACTOR, clamped to [floor, ceil].
+
+Keys:
+    sel:<selector>                       time for a fill/click on that selector
+    wait:<selector>                      time for that selector to become visible
+    page:<scheme://host/path>            time for a navigation to that page
+    <anything else>                      free-form (e.g. "home:<caller>:<page>" for Siebel home readiness)
+
+Until a key has `min_samples` samples the caller's default is used unchanged.
+"""
+import json
+import math
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+TIMEOUT_FACTOR = 1.5
+MIN_SAMPLES = 20
+MAX_SAMPLES = 200   # most recent samples kept per key
+
+def selector_key(selector: Optional[str]) -> Optional[str]:
+    return f"sel:{selector}" if selector else None
+
+def wait_key(selector: Optional[str]) -> Optional[str]:
+    return f"wait:{selector}" if selector else None
+
+def page_key(url: Optional[str]) -> Optional[str]:
+    """Scheme, host and path only - query strings (ids, session tokens) vary per run."""
+    if not url:
+        return None
+    m = re.match(r"^([a-z][a-z0-9+.-]*://[^/?#]+)([^?#]*)", url, re.I)
+    if not m:
+        return None
+    return f"page:{m.group(1).lower()}{m.group(2) or '/'}"
+
+class LatencyHistory:
+    def __init__(self, path: Path, max_samples: int = MAX_SAMPLES):
+        self.path = Path(path)
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._samples = {k: [float(x) for x in v] for k, v in json.load(f).items()}
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def add(self, key: Optional[str], ms: float):
+        if not key or ms is None or ms < 0:
+            return
+        with self._lock:
+            s = self._samples.setdefault(key, [])
+            s.append(round(float(ms), 1))
+            if len(s) > self.max_samples:
+                del s[:len(s) - self.max_samples]
+
+    def ingest(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Add successful actions from actions_log.jsonl-style records; returns how many.
+        A record with an explicit "key" is filed under it as-is; a `wait_ms`
+        phase is also filed under the selector's wait key."""
+        n = 0
+        for rec in records:
+            if rec.get("status") != "OK" or rec.get("elapsed_ms") in (None, ""):
+                continue
+            ms = float(rec["elapsed_ms"])
+            if rec.get("key"):
+                self.add(rec["key"], ms)
+            elif rec.get("type") == "goto" or not rec.get("selector"):
+                self.add(page_key(rec.get("url")), ms)
+            else:
+                self.add(selector_key(rec.get("selector")), ms)
+                if rec.get("wait_ms") not in (None, ""):
+                    # the element-visibility wait alone (the URL pre-wait is nav_ms); elapsed_ms
+                    # also holds act / settle / screenshots
+                    self.add(wait_key(rec["selector"]), float(rec["wait_ms"]))
+            n += 1
+        return n
+
+    def percentile(self, key: Optional[str], q: float = 0.99) -> Optional[float]:
+        with self._lock:
+            s = sorted(self._samples.get(key) or [])
+        if not s:
+            return None
+        return s[min(len(s) - 1, max(0, math.ceil(q * len(s)) - 1))]
+
+    def count(self, key: Optional[str]) -> int:
+        with self._lock:
+            return len(self._samples.get(key) or [])
+
+    def timeout(self, key: Optional[str], default_ms: float, floor_ms: float = 500, ceil_ms: Optional[float] = None,
+                factor: float = TIMEOUT_FACTOR, min_samples: int = MIN_SAMPLES) -> int:
+        """p99 x factor for `key`, clamped to [floor_ms, ceil_ms]; `default_ms` until enough samples."""
+        if self.count(key) < min_samples:
+            return int(default_ms)
+        t = self.percentile(key) * factor
+        if ceil_ms is not None:
+            t = min(t, ceil_ms)
+        return int(max(floor_ms, t))
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with self._lock:
+            data = dict(self._samples)
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+        os.replace(tmp, self.path)
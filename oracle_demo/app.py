@@ -1,39 +1,215 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-import csv, os
+from flask import Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify, g
+from flask import before_render_template, template_rendered
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from contextlib import contextmanager
+import atexit, os, json, secrets, threading, time
+from assets import AssetStore
+from storage import Store
 
 app = Flask(__name__)
 app.secret_key = "change_this_to_a_random_secret_for_prod"
 
-# Load users (username/password)
+# --------- Request tracing ---------
+# The test runners send a W3C traceparent header with every replayed action
+# (see ../tracing.py). Each request is logged as a server span in that trace,
+# with the action as parent, so a slow step can be split into browser time and
+# server time. Only requests that carry a traceparent are logged; their spans
+# are buffered and appended to TRACE_FILE as OTLP/JSON lines in batches.
+TRACING = os.getenv("TRACING", "1") == "1"
+TRACE_FILE = os.getenv("TRACE_FILE", "./traces.otlp.jsonl")
+TRACE_BATCH = 64          # spans per write
+TRACE_FLUSH_SEC = 2.0     # ... or whatever is buffered once this old
+_trace_lock = threading.Lock()
+_trace_buf = []
+_trace_flushed = time.monotonic()
+
+def _flush_traces():
+    global _trace_buf, _trace_flushed
+    with _trace_lock:
+        spans, _trace_buf = _trace_buf, []
+        _trace_flushed = time.monotonic()
+        if not spans:
+            return
+        line = json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "oracle-demo"}}]},
+            "scopeSpans": [{"scope": {"name": "oracle_demo.app"}, "spans": spans}],
+        }]})
+        try:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
+
+atexit.register(_flush_traces)
+
+def _parse_traceparent(header):
+    parts = (header or "").strip().split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        try:
+            int(parts[1], 16), int(parts[2], 16)
+            return parts[1], parts[2]
+        except ValueError:
+            pass
+    return None, None
+
+@app.before_request
+def _trace_start():
+    if not TRACING:
+        return
+    trace_id, parent_id = _parse_traceparent(request.headers.get("traceparent"))
+    if trace_id is None:
+        return   # not part of a traced run (browsing, /metrics scrapes, ...)
+    g.trace = {"traceId": trace_id, "parentSpanId": parent_id,
+               "spanId": secrets.token_hex(8), "start": time.time_ns(), "status": 0}
+
+@app.after_request
+def _trace_response(response):
+    t = g.get("trace")
+    if t:
+        t["status"] = response.status_code
+        response.headers["traceresponse"] = f"00-{t['traceId']}-{t['spanId']}-01"
+    return response
+
+@app.teardown_request
+def _trace_end(exc):
+    t = g.pop("trace", None)
+    if not t:
+        return
+    attrs = {"http.request.method": request.method, "url.path": request.path,
+             "http.route": request.url_rule.rule if request.url_rule else "",
+             "http.response.status_code": t["status"] or 500, "enduser.id": session.get("username", "")}
+    error = exc is not None or (t["status"] or 500) >= 500
+    span = {
+        "traceId": t["traceId"], "spanId": t["spanId"], "name": f"{request.method} {attrs['http.route'] or request.path}",
+        "kind": 2, "startTimeUnixNano": str(t["start"]), "endTimeUnixNano": str(time.time_ns()),
+        "attributes": [{"key": k, "value": {"intValue": str(v)} if isinstance(v, int) else {"stringValue": str(v)}}
+                       for k, v in attrs.items()],
+        "status": {"code": 2, "message": str(exc or "")} if error else {},
+    }
+    span["parentSpanId"] = t["parentSpanId"]
+    with _trace_lock:
+        _trace_buf.append(span)
+        due = len(_trace_buf) >= TRACE_BATCH or time.monotonic() - _trace_flushed >= TRACE_FLUSH_SEC
+    if due:
+        _flush_traces()
+
+# --------- Metrics (Prometheus, scraped from /metrics) ---------
+# Server-side timings, to tell app latency apart from runner overhead when a
+# replay slows down (compare with the runners' uitest_* metrics).
+REQUEST_SECONDS = Histogram("demo_request_duration_seconds", "Request latency per endpoint",
+                            ["method", "endpoint", "status"],
+                            buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+REQUESTS_IN_PROGRESS = Gauge("demo_requests_in_progress", "Requests being handled", ["endpoint"])
+REQUEST_ERRORS = Counter("demo_request_exceptions_total", "Requests that raised", ["endpoint"])
+TEMPLATE_SECONDS = Histogram("demo_template_render_seconds", "Jinja template render time", ["template"],
+                             buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25))
+CSV_SECONDS = Histogram("demo_csv_io_seconds", "Time spent reading / writing the CSV stores", ["file", "op"],
+                        buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+STORE_SECONDS = Histogram("demo_store_seconds", "Time spent in SQLite store calls", ["op"],
+                          buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1))
+
+@contextmanager
+def csv_io(path, op):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        CSV_SECONDS.labels(os.path.basename(path.replace("\\", "/")), op).observe(time.perf_counter() - t0)
+
+@contextmanager
+def store_op(op):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STORE_SECONDS.labels(op).observe(time.perf_counter() - t0)
+
+@app.before_request
+def _metrics_start():
+    g.metrics_endpoint = request.endpoint or "unknown"
+    g.metrics_start = time.perf_counter()
+    REQUESTS_IN_PROGRESS.labels(g.metrics_endpoint).inc()
+
+@app.after_request
+def _metrics_response(response):
+    g.metrics_status = response.status_code
+    return response
+
+@app.teardown_request
+def _metrics_end(exc):
+    start = g.pop("metrics_start", None)
+    if start is None:
+        return
+    endpoint = g.pop("metrics_endpoint")
+    REQUESTS_IN_PROGRESS.labels(endpoint).dec()
+    if exc is not None:
+        REQUEST_ERRORS.labels(endpoint).inc()
+    status = str(g.pop("metrics_status", 500))
+    REQUEST_SECONDS.labels(request.method, endpoint, status).observe(time.perf_counter() - start)
+
+# render time: between Flask's before_render_template and template_rendered signals
+_render_starts = threading.local()
+
+def _on_before_render(sender, template, context, **extra):
+    _render_starts.t0 = time.perf_counter()
+
+def _on_rendered(sender, template, context, **extra):
+    t0 = getattr(_render_starts, "t0", None)
+    if t0 is not None:
+        TEMPLATE_SECONDS.labels(template.name or "unknown").observe(time.perf_counter() - t0)
+        _render_starts.t0 = None
+
+before_render_template.connect(_on_before_render, app)
+template_rendered.connect(_on_rendered, app)
+
+@app.route("/metrics")
+def metrics():
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
+
+# Users (username/password) and profiles (shipping/contact) live in SQLite
+# (see storage.py): a profile save is one UPSERT instead of rewriting the
+# whole profiles CSV, and concurrent registrations cannot clobber each other.
+# The CSVs remain the interchange format - an empty database is seeded from
+# them, and `flask --app app import-csv` / `export-csv` move data either way.
 #USERS_CSV = r"C:\Users\Harshita Paliwal\Documents\oracle_demo\users1.csv"
 USERS_CSV = os.getenv("USERS_CSV", "./users1.csv")
-#PROFILES_CSV = os.getenv("PROFILES_CSV", "./profiles1.csv")
-users = {}
-if os.path.exists(USERS_CSV):
-    with open(USERS_CSV, newline='') as f:
-        r = csv.DictReader(f)
-        for row in r:
-            users[row['username']] = row['password']
-
-# NEW: user profiles (shipping/contact), stored separately to avoid changing your users1.csv
-PROFILES_CSV = r"C:\Users\Harshita Paliwal\Documents\oracle_demo\profiles1.csv"
-profiles = {}  # username -> {username, full_name, address1, address2, city, state, postal, phone}
-
-def _ensure_csv_with_header(path, fieldnames):
-    parent = os.path.dirname(path)
-    if parent and not os.path.exists(parent):
-        os.makedirs(parent, exist_ok=True)
-    if not os.path.exists(path):
-        with open(path, "w", newline="") as f:
-            w = csv.DictWriter(f, fieldnames=fieldnames)
-            w.writeheader()
-
-# Load profiles
-if os.path.exists(PROFILES_CSV):
-    with open(PROFILES_CSV, newline="") as f:
-        r = csv.DictReader(f)
-        for row in r:
-            profiles[row["username"]] = row
+PROFILES_CSV = os.getenv("PROFILES_CSV", r"C:\Users\Harshita Paliwal\Documents\oracle_demo\profiles1.csv")
+DB_PATH = os.getenv("DEMO_DB", "./demo.sqlite3")
+
+store = Store(DB_PATH)
+
+def import_csvs():
+    """Upsert users/profiles from the CSVs (missing files are skipped); returns (users, profiles)."""
+    n_users = n_profiles = 0
+    if os.path.exists(USERS_CSV):
+        with csv_io(USERS_CSV, "read"):
+            n_users = store.import_users_csv(USERS_CSV)
+    if os.path.exists(PROFILES_CSV):
+        with csv_io(PROFILES_CSV, "read"):
+            n_profiles = store.import_profiles_csv(PROFILES_CSV)
+    return n_users, n_profiles
+
+def export_csvs():
+    with csv_io(USERS_CSV, "write"):
+        n_users = store.export_users_csv(USERS_CSV)
+    with csv_io(PROFILES_CSV, "write"):
+        n_profiles = store.export_profiles_csv(PROFILES_CSV)
+    return n_users, n_profiles
+
+if store.user_count() == 0 and store.profile_count() == 0:
+    import_csvs()
+
+@app.cli.command("import-csv")
+def import_csv_command():
+    """Load USERS_CSV / PROFILES_CSV into the database (existing usernames are updated)."""
+    n_users, n_profiles = import_csvs()
+    print(f"Imported {n_users} users from {USERS_CSV}, {n_profiles} profiles from {PROFILES_CSV} into {DB_PATH}")
+
+@app.cli.command("export-csv")
+def export_csv_command():
+    """Write the database back to USERS_CSV / PROFILES_CSV."""
+    n_users, n_profiles = export_csvs()
+    print(f"Exported {n_users} users to {USERS_CSV}, {n_profiles} profiles to {PROFILES_CSV}")
 
 # Products
 PRODUCTS = [
@@ -48,6 +224,29 @@ PRODUCTS = [
 def get_product(pid):
     return next((p for p in PRODUCTS if p["id"] == pid), None)
 
+# Product images are served from /product-image/<id>; templates never inline them.
+# base64 images are decoded here, remote URLs are cached in ASSET_CACHE on first use.
+ASSET_CACHE = os.getenv("ASSET_CACHE", "./asset_cache")
+ASSET_FETCH = os.getenv("ASSET_FETCH", "1") == "1"   # 0 = never go to the network, use what is cached
+ASSET_MAX_AGE = 86400 * 7
+
+assets = AssetStore(ASSET_CACHE, fetch_remote=ASSET_FETCH)
+for _p in PRODUCTS:
+    assets.add(str(_p["id"]), _p["image"])
+
+@app.route("/product-image/<int:pid>")
+def product_image(pid):
+    asset = assets.get(str(pid))
+    if asset is None:
+        return "Not found", 404
+    if asset.data is None:
+        return redirect(asset.remote_url)
+    resp = Response(asset.data, mimetype=asset.mimetype)
+    resp.set_etag(asset.etag)
+    resp.cache_control.public = True
+    resp.cache_control.max_age = ASSET_MAX_AGE
+    return resp.make_conditional(request)
+
 # --------- Existing routes ---------
 
 @app.route("/", methods=["GET", "POST"])
@@ -55,7 +254,9 @@ def login():
     if request.method == "POST":
         username = request.form.get("username","").strip()
         password = request.form.get("password","").strip()
-        if username in users and users[username] == password:
+        with store_op("get_password"):
+            stored = store.get_password(username)
+        if stored is not None and stored == password:
             session['username'] = username
             session['cart'] = []
             flash(f"Welcome, {username}!", "success")
@@ -115,7 +316,7 @@ def logout():
 
 @app.route("/_health")
 def health():
-    return jsonify({"ok": True, "user_count": len(users), "product_count": len(PRODUCTS)})
+    return jsonify({"ok": True, "user_count": store.user_count(), "product_count": len(PRODUCTS)})
 
 # --------- Order flow (added earlier) ---------
 
@@ -134,7 +335,9 @@ def payment():
         return redirect(url_for('login'))
     # NEW: require profile before payment
     uname = session['username']
-    if uname not in profiles:
+    with store_op("get_profile"):
+        has_profile = store.get_profile(uname) is not None
+    if not has_profile:
         flash("Please complete your account details before payment.", "info")
         next_url = url_for('payment')
         return redirect(url_for('account', next=next_url))
@@ -174,17 +377,14 @@ def register():
             flash("Passwords do not match.", "danger")
             return render_template("register.html", username=username)
 
-        if username in users:
+        # existence check and insert are one statement, so two concurrent
+        # registrations of the same name cannot both succeed
+        with store_op("add_user"):
+            created = store.add_user(username, password)
+        if not created:
             flash("Username already exists. Please choose another.", "warning")
             return render_template("register.html", username=username)
 
-        # append to CSV (create header if needed)
-        _ensure_csv_with_header(USERS_CSV, ["username", "password"])
-        with open(USERS_CSV, "a", newline="") as f:
-            w = csv.DictWriter(f, fieldnames=["username", "password"])
-            w.writerow({"username": username, "password": password})
-        users[username] = password
-
         session["username"] = username
         session.setdefault("cart", [])
         flash("Account created and logged in!", "success")
@@ -208,31 +408,17 @@ def account():
             "postal":   request.form.get("postal","").strip(),
             "phone":    request.form.get("phone","").strip(),
         }
-        # persist to CSV (upsert)
-        _ensure_csv_with_header(PROFILES_CSV, ["username","full_name","address1","address2","city","state","postal","phone"])
-
-        # Load all, replace or append, then write back
-        all_rows = []
-        if os.path.exists(PROFILES_CSV):
-            with open(PROFILES_CSV, newline="") as f:
-                r = csv.DictReader(f)
-                for row in r:
-                    if row["username"] != uname:
-                        all_rows.append(row)
-        all_rows.append(data)
-        with open(PROFILES_CSV, "w", newline="") as f:
-            w = csv.DictWriter(f, fieldnames=["username","full_name","address1","address2","city","state","postal","phone"])
-            w.writeheader()
-            w.writerows(all_rows)
-
-        profiles[uname] = data
+        with store_op("upsert_profile"):
+            store.upsert_profile(data)
         flash("Account details saved.", "success")
 
         next_url = request.args.get("next") or url_for("summary")
         return redirect(next_url)
 
     # GET
-    existing = profiles.get(uname, {"full_name":"","address1":"","address2":"","city":"","state":"","postal":"","phone":""})
+    with store_op("get_profile"):
+        existing = store.get_profile(uname)
+    existing = existing or {"full_name":"","address1":"","address2":"","city":"","state":"","postal":"","phone":""}
     next_url = request.args.get("next","")
     return render_template("account.html", profile=existing, next_url=next_url)
 
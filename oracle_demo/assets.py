@@ -0,0 +1,121 @@
+# assets.py
+"""
+Product images as cacheable static assets.
+
+PRODUCTS mixes remote image URLs with inline data:image/...;base64 URIs, and
+every /products, /cart and /summary render used to ship the base64 blobs in the
+HTML. AssetStore resolves each image once:
+
+    data:<mime>;base64,...   decoded at startup, kept in memory
+    http(s)://...            on the first request: read from ASSET_CACHE, or
+                             downloaded into it in the background (never at
+                             startup or inside a request), reused on later
+                             starts, so replays also run offline
+
+and app.py serves them from /product-image/<id> with a strong ETag and a
+long Cache-Control max-age, so a browser context fetches each image at most
+once and revalidations are answered with 304. A remote image that is not cached
+yet (still downloading, or offline) is redirected to its original URL.
+"""
+import base64
+import hashlib
+import mimetypes
+import os
+import threading
+import urllib.request
+from typing import Dict, Optional
+
+FETCH_TIMEOUT = 5   # seconds per remote image, spent on a background thread
+USER_AGENT = "Mozilla/5.0 (oracle-demo asset cache)"
+
+class Asset:
+    __slots__ = ("data", "mimetype", "etag", "remote_url")
+
+    def __init__(self, data: Optional[bytes], mimetype: str, remote_url: Optional[str] = None):
+        self.data = data
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(data).hexdigest()[:32] if data is not None else None
+        self.remote_url = remote_url   # fallback when the image could not be cached
+
+def _decode_data_uri(uri: str) -> Optional[Asset]:
+    header, sep, payload = uri.partition(",")
+    if not sep or not header.endswith(";base64"):
+        return None
+    mimetype = header[len("data:"):-len(";base64")] or "application/octet-stream"
+    try:
+        return Asset(base64.b64decode(payload), mimetype)
+    except ValueError:
+        return None
+
+def _sniff_mimetype(data: bytes) -> Optional[str]:
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+class AssetStore:
+    def __init__(self, cache_dir: str, fetch_remote: bool = True):
+        self.cache_dir = cache_dir
+        self.fetch_remote = fetch_remote
+        self._assets: Dict[str, Asset] = {}
+        self._pending: Dict[str, str] = {}   # key -> remote URL not resolved yet
+        self._lock = threading.Lock()
+
+    def _cache_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest())
+
+    @staticmethod
+    def _asset(url: str, data: bytes) -> Asset:
+        mimetype = _sniff_mimetype(data) or mimetypes.guess_type(url)[0] or "application/octet-stream"
+        return Asset(data, mimetype, remote_url=url)
+
+    def _fetch(self, key: str, url: str):
+        path = self._cache_path(url)
+        try:
+            req = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+            with urllib.request.urlopen(req, timeout=FETCH_TIMEOUT) as r:
+                data = r.read()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(data)
+            os.replace(f"{path}.tmp", path)
+        except (OSError, ValueError) as e:
+            print(f"  [WARN] image not cached, serving the remote URL: {url[:80]} ({e})")
+            return
+        self._assets[key] = self._asset(url, data)
+
+    def _resolve(self, key: str, url: str):
+        path = self._cache_path(url)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                self._assets[key] = self._asset(url, f.read())
+        elif self.fetch_remote:
+            threading.Thread(target=self._fetch, args=(key, url), name="asset-fetch", daemon=True).start()
+
+    def add(self, key: str, src: str) -> Asset:
+        """File `src` (data URI or http(s) URL) under `key`. Data URIs are decoded
+        now; a remote URL is a redirect placeholder until get() resolves it."""
+        asset = None
+        if src.startswith("data:"):
+            asset = _decode_data_uri(src)
+        elif src.startswith(("http://", "https://")):
+            self._pending[key] = src
+        if asset is None:
+            asset = Asset(None, "", remote_url=src)
+        self._assets[key] = asset
+        return asset
+
+    def get(self, key: str) -> Optional[Asset]:
+        """The asset filed under `key`. The first get() of a remote image loads it
+        from the disk cache or starts its download; until that finishes callers
+        get the placeholder (data None), i.e. the redirect."""
+        with self._lock:
+            url = self._pending.pop(key, None)
+        if url is not None:
+            self._resolve(key, url)
+        return self._assets.get(key)
@@ -0,0 +1,152 @@
+# storage.py
+"""
+SQLite store for the demo shop's users and profiles.
+
+Replaces the CSV files as the source of truth: a profile save is one indexed
+UPSERT instead of re-reading and rewriting the whole profiles CSV, and
+registrations no longer race on an unlocked append. The database runs in WAL
+mode, so readers never block the writer and concurrent requests (threaded dev
+server, several gunicorn workers) serialize their writes inside SQLite.
+
+CSV stays the interchange format:
+    flask --app app import-csv     # users1.csv / profiles1.csv -> database
+    flask --app app export-csv     # database -> users1.csv / profiles1.csv
+and an empty database is seeded from the CSVs on first start.
+"""
+import csv
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+USER_FIELDS = ["username", "password"]
+PROFILE_FIELDS = ["username", "full_name", "address1", "address2", "city", "state", "postal", "phone"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    username  TEXT PRIMARY KEY,
+    full_name TEXT NOT NULL DEFAULT '',
+    address1  TEXT NOT NULL DEFAULT '',
+    address2  TEXT NOT NULL DEFAULT '',
+    city      TEXT NOT NULL DEFAULT '',
+    state     TEXT NOT NULL DEFAULT '',
+    postal    TEXT NOT NULL DEFAULT '',
+    phone     TEXT NOT NULL DEFAULT ''
+);
+"""
+
+class Store:
+    def __init__(self, db_path: str, busy_timeout_ms: int = 5000):
+        self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()   # one connection per thread
+        parent = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(parent, exist_ok=True)
+        self._con().executescript(SCHEMA)
+
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000.0,
+                                  isolation_level=None, check_same_thread=False)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")   # durable at checkpoints; fine for a demo shop
+            con.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.con = con
+        return con
+
+    @contextmanager
+    def tx(self):
+        """Write transaction; BEGIN IMMEDIATE takes the write lock up front, so
+        concurrent writers wait (busy_timeout) instead of failing mid-transaction."""
+        con = self._con()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield con
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        con.execute("COMMIT")
+
+    # ---------- users ----------
+
+    def get_password(self, username: str) -> Optional[str]:
+        row = self._con().execute("SELECT password FROM users WHERE username = ?", (username,)).fetchone()
+        return row["password"] if row else None
+
+    def add_user(self, username: str, password: str) -> bool:
+        """False if the username is taken (checked atomically with the insert)."""
+        with self.tx() as con:
+            cur = con.execute("INSERT OR IGNORE INTO users (username, password) VALUES (?, ?)", (username, password))
+            return cur.rowcount == 1
+
+    def user_count(self) -> int:
+        return self._con().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    # ---------- profiles ----------
+
+    def get_profile(self, username: str) -> Optional[Dict[str, str]]:
+        row = self._con().execute("SELECT * FROM profiles WHERE username = ?", (username,)).fetchone()
+        return dict(row) if row else None
+
+    def upsert_profile(self, profile: Dict[str, str]):
+        values = [profile.get(f) or "" for f in PROFILE_FIELDS]
+        updates = ", ".join(f"{f} = excluded.{f}" for f in PROFILE_FIELDS[1:])
+        with self.tx() as con:
+            con.execute(f"INSERT INTO profiles ({', '.join(PROFILE_FIELDS)}) VALUES ({', '.join('?' * len(PROFILE_FIELDS))}) "
+                        f"ON CONFLICT(username) DO UPDATE SET {updates}", values)
+
+    def profile_count(self) -> int:
+        return self._con().execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    # ---------- CSV import / export ----------
+
+    def _import(self, table: str, fields, rows: Iterable[Dict[str, str]]) -> int:
+        cols = ", ".join(fields)
+        marks = ", ".join("?" * len(fields))
+        updates = ", ".join(f"{f} = excluded.{f}" for f in fields[1:])
+        n = 0
+        with self.tx() as con:
+            for row in rows:
+                if not (row.get("username") or "").strip():
+                    continue
+                con.execute(f"INSERT INTO {table} ({cols}) VALUES ({marks}) "
+                            f"ON CONFLICT(username) DO UPDATE SET {updates}",
+                            [(row.get(f) or "").strip() for f in fields])
+                n += 1
+        return n
+
+    def _export(self, table: str, fields, path: str) -> int:
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        tmp = f"{path}.tmp"
+        n = 0
+        with open(tmp, "w", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=fields)
+            w.writeheader()
+            for row in self._con().execute(f"SELECT {', '.join(fields)} FROM {table} ORDER BY username"):
+                w.writerow(dict(row))
+                n += 1
+        os.replace(tmp, path)
+        return n
+
+    def import_users_csv(self, path: str) -> int:
+        with open(path, newline="") as f:
+            return self._import("users", USER_FIELDS, csv.DictReader(f))
+
+    def import_profiles_csv(self, path: str) -> int:
+        with open(path, newline="") as f:
+            return self._import("profiles", PROFILE_FIELDS, csv.DictReader(f))
+
+    def export_users_csv(self, path: str) -> int:
+        return self._export("users", USER_FIELDS, path)
+
+    def export_profiles_csv(self, path: str) -> int:
+        return self._export("profiles", PROFILE_FIELDS, path)
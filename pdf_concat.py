@@ -0,0 +1,159 @@
+# pdf_concat.py
+"""
+Streaming concatenation of ReportLab-generated PDFs.
+
+ReportLab keeps every page (and every embedded image) of a document in memory
+until the canvas is saved, so the data-driven report is written as several part
+files - each holding a bounded number of runs - and joined here. Parts are read
+one at a time (memory-mapped) and their objects are copied to the output,
+renumbered, with the per-part page trees replaced by one shared page tree; peak
+memory is one part regardless of how many runs the report holds.
+
+Only what ReportLab writes is supported (classic xref tables, uncompressed
+object dictionaries); this is not a general-purpose PDF merger.
+"""
+import mmap
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_OBJ_HEADER = re.compile(rb"(\d+)\s+(\d+)\s+obj\b")
+_STREAM = re.compile(rb"stream\r?\n")
+_ENDOBJ = re.compile(rb"endobj\b")
+_LENGTH = re.compile(rb"/Length\s+(\d+)(?!\s+\d+\s+R)")
+_REF = re.compile(rb"(\d+)\s+0\s+R\b")
+_KIDS = re.compile(rb"/Kids\s*\[([^\]]*)\]")
+_PAGES_TYPE = re.compile(rb"/Type\s*/Pages\b")
+
+_CATALOG_ID = 1
+_PAGES_ID = 2
+
+class _Obj:
+    __slots__ = ("dict_part", "tail")
+
+    def __init__(self, dict_part: bytes, tail: Tuple[int, int]):
+        self.dict_part = dict_part   # object body up to (excluding) a stream keyword - references live here
+        self.tail = tail             # (start, end) of "stream ... endstream" in the part, copied verbatim
+
+def _index(data, sub: bytes, start: int) -> int:
+    """bytes.index for bytes or an mmap (which only has find)."""
+    i = data.find(sub, start)
+    if i < 0:
+        raise ValueError(f"{sub.decode()} not found")
+    return i
+
+def _read_objects(data) -> Tuple[Dict[int, _Obj], int, int]:
+    """(objects by number, catalog number, info number or 0) of one ReportLab PDF."""
+    m = None
+    for m in _STARTXREF.finditer(data):
+        pass
+    if m is None:
+        raise ValueError("no startxref - not a PDF")
+    xref = int(m.group(1))
+    trailer_at = _index(data, b"trailer", xref)
+    trailer = data[trailer_at:m.start()]
+    root = re.search(rb"/Root\s+(\d+)\s+0\s+R", trailer)
+    info = re.search(rb"/Info\s+(\d+)\s+0\s+R", trailer)
+    if data[xref:xref + 4] != b"xref" or root is None:
+        raise ValueError("unsupported PDF (xref stream or missing /Root)")
+
+    offsets: Dict[int, int] = {}
+    tokens = data[xref + 4:trailer_at].split()
+    i = 0
+    while i < len(tokens):
+        start, count = int(tokens[i]), int(tokens[i + 1])
+        i += 2
+        for n in range(start, start + count):
+            off, flag = int(tokens[i]), tokens[i + 2]
+            i += 3
+            if flag == b"n":
+                offsets[n] = off
+
+    objects: Dict[int, _Obj] = {}
+    for n, off in offsets.items():
+        hdr = _OBJ_HEADER.match(data, off)
+        if hdr is None or int(hdr.group(1)) != n:
+            raise ValueError(f"object {n} not found at offset {off}")
+        body = hdr.end()
+        end = _ENDOBJ.search(data, body)
+        stream = _STREAM.search(data, body)
+        if stream is not None and stream.start() < end.start():
+            dict_part = data[body:stream.start()]
+            length = _LENGTH.search(dict_part)
+            data_end = stream.end() + int(length.group(1)) if length else _index(data, b"endstream", stream.end())
+            end = _ENDOBJ.search(data, data_end)
+            objects[n] = _Obj(dict_part, (stream.start(), end.start()))
+        else:
+            objects[n] = _Obj(data[body:end.start()], (0, 0))
+    return objects, int(root.group(1)), int(info.group(1)) if info else 0
+
+def _page_order(objects: Dict[int, _Obj], node: int, pages: List[int], tree: List[int]):
+    obj = objects[node]
+    if not _PAGES_TYPE.search(obj.dict_part):
+        pages.append(node)
+        return
+    tree.append(node)
+    kids = _KIDS.search(obj.dict_part)
+    for ref in _REF.finditer(kids.group(1) if kids else b""):
+        _page_order(objects, int(ref.group(1)), pages, tree)
+
+def _copy_part(data, out, offsets: Dict[int, int], kids: List[int], next_id: int) -> int:
+    objects, root, info = _read_objects(data)
+    pages_ref = re.search(rb"/Pages\s+(\d+)\s+0\s+R", objects[root].dict_part)
+    pages: List[int] = []
+    tree: List[int] = []
+    if pages_ref:
+        _page_order(objects, int(pages_ref.group(1)), pages, tree)
+    # the part's catalog, info and page tree are replaced by the combined document's
+    mapping = {n: _PAGES_ID for n in tree}
+    skip = {root, info, *tree}
+    for n in sorted(objects):
+        if n not in skip:
+            mapping[n] = next_id
+            next_id += 1
+
+    def remap(m):
+        try:
+            return b"%d 0 R" % mapping[int(m.group(1))]
+        except KeyError:
+            raise ValueError(f"reference to dropped object {m.group(1).decode()}") from None
+
+    for n in sorted(objects):
+        if n in skip:
+            continue
+        obj = objects[n]
+        offsets[mapping[n]] = out.tell()
+        out.write(b"%d 0 obj" % mapping[n])
+        out.write(_REF.sub(remap, obj.dict_part))
+        out.write(data[obj.tail[0]:obj.tail[1]])
+        out.write(b"endobj\n")
+    kids.extend(mapping[p] for p in pages)
+    return next_id
+
+def concat_pdfs(parts: Iterable[Path], out_path: Path) -> int:
+    """Join `parts` (in order) into `out_path`; returns the page count."""
+    out_path = Path(out_path)
+    tmp = out_path.with_suffix(".tmp")
+    offsets: Dict[int, int] = {}
+    kids: List[int] = []
+    next_id = _PAGES_ID + 1
+    with open(tmp, "wb") as out:
+        out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        for part in parts:
+            # mapped, not read: stream data (images) goes from the part file straight to the output
+            with open(part, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                next_id = _copy_part(data, out, offsets, kids, next_id)
+        offsets[_PAGES_ID] = out.tell()
+        out.write(b"%d 0 obj\n<< /Type /Pages /Count %d /Kids [ %s ] >>\nendobj\n"
+                  % (_PAGES_ID, len(kids), b" ".join(b"%d 0 R" % k for k in kids)))
+        offsets[_CATALOG_ID] = out.tell()
+        out.write(b"%d 0 obj\n<< /Type /Catalog /Pages %d 0 R /PageMode /UseNone >>\nendobj\n" % (_CATALOG_ID, _PAGES_ID))
+        xref = out.tell()
+        out.write(b"xref\n0 %d\n0000000000 65535 f \n" % next_id)
+        for n in range(1, next_id):
+            out.write(b"%010d 00000 n \n" % offsets[n])
+        out.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (next_id, _CATALOG_ID, xref))
+    os.replace(tmp, out_path)
+    return len(kids)
@@ -0,0 +1,104 @@
+# run_metrics.py
+"""
+Prometheus metrics for the test runners (data-driven sync/async engines and
+the Siebel replay), served from the runner process while a suite is running:
+
+    METRICS_PORT=9464 python runtest_data_driven_template.py
+    curl localhost:9464/metrics
+
+    uitest_action_duration_seconds{type,selector}   histogram, wall time per action
+    uitest_action_phase_seconds{phase}              histogram, nav / wait / act / settle / screenshots
+    uitest_actions_total{type,status}               counter
+    uitest_row_duration_seconds                     histogram, one dataset row end to end
+    uitest_rows_total{status}                       counter, PASS / FAIL
+    uitest_click_retries_total                      counter, extra robust_click attempts
+    uitest_screenshot_bytes_total                   counter, bytes written to disk
+    uitest_active_contexts                          gauge, open browser contexts
+
+rate(uitest_rows_total[1m]) is throughput; a flat counter with a non-zero
+uitest_active_contexts is a stall. Same prometheus_client setup as
+prometheus.py; without prometheus_client installed every call is a no-op.
+"""
+from typing import Dict, Optional
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram, start_http_server
+except ImportError:  # optional: metrics are simply not collected
+    Counter = Gauge = Histogram = start_http_server = None
+
+# UI steps range from a few ms (fill) to tens of seconds (Siebel view loads)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ROW_BUCKETS = (1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+MAX_SELECTOR_LABEL = 120   # long generated selectors are cut to keep label values sane
+
+class _Noop:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, *args):
+        pass
+
+    def inc(self, *args):
+        pass
+
+    def dec(self, *args):
+        pass
+
+def _metric(cls, *args, **kwargs):
+    return cls(*args, **kwargs) if cls is not None else _Noop()
+
+ACTION_SECONDS = _metric(Histogram, "uitest_action_duration_seconds", "Wall time of one replayed action",
+                         ["type", "selector"], buckets=LATENCY_BUCKETS)
+PHASE_SECONDS = _metric(Histogram, "uitest_action_phase_seconds", "Time spent per action phase",
+                        ["phase"], buckets=LATENCY_BUCKETS)
+ACTIONS = _metric(Counter, "uitest_actions_total", "Replayed actions", ["type", "status"])
+ROW_SECONDS = _metric(Histogram, "uitest_row_duration_seconds", "Wall time of one dataset row",
+                      buckets=ROW_BUCKETS)
+ROWS = _metric(Counter, "uitest_rows_total", "Dataset rows finished", ["status"])
+CLICK_RETRIES = _metric(Counter, "uitest_click_retries_total", "Extra attempts spent in robust_click")
+SCREENSHOT_BYTES = _metric(Counter, "uitest_screenshot_bytes_total", "Screenshot bytes written to disk")
+ACTIVE_CONTEXTS = _metric(Gauge, "uitest_active_contexts", "Browser contexts currently open")
+
+_served_port: Optional[int] = None
+
+def serve(port: int) -> bool:
+    """Expose /metrics on `port` (once per process); 0 or a missing client disables it."""
+    global _served_port
+    if not port or start_http_server is None:
+        return False
+    if _served_port is not None:
+        return True
+    try:
+        start_http_server(port)
+    except OSError as e:   # port taken, e.g. a second runner on the same agent
+        print(f"  [WARN] metrics not served on :{port}: {e}")
+        return False
+    _served_port = port
+    print(f"Metrics: http://localhost:{port}/metrics")
+    return True
+
+def observe_action(type_: str, selector: Optional[str], status: str, seconds: float,
+                   phase_ms: Optional[Dict[str, float]] = None):
+    ACTION_SECONDS.labels(type_ or "", (selector or "")[:MAX_SELECTOR_LABEL]).observe(seconds)
+    ACTIONS.labels(type_ or "", status).inc()
+    for phase, ms in (phase_ms or {}).items():
+        if ms:
+            PHASE_SECONDS.labels(phase).observe(ms / 1000.0)
+
+def observe_row(status: str, seconds: float):
+    ROW_SECONDS.observe(seconds)
+    ROWS.labels(status).inc()
+
+def add_click_retries(n: int):
+    if n > 0:
+        CLICK_RETRIES.inc(n)
+
+def add_screenshot_bytes(n: int):
+    if n > 0:
+        SCREENSHOT_BYTES.inc(n)
+
+def context_opened():
+    ACTIVE_CONTEXTS.inc()
+
+def context_closed():
+    ACTIVE_CONTEXTS.dec()
@@ -1,12 +1,14 @@
 from playwright.sync_api import sync_playwright
 import json
 
+from browser_server import launch_browser
+
 # Load recorded JSON
 with open("recorded_test.json") as f:
     actions = json.load(f)
 
 with sync_playwright() as p:
-    browser = p.chromium.launch(headless=False)
+    browser = launch_browser(p)  # warm pool if running, else a local launch
     page = browser.new_page()
 
     # Start with the first page
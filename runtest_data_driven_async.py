@@ -0,0 +1,415 @@
+# runtest_data_driven_async.py
+"""
+asyncio engine for the data-driven runner.
+
+Same action semantics as runtest_data_driven_template.py (do_action / safe_fill /
+safe_click / screenshots / reports) but built on playwright.async_api, so many
+dataset rows replay concurrently inside one browser and one event loop.
+Concurrency is capped by ASYNC_CONCURRENCY (one isolated browser context per slot).
+The settle bookkeeping (PageSettler) and the per-action / per-row record building
+(start_action, finish_action, finish_row) are shared with the sync runner; only
+the awaited Playwright calls are twinned here.
+
+Run directly, or set ENGINE = "async" in runtest_data_driven_template.py.
+"""
+import asyncio, json, time
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+from playwright.async_api import async_playwright
+
+from screenshot_pipeline import ScreenshotPipeline
+from session_cache import SessionCache
+from browser_server import launch_browser_async
+from tracing import TraceparentRoute
+import run_metrics
+
+import runtest_data_driven_template as dd
+from runtest_data_driven_template import (
+    load_plan, iter_data, plan_columns, RowFeed, _timestamp, bind_action, ActionPlan, BoundAction,
+    ActionLog, RunResult, PhaseTimer, _phase, start_action, finish_action, finish_row, prepare_run_folder, open_report_stream, open_tracer, close_tracer, write_action_csv, update_latency_history, exit_for_ci,
+    new_screenshot_pipeline, new_session_cache, session_key, resume_url, skipped_login_logs,
+    WAIT_TIMEOUT, NAV_TIMEOUT, SETTLE_INIT_JS, SETTLE_PROBE_JS,
+)
+
+class AsyncPageSettler(dd.PageSettler):
+    """Coroutine twin of PageSettler: same event bookkeeping, awaited install and probes."""
+    async def install(self):
+        try:
+            await self.page.add_init_script(SETTLE_INIT_JS)
+        except Exception:
+            pass
+        return self
+
+    async def settle(self, legacy_sec: float):
+        start = time.perf_counter()
+        deadline = start + legacy_sec
+        while time.perf_counter() < deadline:
+            try:
+                dom_quiet_sec = (await self.page.evaluate(SETTLE_PROBE_JS)) / 1000.0
+            except Exception:
+                dom_quiet_sec = self._probe_failed()
+            wait_sec = self._next_wait(dom_quiet_sec, deadline)
+            if not wait_sec:
+                break
+            await asyncio.sleep(wait_sec)
+        self._saved(legacy_sec, start)
+
+async def settle(page, legacy_sec: float, settler: Optional[AsyncPageSettler] = None):
+    if settler is None:
+        await asyncio.sleep(legacy_sec)
+    else:
+        await settler.settle(legacy_sec)
+
+async def wait_after_actions(page, timeout_sec=0.05, settler: Optional[AsyncPageSettler] = None):
+    try:
+        await page.wait_for_load_state('networkidle', timeout=timeout_sec*1000)
+    except Exception:
+        await settle(page, 0.15, settler)
+
+async def take_screenshot(page, folder: Path, prefix: str, shots: Optional[ScreenshotPipeline] = None) -> Optional[str]:
+    if shots is not None:
+        try:
+            data = await page.screenshot(**shots.screenshot_kwargs())
+        except Exception:
+            return None
+        return shots.submit(data, folder, prefix)
+    try:
+        folder.mkdir(parents=True, exist_ok=True)
+        fname = f"{prefix}_{int(time.time()*1000)}.png"
+        fp = folder / fname
+        await page.screenshot(path=str(fp), full_page=True)
+        run_metrics.add_screenshot_bytes(fp.stat().st_size)
+        return str(fp)
+    except Exception:
+        return None
+
+async def safe_fill(page, sel, val, timeout=WAIT_TIMEOUT, settler=None, timer: Optional[PhaseTimer] = None):
+    if not sel:
+        return False, f"Empty selector for fill"
+    try:
+        locator = page.locator(sel)
+        with _phase(timer, "wait"):
+            await locator.wait_for(state="visible", timeout=timeout)
+        with _phase(timer, "act"):
+            await locator.fill(str(val if val is not None else ""), timeout=1000)
+        with _phase(timer, "settle"):
+            await settle(page, 0.15, settler)
+        return True, None
+    except Exception as e:
+        return False, f"safe_fill failed for {sel}: {e}"
+
+async def safe_click(page, sel, max_click=1, wait_for_nav=False, timeout=WAIT_TIMEOUT, nav_timeout=NAV_TIMEOUT, settler=None,
+                     timer: Optional[PhaseTimer] = None):
+    if not sel:
+        return False, "Empty selector for click"
+    try:
+        locator = page.locator(sel)
+        with _phase(timer, "wait"):
+            await locator.first.wait_for(state="visible", timeout=timeout)
+    except Exception as e:
+        return False, f"no element visible for {sel}: {e}"
+    try:
+        count = await locator.count()
+    except Exception:
+        count = 0
+    if count == 0:
+        return False, f"No elements matched selector {sel}"
+    clicked = 0
+    last_err = None
+    for i in range(min(count, max_click)):
+        try:
+            nth = locator.nth(i)
+            if wait_for_nav:
+                try:
+                    with _phase(timer, "act"):
+                        async with page.expect_navigation(timeout=nav_timeout):
+                            await nth.click(timeout=1000)
+                except Exception as nav_err:
+                    last_err = f"click succeeded but navigation did not occur (or timed out): {nav_err}"
+            else:
+                with _phase(timer, "act"):
+                    await nth.click(timeout=1000)
+            with _phase(timer, "settle"):
+                await settle(page, 0.05, settler)
+            clicked += 1
+        except Exception as e:
+            last_err = str(e)
+            with _phase(timer, "settle"):
+                await settle(page, 0.15, settler)
+            continue
+    if clicked == 0:
+        return False, f"click attempts failed for {sel}; lastErr={last_err}"
+    return True, None
+
+async def _do_goto(page, b: BoundAction, settler=None, timer=None):
+    print(f"    -> goto {b.nav_url}")
+    with _phase(timer, "act"):
+        await page.goto(b.nav_url, timeout=b.step.nav_timeout)
+    with _phase(timer, "settle"):
+        await wait_after_actions(page, 0.15, settler)
+
+async def _do_fill(page, b: BoundAction, settler=None, timer=None):
+    ok, err = await safe_fill(page, b.selector, b.value, timeout=b.step.wait_timeout, settler=settler, timer=timer)
+    if not ok:
+        raise RuntimeError(err)
+    print(f"    -> fill {b.selector} -> {b.value}")
+
+async def _do_click(page, b: BoundAction, settler=None, timer=None):
+    wait_for_nav = bool(b.next_page_url) and b.next_page_url != page.url
+    ok, err = await safe_click(page, b.selector, max_click=b.step.max_click, wait_for_nav=wait_for_nav,
+                               timeout=b.step.wait_timeout, nav_timeout=b.step.nav_timeout, settler=settler, timer=timer)
+    if not ok:
+        raise RuntimeError(err)
+    print(f"    -> click {b.selector} (max_click={b.step.max_click})")
+
+ACTION_HANDLERS = {"goto": _do_goto, "fill": _do_fill, "click": _do_click}
+
+async def do_action(page, b: BoundAction, settler=None, timer: Optional[PhaseTimer] = None):
+    handler = ACTION_HANDLERS.get(b.step.kind)
+    if handler is None:
+        print(f"    [WARN] skipping unknown action type: {b.step.type}")
+        return
+    await handler(page, b, settler, timer)
+
+async def restore_session(context, plan: ActionPlan, row, sessions: SessionCache, key: str):
+    """Coroutine twin of runtest_data_driven_template.restore_session."""
+    state = sessions.load(key)
+    if state is None:
+        return None, None
+    ctx = await context.browser.new_context(storage_state=state)
+    run_metrics.context_opened()
+    try:
+        if dd.SETTLE_MODE == "event":
+            await ctx.add_init_script(SETTLE_INIT_JS)
+        page = await ctx.new_page()
+        await page.goto(resume_url(plan, row), timeout=NAV_TIMEOUT)
+        if await page.query_selector(plan.login.form_selector) is None:
+            return page, ctx
+        print("  cached session expired; logging in")
+    except Exception as e:
+        print(f"  cached session unusable ({e}); logging in")
+    sessions.invalidate(key)
+    run_metrics.context_closed()
+    try:
+        await ctx.close()
+    except Exception:
+        pass
+    return None, None
+
+async def save_session(page, plan: ActionPlan, sessions: SessionCache, key: str):
+    try:
+        if await page.query_selector(plan.login.form_selector) is None:
+            sessions.save(key, await page.context.storage_state())
+    except Exception as e:
+        print(f"  [WARN] could not cache session: {e}")
+
+async def run_row(context, plan: ActionPlan, idx, row, screenshots_root: Path,
+                  shots: Optional[ScreenshotPipeline] = None,
+                  sessions: Optional[SessionCache] = None) -> Tuple[RunResult, List[Dict[str, Any]]]:
+    """Coroutine twin of runtest_data_driven_template.run_row."""
+    print(f"\n=== RUN {idx}: {row} ===")
+    row_span = dd.TRACER.start("row", **{"dd.run_index": idx})
+    act_span = None
+    sess_key = session_key(plan, row) if sessions is not None and plan.login else None
+    page, session_ctx = await restore_session(context, plan, row, sessions, sess_key) if sess_key else (None, None)
+    first_step = plan.login.end if page is not None else 0
+    if page is None:
+        page = await context.new_page()
+    settler = await AsyncPageSettler(page).install() if dd.SETTLE_MODE == "event" else None
+    trace_route = None
+    if dd.TRACE_PROPAGATE and dd.TRACER.enabled and plan.initial_url:
+        trace_route = TraceparentRoute(plan.initial_url)
+        await page.route(trace_route.pattern, trace_route.handle_async)
+
+    run_ss_folder = screenshots_root / f"run_{idx:03d}"
+    run_ss_folder.mkdir(parents=True, exist_ok=True)
+
+    start_ts = time.time()
+    start_str = _timestamp()
+    action_logs: List[ActionLog] = []
+    fail_ss = None
+    final_ss = None
+    status = "PASS"
+    note = ""
+
+    try:
+        initial = plan.initial_url
+        if first_step:
+            print(f"  reusing cached session, resumed at {page.url}")
+            action_logs.extend(skipped_login_logs(plan, row))
+            await wait_after_actions(page, 1, settler)
+        elif initial:
+            print(f"  navigating to initial URL: {initial}")
+            await page.goto(initial, timeout=NAV_TIMEOUT)
+            await wait_after_actions(page, 2, settler)
+
+        for pos in range(first_step, len(plan.steps)):
+            step = plan.steps[pos]
+            i = step.idx
+            b = bind_action(step, row)
+
+            act_span = start_action(step, b, page.url, trace_route)
+            timer = PhaseTimer()
+            if b.target and page.url != b.target:
+                with timer.phase("nav"):
+                    try:
+                        await page.wait_for_url(b.target, timeout=3000)
+                    except Exception:
+                        if step.explicit_nav:
+                            print(f"  forcing navigation to {b.target} because action contains explicit url")
+                            await page.goto(b.target, timeout=step.nav_timeout)
+                            await wait_after_actions(page, 1, settler)
+
+            before_ss = None
+            after_ss  = None
+            if dd.SCREENSHOT_EVERY_ACTION:
+                with timer.phase("ss_before"):
+                    before_ss = await take_screenshot(page, run_ss_folder, f"before_action{i:02d}", shots)
+
+            act_url = b.nav_url if step.kind == "goto" else page.url
+            t_act = time.perf_counter()
+            try:
+                await do_action(page, b, settler=settler, timer=timer)
+                with timer.phase("settle"):
+                    await wait_after_actions(page, 0.15, settler)
+                act_status = "OK"
+                act_note = ""
+            except Exception as e:
+                act_status = "FAIL"
+                act_note = str(e)
+                status = "FAIL"
+                note = act_note
+                if dd.SCREENSHOT_ON_FAILURE and not fail_ss:
+                    with timer.phase("ss_after"):
+                        fail_ss = await take_screenshot(page, run_ss_folder, f"fail_action{i:02d}", shots)
+
+            t_elapsed = time.perf_counter()
+            if dd.SCREENSHOT_EVERY_ACTION:
+                with timer.phase("ss_after"):
+                    after_ss = await take_screenshot(page, run_ss_folder, f"after_action{i:02d}", shots)
+
+            action_logs.append(finish_action(step, b, act_span, timer, act_status, act_note, before_ss, after_ss,
+                                             (t_elapsed - t_act) * 1000, act_url))
+
+            if sess_key and not first_step and pos + 1 == plan.login.end and status == "PASS":
+                await save_session(page, plan, sessions, sess_key)
+
+        if dd.SCREENSHOT_ON_SUCCESS_END and status == "PASS":
+            final_ss = await take_screenshot(page, run_ss_folder, "final_page", shots)
+
+        print(f"  [{'PASS' if status=='PASS' else 'FAIL'}] Run {idx} {status}")
+
+    except Exception as e:
+        status = "FAIL"
+        note = f"Run-level error: {e}"
+        if dd.SCREENSHOT_ON_FAILURE and not fail_ss:
+            fail_ss = await take_screenshot(page, run_ss_folder, f"fail_runlevel", shots)
+
+    finally:
+        if act_span is not None and not act_span.ended:
+            act_span.fail(note).end()
+        end_ts = time.time()
+        if shots is not None:
+            # wait for this row's frames without blocking the event loop
+            with dd.TRACER.span("report"):
+                await asyncio.get_running_loop().run_in_executor(None, shots.wait, run_ss_folder)
+        try:
+            await page.close()
+            if session_ctx is not None:
+                run_metrics.context_closed()
+                await session_ctx.close()
+        except Exception:
+            pass
+    return finish_row(idx, row, row_span, status, note, action_logs, fail_ss, final_ss, start_str, start_ts, end_ts,
+                      settler, shots)
+
+async def _slot(slot_id: int, browser, plan: ActionPlan, feed: RowFeed, on_done, errors: List[str], screenshots_root: Path,
+                shots=None, sessions=None):
+    """One concurrency slot: an isolated context that replays rows until the feed is exhausted.
+    Like the sync _worker, a crash is reported through `errors` instead of
+    propagating out of gather() and tearing down the other slots."""
+    try:
+        context = await browser.new_context()
+        run_metrics.context_opened()
+        try:
+            while True:
+                job = feed.take()   # parses at most one CSV row; cheap enough to do on the loop
+                if job is None:
+                    break
+                idx, row = job
+                result, records = await run_row(context, plan, idx, row, screenshots_root, shots, sessions)
+                on_done(idx, result, records)
+        finally:
+            run_metrics.context_closed()
+            await context.close()
+    except Exception as e:
+        errors.append(f"slot {slot_id} crashed: {e}")
+
+async def run_all_async():
+    actions, plan, compaction = load_plan()
+    run_metrics.serve(dd.METRICS_PORT)
+    feed = RowFeed(iter_data(plan_columns(plan)), lookahead=dd.ASYNC_CONCURRENCY)
+
+    ts, run_folder, screenshots_root = prepare_run_folder(actions, feed, compaction)
+    action_json_path = run_folder / "actions_log.jsonl"
+    tracer = open_tracer(run_folder, "async")
+
+    # Rows finish out of order; buffer their records and emit JSONL lines in row
+    # order. Results go to the report stream, which reorders them itself.
+    report = open_report_stream(run_folder, ts, actions)
+    pending: Dict[int, List[Dict[str, Any]]] = {}
+    next_idx = 1
+    jsonl = open(action_json_path, "w", encoding="utf-8")
+
+    def on_done(idx, result, records):
+        nonlocal next_idx
+        report.put(idx, result)
+        pending[idx] = records
+        while next_idx in pending:
+            for rec in pending.pop(next_idx):
+                jsonl.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            next_idx += 1
+
+    shots = new_screenshot_pipeline()
+    sessions = new_session_cache() if plan.login else None
+    errors: List[str] = []
+    n_slots = max(1, min(dd.ASYNC_CONCURRENCY, len(feed.head)))
+    print(f"Running {dd.DATA_CSV} with async concurrency {n_slots}")
+    try:
+        async with async_playwright() as pw:
+            browser = await launch_browser_async(pw)
+            try:
+                await asyncio.gather(*[
+                    _slot(s, browser, plan, feed, on_done, errors, screenshots_root, shots, sessions)
+                    for s in range(1, n_slots + 1)
+                ])
+            finally:
+                await browser.close()
+    finally:
+        for idx in sorted(pending):
+            for rec in pending[idx]:
+                jsonl.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        jsonl.close()
+        feed.close()
+        with tracer.span("report"):
+            shots.close()
+            report.close()
+            write_action_csv(run_folder)
+        close_tracer(tracer, report)
+    if feed.error:
+        errors.append(feed.error)
+    for err in errors:
+        print(f"  [WARN] {err}")
+    if errors and not report.rows:
+        raise RuntimeError("; ".join(errors))
+
+    print(f"Screenshots: {shots.frames} captured, {shots.deduped} deduplicated, {shots.bytes_written/1e6:.1f} MB written")
+    if sessions:
+        print(f"Sessions: {sessions.hits - sessions.invalidated} logins skipped, {sessions.invalidated} expired")
+    update_latency_history(run_folder)
+    print(f"\nAll artifacts saved under: {run_folder}")
+    exit_for_ci(report, feed.count, errors)
+
+if __name__ == "__main__":
+    asyncio.run(run_all_async())
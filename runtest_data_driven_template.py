@@ -1,8 +1,9 @@
 # runtest_data_driven_template.py
-import json, time, os, re, csv, io, datetime, math
+import json, time, os, re, csv, io, datetime, math, heapq, queue, threading, itertools, shutil
 from pathlib import Path
-from dataclasses import dataclass, asdict
-from typing import List, Dict, Any, Optional, Tuple
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, asdict, field
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Iterable
 
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
 
@@ -16,12 +17,26 @@ import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
+from screenshot_pipeline import ScreenshotPipeline
+from thumbnail_cache import ThumbnailCache
+from pdf_concat import concat_pdfs
+from data_providers import open_provider, format_value
+from session_cache import SessionCache
+from browser_server import launch_browser
+from latency_history import LatencyHistory, wait_key, page_key
+from tracing import Tracer, TraceparentRoute
+import run_metrics
+
 # ======== Config ========
 # Root location where the project lives (your path)
 BASE_DIR = r"C:\Users\Harshita Paliwal\Documents\TestAutomation\test-automation-demo"
 
 ACTIONS_FILE = "recorded_test.json"     # generic recorded actions (your JSON)
-DATA_CSV     = "users.csv"              # test data CSV (headers must match placeholders)
+DATA_CSV     = os.environ.get("DATA_SOURCE", "users.csv")  # test data (columns must match placeholders):
+                                        # .csv/.csv.gz/.tsv, .jsonl, .parquet/.feather/.arrow, .db/.sqlite
+DATA_TABLE   = os.environ.get("DATA_TABLE")   # SQLite sources: table to read ...
+DATA_QUERY   = os.environ.get("DATA_QUERY")   # ... or a SELECT to run instead
+DATA_PROJECTION = True                  # read only the columns the recording references
 REPORT_DIR   = "dd_reports"             # will be placed inside BASE_DIR
 WAIT_TIMEOUT = 2000
 NAV_TIMEOUT  = 5000
@@ -34,8 +49,78 @@ SCREENSHOT_EVERY_ACTION   = True   # before & after each action
 SCREENSHOT_ON_FAILURE     = True   # on fail
 SCREENSHOT_ON_SUCCESS_END = True   # final page after last action per run
 
+# Screenshot pipeline (see screenshot_pipeline.py): encoding + disk writes run on a
+# background thread pool; identical consecutive frames are written only once.
+SCREENSHOT_FULL_PAGE = os.environ.get("FULL_PAGE_SHOTS", "true").lower() == "true"  # false = viewport only
+SCREENSHOT_FORMAT    = "png"   # png | jpeg | webp (webp needs Pillow)
+SCREENSHOT_QUALITY   = 70      # jpeg/webp quality
+SCREENSHOT_DEDUP     = True
+SCREENSHOT_DEDUP_DISTANCE = int(os.environ.get("SCREENSHOT_DEDUP_DISTANCE", "0"))  # dHash bits; 0 = pixel-identical only
+SCREENSHOT_WORKERS   = 4
+
 # Screenshot image size for PDF thumbnails (pixels-ish; ReportLab scales by width)
 PDF_THUMB_WIDTH = 150
+PDF_PREVIEW_WIDTH = 420
+
+# Downscaled report images are cached here (inside BASE_DIR) and reused across
+# PDF builds / re-renders; see thumbnail_cache.py
+THUMB_CACHE_DIR = os.path.join(REPORT_DIR, ".thumb_cache")
+THUMB_DENSITY   = 2.0    # rendered pixels per drawn pixel
+THUMB_WORKERS   = 4
+
+# Parallel execution: number of worker threads, each driving its own browser
+# and isolated context. Rows are sharded across workers; 1 = sequential run.
+WORKERS = int(os.environ.get("WORKERS", "1"))
+
+# Execution engine: "sync" (thread worker pool above) or "async" (asyncio engine in
+# runtest_data_driven_async.py; many rows share one browser and event loop).
+ENGINE = os.environ.get("ENGINE", "sync")
+# Max rows replaying concurrently in the async engine (one browser context each)
+ASYNC_CONCURRENCY = int(os.environ.get("ASYNC_CONCURRENCY", "4"))
+
+# Settle strategy after each interaction:
+#   "event"  - return as soon as the page is quiet (no in-flight requests, DOM
+#              mutations or navigations for SETTLE_QUIET_MS), capped at the old sleep
+#   "legacy" - original fixed sleeps / networkidle fallback
+SETTLE_MODE = os.environ.get("SETTLE_MODE", "event")
+SETTLE_QUIET_MS = 50
+
+# Adaptive timeouts: per-selector / per-page timeouts of p99 x 1.5 of past successful
+# latencies (latency_history.py), clamped to [ADAPTIVE_TIMEOUT_FLOOR_MS,
+# default x ADAPTIVE_TIMEOUT_CEIL_FACTOR]; WAIT_TIMEOUT / NAV_TIMEOUT are used
+# until a step has enough history. Each run feeds actions_log.jsonl back in.
+ADAPTIVE_TIMEOUTS = os.environ.get("ADAPTIVE_TIMEOUTS", "1") == "1"
+LATENCY_HISTORY_FILE = os.path.join(REPORT_DIR, "latency_history.json")
+ADAPTIVE_TIMEOUT_FLOOR_MS = 500
+ADAPTIVE_TIMEOUT_CEIL_FACTOR = 3
+
+# Per-phase step timings (wait / act / settle / screenshots) go into the action
+# logs and the PDF; the report lists this many slowest steps of the run
+SLOWEST_STEPS_TOP = 10
+
+# Tracing (see tracing.py): suite -> row -> action -> phase spans written as
+# OTLP/JSON to <run folder>/trace.otlp.jsonl. With TRACE_PROPAGATE=1 each action's
+# span is also sent to the app (its origin only) as a W3C traceparent header so
+# server-side spans share its trace id. Opt-in: it routes the app's requests
+# through Playwright, which bypasses the browser HTTP cache.
+TRACING = os.environ.get("TRACING", "1") == "1"
+TRACE_PROPAGATE = os.environ.get("TRACE_PROPAGATE", "0") == "1"
+
+# Prometheus /metrics served by the runner while it runs (see run_metrics.py); 0 = off
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+
+# Drop redundant recorded steps (focus-only clicks, superseded fills, echo gotos)
+# before compiling the plan; see compact_recording.py
+COMPACT_ACTIONS = os.environ.get("COMPACT_ACTIONS", "0") == "1"
+
+# Reuse logins across rows/runs: after the recorded login steps succeed, the
+# browser storage state is cached per identity (see session_cache.py) and later
+# rows with the same credentials start from a restored session instead.
+SESSION_REUSE     = os.environ.get("SESSION_REUSE", "1") == "1"
+SESSION_TTL_SEC   = int(os.environ.get("SESSION_TTL_SEC", "1800"))
+SESSION_CACHE_DIR = os.path.join(REPORT_DIR, ".session_cache")   # holds live cookies; do not commit
+# A fill on a selector matching this marks the recorded login block
+LOGIN_PASSWORD_RE = re.compile(r"pass(word)?|passwd|pwd|swepi_2", re.I)
 
 # ========================
 
@@ -50,7 +135,7 @@ def ensure_base(path_str: str) -> Path:
 def render(template, row):
     if not isinstance(template, str):
         return template
-    return TEMPLATE_RE.sub(lambda m: str(row.get(m.group(1), m.group(0))), template)
+    return TEMPLATE_RE.sub(lambda m: format_value(row.get(m.group(1), m.group(0))), template)
 
 def load_actions():
     actions_path = ensure_base(ACTIONS_FILE)
@@ -59,18 +144,82 @@ def load_actions():
     with open(actions_path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def load_data():
+def iter_data(columns: Optional[Iterable[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Yield dataset rows one at a time as they are parsed, so a huge file is never
+    held in memory. `columns` projects rows down to those names (see data_providers.py)."""
     data_path = ensure_base(DATA_CSV)
     if not data_path.exists():
-        raise FileNotFoundError(f"Data CSV not found: {data_path}")
-    rows = []
-    with open(data_path, newline='', encoding="utf-8") as f:
-        for r in csv.DictReader(f):
-            rows.append({k.strip(): (v.strip() if isinstance(v, str) else v) for k,v in r.items()})
+        raise FileNotFoundError(f"Data source not found: {data_path}")
+    return iter(open_provider(data_path, columns, table=DATA_TABLE, query=DATA_QUERY))
+
+def plan_columns(plan: "ActionPlan") -> Optional[frozenset]:
+    """Columns to read for `plan` (None = all, when projection is off)."""
+    return plan.placeholders if DATA_PROJECTION else None
+
+def load_data(columns: Optional[Iterable[str]] = None):
+    rows = list(iter_data(columns))
     if not rows:
-        raise ValueError("CSV has no rows")
+        raise ValueError("Dataset has no rows")
     return rows
 
+class RowFeed:
+    """
+    Hands dataset rows to workers on demand (thread-safe) and appends each one to
+    data_rows_snapshot.json as it is handed out. Only the first `lookahead` rows
+    are parsed up front (to size the worker pool), so the first row starts as soon
+    as it is parsed and memory does not grow with the dataset.
+    """
+    SNAPSHOT_FLUSH_EVERY = 100
+
+    def __init__(self, rows: Iterable[Dict[str, Any]], lookahead: int = 1):
+        self._rows = iter(rows)
+        self.head = list(itertools.islice(self._rows, max(1, lookahead)))
+        if not self.head:
+            raise ValueError("Dataset has no rows")
+        self._lock = threading.Lock()
+        self._snap = None
+        self.count = 0          # rows handed out so far (= dataset size once exhausted)
+        self.exhausted = False
+        self.error: Optional[str] = None
+
+    def open_snapshot(self, path: Path):
+        self._snap = open(path, "w", encoding="utf-8")
+        self._snap.write('{\n  "rows": [')
+
+    def take(self) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """Next (run_index, row), or None when the dataset is exhausted."""
+        with self._lock:
+            if self.exhausted:
+                return None
+            try:
+                row = self.head.pop(0) if self.head else next(self._rows)
+            except StopIteration:
+                self._finish()
+                return None
+            except Exception as e:   # malformed file mid-stream: stop feeding, fail the run
+                self.error = f"data source error after row {self.count}: {e}"
+                self._finish()
+                return None
+            self.count += 1
+            if self._snap:
+                self._snap.write(("\n    " if self.count == 1 else ",\n    ") + json.dumps(row, ensure_ascii=False, default=str))
+                if self.count % self.SNAPSHOT_FLUSH_EVERY == 0:
+                    self._snap.flush()
+            return self.count, row
+
+    def _finish(self):
+        self.exhausted = True
+        if self._snap:
+            self._snap.write("\n  ]\n}\n")
+            self._snap.close()
+            self._snap = None
+
+    def close(self):
+        """Stop feeding (e.g. all workers crashed) and finalize the snapshot."""
+        with self._lock:
+            if not self.exhausted:
+                self._finish()
+
 def choose_initial_url(actions):
     # Priority: START_URL env/config -> first explicit pageUrl in actions -> None
     if START_URL:
@@ -90,11 +239,300 @@ def choose_initial_url(actions):
             return url
     return None
 
-def wait_after_actions(page, timeout_sec=0.05):
+# ------------ Compiled action plan ------------
+# recorded_test.json is compiled once per suite into an immutable plan; each row
+# then only binds its values (no per-step lookahead, no repeated regex renders).
+
+@dataclass(frozen=True)
+class Template:
+    """A {{placeholder}} template pre-split into literal chunks and slots.
+    chunks has one more entry than slots; slots hold (name, original text)."""
+    raw: str
+    chunks: Tuple[str, ...]
+    slots: Tuple[Tuple[str, str], ...]
+
+    def bind(self, row: Dict[str, Any]) -> str:
+        if not self.slots:
+            return self.raw
+        out = [self.chunks[0]]
+        for (name, original), chunk in zip(self.slots, self.chunks[1:]):
+            out.append(format_value(row.get(name, original)))
+            out.append(chunk)
+        return "".join(out)
+
+def parse_template(text) -> Optional[Template]:
+    if not isinstance(text, str):
+        return None
+    chunks, slots, pos = [], [], 0
+    for m in TEMPLATE_RE.finditer(text):
+        chunks.append(text[pos:m.start()])
+        slots.append((m.group(1), m.group(0)))
+        pos = m.end()
+    chunks.append(text[pos:])
+    return Template(raw=text, chunks=tuple(chunks), slots=tuple(slots))
+
+def _bind(t: Optional[Template], row) -> Optional[str]:
+    return t.bind(row) if t is not None else None
+
+@dataclass(frozen=True)
+class PlannedAction:
+    idx: int                          # 1-based position in the recording
+    type: str                         # recorded action type
+    kind: str                         # dispatch kind: goto | fill | click | unknown
+    selector: Optional[Template]
+    value: Optional[Template]
+    target: Optional[Template]        # pageUrl/url the page should be at before acting
+    nav_url: Optional[Template]       # url to open for goto-kind actions
+    next_page_url: Optional[Template] # next pageUrl/url after this action (nav wait decision)
+    explicit_nav: bool                # action carries an explicit url we may force-navigate to
+    max_click: int
+    wait_timeout: int = WAIT_TIMEOUT  # ms for the element to show up (adaptive, see compile_plan)
+    nav_timeout: int = NAV_TIMEOUT    # ms for navigations started by this step
+
+@dataclass(frozen=True)
+class LoginBlock:
+    """The leading steps that log in; replaced by a cached session when possible."""
+    end: int                          # steps[:end] perform the login
+    identity: Tuple[str, ...]         # placeholders the login steps reference (the credentials)
+    form_selector: str                # password field: seeing it again means the session is gone
+
+@dataclass(frozen=True)
+class ActionPlan:
+    steps: Tuple[PlannedAction, ...]
+    initial_url: Optional[str]
+    placeholders: frozenset           # every {{name}} referenced anywhere in the plan
+    login: Optional[LoginBlock] = None
+
+@dataclass
+class BoundAction:
+    """A PlannedAction with one dataset row's values filled in."""
+    step: PlannedAction
+    selector: Optional[str]
+    value: Optional[str]
+    target: Optional[str]
+    nav_url: Optional[str]
+    next_page_url: Optional[str]
+
+def bind_action(step: PlannedAction, row) -> BoundAction:
+    return BoundAction(
+        step=step,
+        selector=_bind(step.selector, row),
+        value=_bind(step.value, row),
+        target=_bind(step.target, row),
+        nav_url=_bind(step.nav_url, row),
+        next_page_url=_bind(step.next_page_url, row),
+    )
+
+def load_plan():
+    """Load the recording, optionally compact it, and compile it.
+    Returns (actions, plan, compaction report or None)."""
+    actions = load_actions()
+    compaction = None
+    if COMPACT_ACTIONS:
+        from compact_recording import compact_actions
+        actions, compaction = compact_actions(actions)
+        print(f"Compacted recording: {compaction['before']} -> {compaction['after']} actions")
+    history = load_latency_history() if ADAPTIVE_TIMEOUTS else None
+    return actions, compile_plan(actions, history), compaction
+
+def load_latency_history() -> LatencyHistory:
+    return LatencyHistory(ensure_base(LATENCY_HISTORY_FILE))
+
+def _adaptive(history: Optional[LatencyHistory], key: Optional[str], default_ms: int) -> int:
+    if history is None:
+        return default_ms
+    return history.timeout(key, default_ms, floor_ms=ADAPTIVE_TIMEOUT_FLOOR_MS,
+                           ceil_ms=default_ms * ADAPTIVE_TIMEOUT_CEIL_FACTOR)
+
+def compile_plan(actions, history: Optional[LatencyHistory] = None) -> ActionPlan:
+    steps: List[PlannedAction] = []
+    next_url = None
+    # walk backwards so every step knows the next pageUrl/url in O(1)
+    for i in range(len(actions), 0, -1):
+        a = actions[i - 1]
+        a_type = a.get("type")
+        selector = a.get("selector")
+        url = a.get("url")
+        page_url = a.get("pageUrl")
+        goto_like = a_type == "goto" or (a_type == "click" and url and not selector)
+        if goto_like and (url or page_url):
+            kind = "goto"
+        elif a_type in ("fill", "click"):
+            kind = a_type
+        else:
+            kind = "unknown"
+        steps.append(PlannedAction(
+            idx=i,
+            type=a_type,
+            kind=kind,
+            selector=parse_template(selector) if selector else None,
+            value=parse_template(a.get("value")),
+            target=parse_template(page_url or url),
+            nav_url=parse_template(url or page_url) if kind == "goto" else None,
+            next_page_url=parse_template(next_url),
+            explicit_nav=bool(a_type == "goto" or (a_type == "click" and not selector and url)),
+            max_click=int(a.get("maxClick", 1)) if a.get("maxClick") is not None else 1,
+            wait_timeout=_adaptive(history, wait_key(selector), WAIT_TIMEOUT),
+            nav_timeout=_adaptive(history, page_key((url or page_url) if kind == "goto" else next_url), NAV_TIMEOUT),
+        ))
+        if page_url or url:
+            next_url = page_url or url
+    steps.reverse()
+    placeholders = set()
+    for st in steps:
+        for t in (st.selector, st.value, st.target, st.nav_url):
+            if t is not None:
+                placeholders.update(name for name, _ in t.slots)
+    return ActionPlan(steps=tuple(steps), initial_url=choose_initial_url(actions),
+                      placeholders=frozenset(placeholders), login=detect_login_block(steps))
+
+def detect_login_block(steps: List[PlannedAction]) -> Optional[LoginBlock]:
+    """Login = everything up to the first click after a password-field fill,
+    as long as more steps follow it."""
+    pw_pos = next((n for n, st in enumerate(steps)
+                   if st.kind == "fill" and st.selector and LOGIN_PASSWORD_RE.search(st.selector.raw)), None)
+    if pw_pos is None:
+        return None
+    click_pos = next((n for n in range(pw_pos + 1, len(steps)) if steps[n].kind == "click"), None)
+    if click_pos is None or click_pos + 1 >= len(steps):
+        return None
+    identity = set()
+    for st in steps[:click_pos + 1]:
+        for t in (st.selector, st.value):
+            if t is not None:
+                identity.update(name for name, _ in t.slots)
+    return LoginBlock(end=click_pos + 1, identity=tuple(sorted(identity)),
+                      form_selector=steps[pw_pos].selector.raw)
+
+# Injected into every document: remembers when the DOM last changed.
+SETTLE_INIT_JS = """
+(() => {
+  if (window.__ddSettle) return;
+  window.__ddSettle = true;
+  window.__ddLastMutation = performance.now();
+  new MutationObserver(() => { window.__ddLastMutation = performance.now(); })
+    .observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+})()
+"""
+# Milliseconds since the last DOM mutation (0 if the observer is missing, i.e. a fresh document)
+SETTLE_PROBE_JS = "() => window.__ddSettle ? performance.now() - window.__ddLastMutation : 0"
+
+class PageSettler:
+    """
+    Event-driven replacement for the fixed post-action sleeps.
+    Tracks in-flight requests and frame navigations through page events and DOM
+    mutations through SETTLE_INIT_JS; settle() returns once all of them have been
+    quiet for `quiet_ms`, or when the legacy sleep budget is used up.
+    `saved_sec` accumulates the time saved versus the legacy fixed sleeps.
+    The bookkeeping is shared with the async runner's AsyncPageSettler, which
+    only overrides install() and settle().
+    """
+    def __init__(self, page, quiet_ms=SETTLE_QUIET_MS):
+        self.page = page
+        self.quiet_sec = quiet_ms / 1000.0
+        self.inflight = set()
+        self.last_activity = time.perf_counter()
+        self.saved_sec = 0.0
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_done)
+        page.on("requestfailed", self._on_request_done)
+        page.on("framenavigated", self._on_activity)
+
+    def install(self):
+        """Inject the DOM observer into the page's future documents; returns self."""
+        try:
+            self.page.add_init_script(SETTLE_INIT_JS)
+        except Exception:
+            pass
+        return self
+
+    def _on_request(self, request):
+        self.inflight.add(request)
+        self.last_activity = time.perf_counter()
+
+    def _on_request_done(self, request):
+        self.inflight.discard(request)
+        self.last_activity = time.perf_counter()
+
+    def _on_activity(self, *_):
+        self.last_activity = time.perf_counter()
+
+    def _probe_failed(self):
+        # execution context destroyed by a navigation - treat as activity
+        self.last_activity = time.perf_counter()
+        return 0.0
+
+    def _next_wait(self, dom_quiet_sec: float, deadline: float) -> float:
+        """Seconds to wait before probing again; 0 once settled or out of budget."""
+        now = time.perf_counter()
+        quiet_sec = min(dom_quiet_sec, now - self.last_activity)
+        if now >= deadline or (not self.inflight and quiet_sec >= self.quiet_sec):
+            return 0.0
+        return min(max(0.01, self.quiet_sec - quiet_sec), deadline - now)
+
+    def _saved(self, legacy_sec: float, start: float):
+        self.saved_sec += max(0.0, legacy_sec - (time.perf_counter() - start))
+
+    def settle(self, legacy_sec: float):
+        start = time.perf_counter()
+        deadline = start + legacy_sec
+        while time.perf_counter() < deadline:
+            try:
+                dom_quiet_sec = self.page.evaluate(SETTLE_PROBE_JS) / 1000.0
+            except Exception:
+                dom_quiet_sec = self._probe_failed()
+            wait_sec = self._next_wait(dom_quiet_sec, deadline)
+            if not wait_sec:
+                break
+            try:
+                self.page.wait_for_timeout(wait_sec * 1000)
+            except Exception:
+                break
+        self._saved(legacy_sec, start)
+
+def settle(page, legacy_sec: float, settler: Optional[PageSettler] = None):
+    """Pause after an interaction: event-driven when a settler is given, fixed sleep otherwise."""
+    if settler is None:
+        time.sleep(legacy_sec)
+    else:
+        settler.settle(legacy_sec)
+
+def wait_after_actions(page, timeout_sec=0.05, settler: Optional[PageSettler] = None):
+    # networkidle usually returns at once (the page is already idle); only the
+    # fixed sleep after a timeout is replaced by the settler, and only that counts as saved
     try:
         page.wait_for_load_state('networkidle', timeout=timeout_sec*1000)
     except Exception:
-        time.sleep(0.15)
+        settle(page, 0.15, settler)
+
+# ------------ Per-phase step timing ------------
+
+PHASES = ("nav", "wait", "act", "settle", "ss_before", "ss_after")
+
+class PhaseTimer:
+    """Milliseconds (perf_counter, monotonic) spent in each phase of one action:
+    nav      - reaching the step's page (URL pre-wait, forced navigation)
+    wait     - the step's element becoming visible
+    act      - the fill / click / goto itself, including a navigation it triggers
+    settle   - waiting for the page to go quiet afterwards
+    ss_before / ss_after - the screenshots around the action"""
+    def __init__(self):
+        self.ms = dict.fromkeys(PHASES, 0.0)
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            with TRACER.span(name):
+                yield
+        finally:
+            self.ms[name] += (time.perf_counter() - t0) * 1000
+
+# replaced by a file-backed tracer for the duration of run_all
+TRACER = Tracer(None)
+
+def _phase(timer: Optional[PhaseTimer], name: str):
+    return timer.phase(name) if timer is not None else nullcontext()
 
 def _timestamp():
     return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -102,37 +540,48 @@ def _timestamp():
 def _safe_name(s: str) -> str:
     return re.sub(r"[^a-zA-Z0-9._-]+", "_", s)[:120]
 
-def take_screenshot(page, folder: Path, prefix: str) -> Optional[str]:
+def new_screenshot_pipeline() -> ScreenshotPipeline:
+    return ScreenshotPipeline(fmt=SCREENSHOT_FORMAT, quality=SCREENSHOT_QUALITY, full_page=SCREENSHOT_FULL_PAGE,
+                              dedup=SCREENSHOT_DEDUP, workers=SCREENSHOT_WORKERS,
+                              max_distance=SCREENSHOT_DEDUP_DISTANCE,
+                              on_write=run_metrics.add_screenshot_bytes)
+
+def take_screenshot(page, folder: Path, prefix: str, shots: Optional[ScreenshotPipeline] = None) -> Optional[str]:
+    if shots is not None:
+        return shots.capture(page, folder, prefix)
     try:
         folder.mkdir(parents=True, exist_ok=True)
         fname = f"{prefix}_{int(time.time()*1000)}.png"
         fp = folder / fname
         page.screenshot(path=str(fp), full_page=True)
+        run_metrics.add_screenshot_bytes(fp.stat().st_size)
         return str(fp)
     except Exception:
         return None
 
-def safe_fill(page, selector, value, row, timeout=WAIT_TIMEOUT):
-    sel = render(selector, row)
-    val = render(value, row) if value is not None else ""
+def safe_fill(page, sel, val, timeout=WAIT_TIMEOUT, settler=None, timer: Optional[PhaseTimer] = None):
     if not sel:
         return False, f"Empty selector for fill"
     try:
         locator = page.locator(sel)
-        locator.wait_for(state="visible", timeout=timeout)
-        locator.fill(str(val), timeout=1000)
-        time.sleep(0.15)
+        with _phase(timer, "wait"):
+            locator.wait_for(state="visible", timeout=timeout)
+        with _phase(timer, "act"):
+            locator.fill(str(val if val is not None else ""), timeout=1000)
+        with _phase(timer, "settle"):
+            settle(page, 0.15, settler)
         return True, None
     except Exception as e:
         return False, f"safe_fill failed for {sel}: {e}"
 
-def safe_click(page, selector, row, max_click=1, wait_for_nav=False, timeout=WAIT_TIMEOUT, nav_timeout=NAV_TIMEOUT):
-    sel = render(selector, row)
+def safe_click(page, sel, max_click=1, wait_for_nav=False, timeout=WAIT_TIMEOUT, nav_timeout=NAV_TIMEOUT, settler=None,
+               timer: Optional[PhaseTimer] = None):
     if not sel:
         return False, "Empty selector for click"
     try:
         locator = page.locator(sel)
-        locator.first.wait_for(state="visible", timeout=timeout)
+        with _phase(timer, "wait"):
+            locator.first.wait_for(state="visible", timeout=timeout)
     except Exception as e:
         return False, f"no element visible for {sel}: {e}"
     try:
@@ -148,59 +597,55 @@ def safe_click(page, selector, row, max_click=1, wait_for_nav=False, timeout=WAI
             nth = locator.nth(i)
             if wait_for_nav:
                 try:
-                    with page.expect_navigation(timeout=nav_timeout):
+                    with _phase(timer, "act"), page.expect_navigation(timeout=nav_timeout):
                         nth.click(timeout=1000)
                 except Exception as nav_err:
                     last_err = f"click succeeded but navigation did not occur (or timed out): {nav_err}"
-                time.sleep(0.05)
             else:
-                nth.click(timeout=1000)
-                time.sleep(0.05)
+                with _phase(timer, "act"):
+                    nth.click(timeout=1000)
+            with _phase(timer, "settle"):
+                settle(page, 0.05, settler)
             clicked += 1
         except Exception as e:
             last_err = str(e)
-            time.sleep(0.15)
+            with _phase(timer, "settle"):
+                settle(page, 0.15, settler)
             continue
     if clicked == 0:
         return False, f"click attempts failed for {sel}; lastErr={last_err}"
     return True, None
 
-def do_action(page, action, row, next_action_pageUrl=None):
-    a_type = action.get("type")
-    selector = action.get("selector")
-    value = action.get("value")
-    max_click = int(action.get("maxClick", 1)) if action.get("maxClick") is not None else 1
-
-    if a_type == "goto" or (a_type == "click" and action.get("url") and not selector):
-        url = action.get("url") or action.get("pageUrl")
-        if url:
-            url_r = render(url, row)
-            print(f"    -> goto {url_r}")
-            page.goto(url_r, timeout=NAV_TIMEOUT)
-            wait_after_actions(page, 0.15)
-            return
-
-    if a_type == "fill":
-        ok, err = safe_fill(page, selector, value, row)
-        if not ok:
-            raise RuntimeError(err)
-        print(f"    -> fill {render(selector,row)} -> {render(value,row)}")
+def _do_goto(page, b: BoundAction, settler=None, timer=None):
+    print(f"    -> goto {b.nav_url}")
+    with _phase(timer, "act"):
+        page.goto(b.nav_url, timeout=b.step.nav_timeout)
+    with _phase(timer, "settle"):
+        wait_after_actions(page, 0.15, settler)
+
+def _do_fill(page, b: BoundAction, settler=None, timer=None):
+    ok, err = safe_fill(page, b.selector, b.value, timeout=b.step.wait_timeout, settler=settler, timer=timer)
+    if not ok:
+        raise RuntimeError(err)
+    print(f"    -> fill {b.selector} -> {b.value}")
+
+def _do_click(page, b: BoundAction, settler=None, timer=None):
+    wait_for_nav = bool(b.next_page_url) and b.next_page_url != page.url
+    ok, err = safe_click(page, b.selector, max_click=b.step.max_click, wait_for_nav=wait_for_nav,
+                         timeout=b.step.wait_timeout, nav_timeout=b.step.nav_timeout, settler=settler, timer=timer)
+    if not ok:
+        raise RuntimeError(err)
+    print(f"    -> click {b.selector} (max_click={b.step.max_click})")
+
+ACTION_HANDLERS = {"goto": _do_goto, "fill": _do_fill, "click": _do_click}
+
+def do_action(page, b: BoundAction, settler=None, timer: Optional[PhaseTimer] = None):
+    handler = ACTION_HANDLERS.get(b.step.kind)
+    if handler is None:
+        # replaced emoji with ASCII
+        print(f"    [WARN] skipping unknown action type: {b.step.type}")
         return
-
-    if a_type == "click":
-        wait_for_nav = False
-        if next_action_pageUrl:
-            expected = render(next_action_pageUrl, row)
-            if expected and expected != page.url:
-                wait_for_nav = True
-        ok, err = safe_click(page, selector, row, max_click=max_click, wait_for_nav=wait_for_nav)
-        if not ok:
-            raise RuntimeError(err)
-        print(f"    -> click {render(selector,row)} (max_click={max_click})")
-        return
-
-    # replaced emoji with ASCII
-    print(f"    [WARN] skipping unknown action type: {a_type}")
+    handler(page, b, settler, timer)
 
 # ------------ Reporting structures ------------
 
@@ -214,6 +659,14 @@ class ActionLog:
     note: str
     before_ss: Optional[str]
     after_ss: Optional[str]
+    timestamp: str = ""
+    elapsed_ms: float = 0.0           # wall time of the action itself (feeds latency_history)
+    url: str = ""                     # page the action ran on (goto: its destination)
+    phase_ms: Dict[str, float] = field(default_factory=dict)   # PhaseTimer.ms
+
+    @property
+    def total_ms(self) -> float:
+        return sum(self.phase_ms.values())
 
 @dataclass
 class RunResult:
@@ -226,6 +679,45 @@ class RunResult:
     start_time: str
     end_time: str
     duration_sec: float
+    settle_saved_sec: float = 0.0   # time saved vs. legacy fixed sleeps (SETTLE_MODE="event")
+
+class StepTimings:
+    """Per recorded step, across all rows of a run: executions, mean / max total
+    time and mean time per phase. Only these aggregates are kept, not the logs."""
+    def __init__(self):
+        self._steps: Dict[int, Dict[str, Any]] = {}
+
+    def add(self, result: RunResult):
+        for al in result.action_logs:
+            if not al.phase_ms:
+                continue   # skipped (session restored)
+            st = self._steps.setdefault(al.idx, {"idx": al.idx, "type": al.type, "selector": al.selector or "",
+                                                 "n": 0, "sum": 0.0, "max": 0.0, "phases": dict.fromkeys(PHASES, 0.0)})
+            total = al.total_ms
+            st["n"] += 1
+            st["sum"] += total
+            st["max"] = max(st["max"], total)
+            for ph, ms in al.phase_ms.items():
+                st["phases"][ph] += ms
+
+    def slowest(self, n: int = SLOWEST_STEPS_TOP) -> List[Dict[str, Any]]:
+        """The `n` steps with the highest mean total time, slowest first."""
+        out = []
+        for st in self._steps.values():
+            phases = {ph: v / st["n"] for ph, v in st["phases"].items()}
+            out.append({"idx": st["idx"], "type": st["type"], "selector": st["selector"], "runs": st["n"],
+                        "mean_ms": st["sum"] / st["n"], "max_ms": st["max"], "phases": phases,
+                        "dominant": max(phases, key=phases.get)})
+        out.sort(key=lambda d: d["mean_ms"], reverse=True)
+        return out[:n]
+
+def _phase_cell(al: ActionLog) -> str:
+    """Compact timing cell for the per-run action table."""
+    if not al.phase_ms:
+        return "-"
+    ms = al.phase_ms
+    return (f"{al.total_ms:.0f}\nw{ms['nav'] + ms['wait']:.0f} a{ms['act']:.0f} s{ms['settle']:.0f}"
+            f"\nss{ms['ss_before'] + ms['ss_after']:.0f}")
 
 # ---------- PDF / Visualization helpers ----------
 
@@ -242,132 +734,142 @@ def _make_bar_chart_png(out_path: Path, passed: int, failed: int):
     plt.savefig(out_path, dpi=160)
     plt.close()
 
-def _rl_image(path: str, width_px: int) -> Optional[RLImage]:
+# Tallest image that still fits an A4 frame with the margins used below
+PDF_MAX_IMAGE_HEIGHT = 230*mm
+
+def new_thumbnail_cache() -> ThumbnailCache:
+    return ThumbnailCache(ensure_base(THUMB_CACHE_DIR), density=THUMB_DENSITY, workers=THUMB_WORKERS)
+
+def _rl_image(path: str, width_px: int, max_height: float = PDF_MAX_IMAGE_HEIGHT,
+              thumbs: Optional[ThumbnailCache] = None) -> Optional[RLImage]:
     try:
-        img = RLImage(path)
+        # embed the cached downscaled copy, not the full-page screenshot
+        img = RLImage(thumbs.get(path, width_px) if thumbs else path)
         w, h = img.wrap(0,0)
-        scale = width_px / max(w, 1)
+        scale = min(width_px / max(w, 1), max_height / max(h, 1))
         img.drawWidth = w * scale
         img.drawHeight = h * scale
         return img
     except Exception:
         return None
 
-def build_pdf(report_folder: Path, project_title: str, usecase_title: str, results: List[RunResult]):
-    pdf_path = report_folder / "report.pdf"
-    chart_path = report_folder / "chart_outcomes.png"
-
-    passed = sum(1 for r in results if r.status == "PASS")
-    failed = sum(1 for r in results if r.status == "FAIL")
-    _make_bar_chart_png(chart_path, passed, failed)
-
-    styles = getSampleStyleSheet()
-    story = []
-
-    # Header
-    story.append(Paragraph(f"<b>{project_title}</b>", styles["Title"]))
-    story.append(Spacer(1, 6))
-    story.append(Paragraph(usecase_title, styles["Heading2"]))
-    story.append(Spacer(1, 6))
-    story.append(Paragraph(f"Report generated: {_timestamp()}", styles["Normal"]))
-    story.append(Spacer(1, 12))
-
-    # Outcome summary
-    story.append(Paragraph("<b>Summary</b>", styles["Heading3"]))
-    tdata = [
-        ["Total Runs", str(len(results))],
-        ["Passed", str(passed)],
-        ["Failed", str(failed)],
-    ]
-    tbl = Table(tdata, hAlign="LEFT", colWidths=[80*mm, 30*mm])
-    tbl.setStyle(TableStyle([
-        ("BOX", (0,0), (-1,-1), 0.5, colors.grey),
-        ("INNERGRID", (0,0), (-1,-1), 0.25, colors.lightgrey),
-        ("BACKGROUND", (0,0), (-1,0), colors.whitesmoke),
-        ("ALIGN", (0,0), (-1,-1), "LEFT"),
-        ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
-        ("FONTNAME", (0,0), (-1,-1), "Helvetica")
-    ]))
-    story.append(tbl)
-    story.append(Spacer(1, 10))
-
-    chart_img = _rl_image(str(chart_path), 360)
-    if chart_img:
-        story.append(Paragraph("Outcome Chart", styles["Heading4"]))
-        story.append(chart_img)
-        story.append(Spacer(1, 12))
-
-    # Per-run table (compact)
-    story.append(Paragraph("<b>Run Details</b>", styles["Heading3"]))
-    rows = [["#", "Status", "Duration(s)", "Failure Note / Last Note", "First Failure Screenshot"]]
-    for i, r in enumerate(results, start=1):
-        note = (r.note or "").strip()
-        if not note and r.action_logs:
-            note = r.action_logs[-1].note or ""
-        thumb = ""
-        if r.fail_ss:
-            thumb = r.fail_ss
-        rows.append([str(i), r.status, f"{r.duration_sec:.1f}", note[:200], thumb])
-
-    # Render table with thumbnails (as separate flowables per row)
-    # Build table without images first
-    col_widths = [10*mm, 18*mm, 25*mm, 85*mm, 40*mm]
-    base_tbl = Table(rows, colWidths=col_widths, repeatRows=1)
-    base_tbl.setStyle(TableStyle([
-        ("BOX", (0,0), (-1,-1), 0.5, colors.grey),
-        ("INNERGRID", (0,0), (-1,-1), 0.25, colors.lightgrey),
-        ("BACKGROUND", (0,0), (-1,0), colors.whitesmoke),
-        ("ALIGN", (0,0), (-1,0), "CENTER"),
-        ("VALIGN", (0,0), (-1,-1), "TOP"),
-        ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
-        ("FONTNAME", (0,1), (-1,-1), "Helvetica"),
-        ("FONTSIZE", (0,0), (-1,-1), 9)
-    ]))
-
-    # Replace last column cells with actual image flowables
-    # (ReportLab tables can hold flowables directly)
-    for ridx in range(1, len(rows)):
-        ss_path = rows[ridx][4]
-        flow = Paragraph("-", styles["Normal"])
-        if isinstance(ss_path, str) and ss_path:
-            img = _rl_image(ss_path, PDF_THUMB_WIDTH)
-            if img:
-                flow = img
-        rows[ridx][4] = flow
-
-    # Rebuild table to apply flowables
-    base_tbl = Table(rows, colWidths=col_widths, repeatRows=1)
-    base_tbl.setStyle(TableStyle([
-        ("BOX", (0,0), (-1,-1), 0.5, colors.grey),
-        ("INNERGRID", (0,0), (-1,-1), 0.25, colors.lightgrey),
-        ("BACKGROUND", (0,0), (-1,0), colors.whitesmoke),
-        ("ALIGN", (0,0), (-1,0), "CENTER"),
-        ("VALIGN", (0,0), (-1,-1), "TOP"),
-        ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
-        ("FONTNAME", (0,1), (-1,-1), "Helvetica"),
-        ("FONTSIZE", (0,0), (-1,-1), 9)
-    ]))
-    story.append(base_tbl)
-    story.append(Spacer(1, 12))
-
-    # Append per-run action logs on separate pages (optional but useful)
-    for i, r in enumerate(results, start=1):
-        story.append(PageBreak())
-        story.append(Paragraph(f"Run #{i} — Status: {r.status}", styles["Heading2"]))
-        story.append(Paragraph(f"Start: {r.start_time}  |  End: {r.end_time}  |  Duration: {r.duration_sec:.1f}s", styles["Normal"]))
-        story.append(Spacer(1, 6))
-        headers = ["#", "Type", "Selector", "Value", "Status", "Note"]
+class _LazyStory(list):
+    """
+    Story list that doc.build() consumes front-to-back and that refills itself from
+    a generator of flowable chunks whenever it runs dry, so a part's runs are laid
+    out as they arrive and only the current chunk of flowables is held.
+    """
+    def __init__(self, chunks):
+        super().__init__()
+        self._chunks = chunks
+
+    def __len__(self):
+        n = list.__len__(self)
+        while n == 0:
+            try:
+                self.extend(next(self._chunks))
+            except StopIteration:
+                break
+            n = list.__len__(self)
+        return n
+
+_DETAIL_TABLE_STYLE = TableStyle([
+    ("BOX", (0,0), (-1,-1), 0.5, colors.grey),
+    ("INNERGRID", (0,0), (-1,-1), 0.25, colors.lightgrey),
+    ("BACKGROUND", (0,0), (-1,0), colors.whitesmoke),
+    ("ALIGN", (0,0), (-1,0), "CENTER"),
+    ("VALIGN", (0,0), (-1,-1), "TOP"),
+    ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
+    ("FONTNAME", (0,1), (-1,-1), "Helvetica"),
+    ("FONTSIZE", (0,0), (-1,-1), 9)
+])
+
+class PdfReport:
+    """
+    Incremental report writer. A ReportLab canvas keeps every page and image in
+    memory until it is saved, so runs are written to part PDFs of RUNS_PER_PART
+    runs each as they are handed in, and the per-run overview rows are spilled to
+    a JSONL file. Once totals are known, the front matter (summary, chart, run
+    details, slowest steps) is written as further parts of at most
+    OVERVIEW_ROWS_PER_PART rows, and pdf_concat joins everything into report.pdf
+    one part at a time. Peak memory is one part, regardless of dataset size.
+    """
+    RUNS_PER_PART = 25
+    OVERVIEW_ROWS_PER_PART = 200
+    OVERVIEW_CHUNK = 40   # overview rows per Table flowable
+
+    def __init__(self, report_folder: Path, project_title: str, usecase_title: str,
+                 thumbs: Optional[ThumbnailCache] = None):
+        self.report_folder = report_folder
+        self.thumbs = thumbs
+        self.pdf_path = report_folder / "report.pdf"
+        self.chart_path = report_folder / "chart_outcomes.png"
+        self.parts_dir = report_folder / "report_parts"
+        self.project_title = project_title
+        self.usecase_title = usecase_title
+        self.styles = getSampleStyleSheet()
+        self.passed = 0
+        self.failed = 0
+        self.runs = 0
+        self.timings = StepTimings()
+        self._overview_path = self.parts_dir / "overview.jsonl"
+
+    def _doc(self, path: Path) -> SimpleDocTemplate:
+        return SimpleDocTemplate(str(path), pagesize=A4, leftMargin=16*mm, rightMargin=16*mm, topMargin=16*mm, bottomMargin=16*mm)
+
+    def _header(self):
+        styles = self.styles
+        tbl = Table([
+            ["Total Runs", str(self.passed + self.failed)],
+            ["Passed", str(self.passed)],
+            ["Failed", str(self.failed)],
+        ], hAlign="LEFT", colWidths=[80*mm, 30*mm])
+        tbl.setStyle(TableStyle([
+            ("BOX", (0,0), (-1,-1), 0.5, colors.grey),
+            ("INNERGRID", (0,0), (-1,-1), 0.25, colors.lightgrey),
+            ("BACKGROUND", (0,0), (-1,0), colors.whitesmoke),
+            ("ALIGN", (0,0), (-1,-1), "LEFT"),
+            ("VALIGN", (0,0), (-1,-1), "MIDDLE"),
+            ("FONTNAME", (0,0), (-1,-1), "Helvetica")
+        ]))
+        flow = [
+            Paragraph(f"<b>{self.project_title}</b>", styles["Title"]),
+            Spacer(1, 6),
+            Paragraph(self.usecase_title, styles["Heading2"]),
+            Spacer(1, 6),
+            Paragraph(f"Report generated: {_timestamp()}", styles["Normal"]),
+            Spacer(1, 12),
+            Paragraph("<b>Summary</b>", styles["Heading3"]),
+            tbl,
+            Spacer(1, 10),
+        ]
+        _make_bar_chart_png(self.chart_path, self.passed, self.failed)
+        chart_img = _rl_image(str(self.chart_path), 360)
+        if chart_img:
+            flow += [Paragraph("Outcome Chart", styles["Heading4"]), chart_img, Spacer(1, 12)]
+        return flow
+
+    def _run_page(self, i: int, r: RunResult, first: bool):
+        styles = self.styles
+        flow = [] if first else [PageBreak()]
+        flow += [
+            Paragraph(f"Run #{i} — Status: {r.status}", styles["Heading2"]),
+            Paragraph(f"Start: {r.start_time}  |  End: {r.end_time}  |  Duration: {r.duration_sec:.1f}s", styles["Normal"]),
+            Spacer(1, 6),
+        ]
+        headers = ["#", "Type", "Selector", "Value", "Status", "Time (ms)", "Note"]
         data = [headers]
         for al in r.action_logs:
             data.append([
                 str(al.idx),
                 al.type,
-                (al.selector or "")[:70],
-                (str(al.value or ""))[:40],
+                (al.selector or "")[:60],
+                (str(al.value or ""))[:30],
                 al.status,
-                (al.note or "")[:120]
+                _phase_cell(al),
+                (al.note or "")[:100]
             ])
-        atbl = Table(data, colWidths=[8*mm, 18*mm, 55*mm, 35*mm, 16*mm, 68*mm])
+        atbl = Table(data, colWidths=[8*mm, 18*mm, 50*mm, 30*mm, 16*mm, 22*mm, 56*mm], repeatRows=1)
         atbl.setStyle(TableStyle([
             ("BOX", (0,0), (-1,-1), 0.5, colors.grey),
             ("INNERGRID", (0,0), (-1,-1), 0.25, colors.lightgrey),
@@ -376,28 +878,548 @@ def build_pdf(report_folder: Path, project_title: str, usecase_title: str, resul
             ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
             ("FONTSIZE", (0,0), (-1,-1), 8)
         ]))
-        story.append(atbl)
+        flow.append(atbl)
 
         # Show final or fail screenshot big if available
         big_img_path = r.fail_ss or r.final_ss
         if big_img_path:
-            story.append(Spacer(1, 8))
-            story.append(Paragraph("Screenshot", styles["Heading4"]))
-            big_img = _rl_image(big_img_path, 420)  # larger
+            big_img = _rl_image(big_img_path, PDF_PREVIEW_WIDTH, thumbs=self.thumbs)  # larger
             if big_img:
-                story.append(big_img)
+                flow += [Spacer(1, 8), Paragraph("Screenshot", styles["Heading4"]), big_img]
+        return flow
+
+    def _run_chunks(self, results, overview):
+        """Run pages for one part; counts totals and spills overview rows on the way."""
+        for n, r in enumerate(results):
+            self.runs += 1
+            if r.status == "PASS":
+                self.passed += 1
+            elif r.status == "FAIL":
+                self.failed += 1
+            note = (r.note or "").strip()
+            if not note and r.action_logs:
+                note = r.action_logs[-1].note or ""
+            overview.write(json.dumps([self.runs, r.status, r.duration_sec, note[:200], r.fail_ss]) + "\n")
+            self.timings.add(r)
+            yield self._run_page(self.runs, r, first=n == 0)
+
+    def _overview_rows(self) -> Iterator[list]:
+        if not self._overview_path.exists():
+            return
+        with open(self._overview_path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def _overview_chunks(self, rows, first: bool, last: bool):
+        """Compact per-run table for one front part (one Table per OVERVIEW_CHUNK rows)."""
+        if first:
+            yield self._header()
+            yield [Paragraph("<b>Run Details</b>", self.styles["Heading3"])]
+        else:
+            yield [Paragraph("<b>Run Details</b> (continued)", self.styles["Heading3"])]
+        col_widths = [10*mm, 18*mm, 25*mm, 85*mm, 40*mm]
+        header = ["#", "Status", "Duration(s)", "Failure Note / Last Note", "First Failure Screenshot"]
+        if self.thumbs:
+            self.thumbs.prefetch((o[4] for o in rows), PDF_THUMB_WIDTH)
+        for start in range(0, len(rows), self.OVERVIEW_CHUNK):
+            table_rows = [header]
+            for i, status, dur, note, fail_ss in rows[start:start + self.OVERVIEW_CHUNK]:
+                thumb = _rl_image(fail_ss, PDF_THUMB_WIDTH, thumbs=self.thumbs) if fail_ss else None
+                table_rows.append([str(i), status, f"{dur:.1f}", note[:200], thumb or Paragraph("-", self.styles["Normal"])])
+            tbl = Table(table_rows, colWidths=col_widths, repeatRows=1)
+            tbl.setStyle(_DETAIL_TABLE_STYLE)
+            yield [tbl]
+        if last:
+            yield self._slowest_steps()
+
+    def _slowest_steps(self):
+        slowest = self.timings.slowest()
+        if not slowest:
+            return []
+        rows = [["#", "Type", "Selector", "Runs", "Mean", "Max", "Wait", "Act", "Settle", "Shots"]]
+        for st in slowest:
+            ph = st["phases"]
+            rows.append([str(st["idx"]), st["type"], st["selector"][:45], str(st["runs"]),
+                         f"{st['mean_ms']:.0f}", f"{st['max_ms']:.0f}", f"{ph['nav'] + ph['wait']:.0f}", f"{ph['act']:.0f}",
+                         f"{ph['settle']:.0f}", f"{ph['ss_before'] + ph['ss_after']:.0f}"])
+        tbl = Table(rows, colWidths=[8*mm, 16*mm, 54*mm, 12*mm, 16*mm, 16*mm, 14*mm, 14*mm, 14*mm, 14*mm], repeatRows=1)
+        tbl.setStyle(_DETAIL_TABLE_STYLE)
+        return [Spacer(1, 12), Paragraph("<b>Slowest Steps</b> (mean ms per execution, phases averaged)", self.styles["Heading3"]), tbl]
+
+    def _front_parts(self) -> List[Path]:
+        parts = []
+        rows_iter = self._overview_rows()
+        rows = list(itertools.islice(rows_iter, self.OVERVIEW_ROWS_PER_PART))
+        while True:
+            nxt = list(itertools.islice(rows_iter, self.OVERVIEW_ROWS_PER_PART))
+            part = self.parts_dir / f"front_{len(parts) + 1:04d}.pdf"
+            self._doc(part).build(_LazyStory(self._overview_chunks(rows, first=not parts, last=not nxt)))
+            parts.append(part)
+            if not nxt:
+                return parts
+            rows = nxt
+
+    def build(self, results) -> Path:
+        """Consume `results` (any iterable, typically a generator fed by running workers)."""
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        self.parts_dir.mkdir(parents=True)
+        it = iter(results)
+        run_parts = []
+        with open(self._overview_path, "w", encoding="utf-8") as overview:
+            for first in it:
+                part = self.parts_dir / f"runs_{len(run_parts) + 1:04d}.pdf"
+                runs = itertools.chain([first], itertools.islice(it, self.RUNS_PER_PART - 1))
+                self._doc(part).build(_LazyStory(self._run_chunks(runs, overview)))
+                run_parts.append(part)
+        concat_pdfs(self._front_parts() + run_parts, self.pdf_path)
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+        return self.pdf_path
+
+def build_pdf(report_folder: Path, project_title: str, usecase_title: str, results: List[RunResult],
+              thumbs: Optional[ThumbnailCache] = None):
+    """Render a report from already collected results (e.g. a re-render of an old run)."""
+    own = thumbs is None
+    thumbs = thumbs or new_thumbnail_cache()
+    try:
+        return PdfReport(report_folder, project_title, usecase_title, thumbs).build(results)
+    finally:
+        if own:
+            thumbs.close()
+
+class ReportStream:
+    """
+    Receives RunResults in any order (from workers), hands them to the report in
+    row order on a background thread, and writes results.txt as it goes. Runs are
+    not retained after their page is written.
+    """
+    def __init__(self, run_folder: Path, project_title: str, usecase_title: str):
+        self.results_txt_path = run_folder / "results.txt"
+        self.thumbs = new_thumbnail_cache()
+        self.report = PdfReport(run_folder, project_title, usecase_title, self.thumbs)
+        self.pdf_path: Optional[Path] = None
+        self.error: Optional[BaseException] = None
+        self.rows = 0
+        self.any_failed = False
+        self.settle_saved_sec = 0.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="dd-report", daemon=True)
+        self._thread.start()
+
+    def put(self, idx: int, result: RunResult):
+        # start downscaling this run's images while earlier rows are still being laid out
+        self.thumbs.prefetch([result.fail_ss or result.final_ss], PDF_PREVIEW_WIDTH)
+        self.thumbs.prefetch([result.fail_ss], PDF_THUMB_WIDTH)
+        self._queue.put((idx, result))
+
+    def _ordered(self, rf):
+        pending: Dict[int, RunResult] = {}
+        next_idx = 1
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            idx, result = item
+            pending[idx] = result
+            while next_idx in pending:
+                yield self._emit(rf, pending.pop(next_idx))
+                next_idx += 1
+        # rows lost by a crashed worker leave gaps; emit what is left in order
+        for idx in sorted(pending):
+            yield self._emit(rf, pending.pop(idx))
+
+    def _emit(self, rf, rr: RunResult) -> RunResult:
+        self.rows += 1
+        self.any_failed = self.any_failed or rr.status == "FAIL"
+        self.settle_saved_sec += rr.settle_saved_sec
+        rf.write(f"{rr.row} -> {rr.status} {rr.note}\n")
+        rf.flush()
+        return rr
+
+    def _run(self):
+        try:
+            with open(self.results_txt_path, "w", encoding="utf-8") as rf:
+                self.pdf_path = self.report.build(self._ordered(rf))
+                if self.settle_saved_sec:
+                    rf.write(f"# settle time saved vs fixed sleeps: {self.settle_saved_sec:.2f}s\n")
+                for line in self.slowest_lines():
+                    rf.write(f"# {line}\n")
+        except BaseException as e:
+            self.error = e
+            # keep draining so producers never block
+            while self._queue.get() is not None:
+                pass
+
+    def slowest_lines(self) -> List[str]:
+        lines = []
+        for st in self.report.timings.slowest():
+            ph = st["phases"]
+            lines.append(f"slow step #{st['idx']} {st['type']} {st['selector']}: mean {st['mean_ms']:.0f} ms, "
+                         f"max {st['max_ms']:.0f} ms over {st['runs']} runs (mostly {st['dominant']}: "
+                         f"{ph[st['dominant']]:.0f} ms)")
+        return lines
+
+    def close(self) -> Optional[Path]:
+        self._queue.put(None)
+        self._thread.join()
+        self.thumbs.close()
+        slowest = self.slowest_lines()
+        if slowest:
+            print("\nSlowest steps:")
+            for line in slowest:
+                print(f"  {line}")
+        print(f"\nResults written to {self.results_txt_path}")
+        if self.error:
+            print(f"  [WARN] PDF report failed: {self.error}")
+        else:
+            print(f"PDF report created at: {self.pdf_path}")
+            print(f"Report thumbnails: {self.thumbs.generated} generated, {self.thumbs.hits} reused from cache")
+        return self.pdf_path
+
+# ------------ Session reuse ------------
+
+def new_session_cache() -> Optional[SessionCache]:
+    return SessionCache(ensure_base(SESSION_CACHE_DIR), ttl_sec=SESSION_TTL_SEC) if SESSION_REUSE else None
+
+def _origin(url: Optional[str]) -> str:
+    m = re.match(r"^[a-z][a-z0-9+.-]*://[^/]+", url or "", re.I)
+    return m.group(0).lower() if m else ""
+
+def session_key(plan: ActionPlan, row) -> str:
+    return SessionCache.key(_origin(plan.initial_url), {k: format_value(row.get(k)) for k in plan.login.identity})
+
+def resume_url(plan: ActionPlan, row) -> Optional[str]:
+    """Where a restored session starts: the page of the first post-login step."""
+    b = bind_action(plan.steps[plan.login.end], row)
+    return b.target or b.nav_url or plan.initial_url
+
+def restore_session(context, plan: ActionPlan, row, sessions: SessionCache, key: str):
+    """Open a page in a new context carrying the cached storage state and go to the
+    first post-login page. Returns (page, context), or (None, None) when there is no
+    usable session - an expired one is invalidated so the caller logs in for real."""
+    state = sessions.load(key)
+    if state is None:
+        return None, None
+    ctx = context.browser.new_context(storage_state=state)
+    run_metrics.context_opened()
+    try:
+        if SETTLE_MODE == "event":
+            # the resume goto is this page's first document; without the observer
+            # the settler would fall back to the full sleeps until the next navigation
+            ctx.add_init_script(SETTLE_INIT_JS)
+        page = ctx.new_page()
+        page.goto(resume_url(plan, row), timeout=NAV_TIMEOUT)
+        # cheap validation: an expired session redirects back to the login form
+        if page.query_selector(plan.login.form_selector) is None:
+            return page, ctx
+        print("  cached session expired; logging in")
+    except Exception as e:
+        print(f"  cached session unusable ({e}); logging in")
+    sessions.invalidate(key)
+    run_metrics.context_closed()
+    try:
+        ctx.close()
+    except Exception:
+        pass
+    return None, None
+
+def save_session(page, plan: ActionPlan, sessions: SessionCache, key: str):
+    """Cache the storage state once the login steps went through (form gone)."""
+    try:
+        if page.query_selector(plan.login.form_selector) is None:
+            sessions.save(key, page.context.storage_state())
+    except Exception as e:
+        print(f"  [WARN] could not cache session: {e}")
 
-    doc = SimpleDocTemplate(str(pdf_path), pagesize=A4, leftMargin=16*mm, rightMargin=16*mm, topMargin=16*mm, bottomMargin=16*mm)
-    doc.build(story)
-    return pdf_path
+def skipped_login_logs(plan: ActionPlan, row) -> List[ActionLog]:
+    logs = []
+    for step in plan.steps[:plan.login.end]:
+        b = bind_action(step, row)
+        logs.append(ActionLog(idx=step.idx, type=step.type, selector=b.selector or None, value=b.value or None,
+                              status="SKIPPED", note="login restored from session cache",
+                              before_ss=None, after_ss=None, timestamp=_timestamp()))
+    return logs
 
 # --------------- Main runner ---------------
 
-def run_all():
-    actions = load_actions()
-    data_rows = load_data()
+ACTION_RECORD_FIELDS = [
+    "run_index","row","action_index","type","selector","value","status","note","before_ss","after_ss","timestamp",
+    "elapsed_ms","url","nav_ms","wait_ms","act_ms","settle_ms","ss_before_ms","ss_after_ms"
+]
+
+def action_record(run_index: int, row: Dict[str, Any], al: ActionLog) -> Dict[str, Any]:
+    """Flat per-action record written to actions_log.jsonl / actions_log.csv."""
+    return {
+        "run_index": run_index,
+        "row": json.dumps(row, ensure_ascii=False, default=str),
+        "action_index": al.idx,
+        "type": al.type,
+        "selector": al.selector or "",
+        "value": al.value or "",
+        "status": al.status,
+        "note": al.note,
+        "before_ss": al.before_ss or "",
+        "after_ss": al.after_ss or "",
+        "timestamp": al.timestamp or _timestamp(),
+        "elapsed_ms": round(al.elapsed_ms, 1),
+        "url": al.url,
+        **{f"{ph}_ms": round(al.phase_ms.get(ph, 0.0), 1) for ph in PHASES},
+    }
+
+def start_action(step: PlannedAction, b: BoundAction, page_url: str, trace_route: Optional[TraceparentRoute] = None):
+    """Open the span of one action (and point traceparent propagation at it)."""
+    span = TRACER.start("action", **{"dd.action_index": step.idx, "dd.type": step.type,
+                                     "dd.selector": b.selector or "", "url.full": b.nav_url or page_url})
+    if trace_route is not None:
+        trace_route.value = span.traceparent
+    return span
+
+def finish_action(step: PlannedAction, b: BoundAction, span, timer: PhaseTimer, status: str, note: str,
+                  before_ss: Optional[str], after_ss: Optional[str], elapsed_ms: float, url: str) -> ActionLog:
+    """ActionLog of one replayed action; ends its span and feeds the metrics."""
+    al = ActionLog(
+        idx=step.idx,
+        type=step.type,
+        selector=b.selector or None,
+        value=b.value or None,
+        status=status,
+        note=note,
+        before_ss=before_ss,
+        after_ss=after_ss,
+        timestamp=_timestamp(),
+        elapsed_ms=elapsed_ms,
+        url=url or "",
+        phase_ms=timer.ms
+    )
+    if status != "OK":
+        span.fail(note)
+    span.end()
+    run_metrics.observe_action(step.type, b.selector, status, elapsed_ms / 1000.0, timer.ms)
+    return al
+
+def finish_row(idx, row, row_span, status: str, note: str, action_logs: List[ActionLog],
+               fail_ss: Optional[str], final_ss: Optional[str], start_str: str, started: float, ended: float,
+               settler: Optional[PageSettler] = None,
+               shots: Optional[ScreenshotPipeline] = None) -> Tuple[RunResult, List[Dict[str, Any]]]:
+    """RunResult and flat action records of a finished row, once its frames are
+    written (deduplicated frames are pointed at the file that holds them); ends
+    the row span and feeds the metrics."""
+    if shots is not None:
+        for al in action_logs:
+            al.before_ss = shots.resolve(al.before_ss)
+            al.after_ss = shots.resolve(al.after_ss)
+        fail_ss = shots.resolve(fail_ss)
+        final_ss = shots.resolve(final_ss)
+    dur = max(0.0, ended - started)
+    result = RunResult(
+        row=row,
+        status=status,
+        note=note,
+        action_logs=action_logs,
+        fail_ss=fail_ss,
+        final_ss=final_ss,
+        start_time=start_str,
+        end_time=_timestamp(),
+        duration_sec=dur,
+        settle_saved_sec=settler.saved_sec if settler else 0.0
+    )
+    if settler:
+        print(f"  settle: saved {settler.saved_sec:.2f}s vs fixed sleeps")
+    if status != "PASS":
+        row_span.fail(note)
+    row_span.end()
+    run_metrics.observe_row(status, dur)
+    return result, [action_record(idx, row, al) for al in action_logs]
+
+def run_row(context, plan: ActionPlan, idx, row, screenshots_root: Path,
+            shots: Optional[ScreenshotPipeline] = None,
+            sessions: Optional[SessionCache] = None) -> Tuple[RunResult, List[Dict[str, Any]]]:
+    """Replay all actions for one dataset row in a fresh page of `context`.
+    Returns the RunResult plus the flat action records for the CSV/JSONL logs."""
+    print(f"\n=== RUN {idx}: {row} ===")
+    row_span = TRACER.start("row", **{"dd.run_index": idx})
+    act_span = None
+    # with a cached session for this identity, skip the login steps
+    sess_key = session_key(plan, row) if sessions is not None and plan.login else None
+    page, session_ctx = restore_session(context, plan, row, sessions, sess_key) if sess_key else (None, None)
+    first_step = plan.login.end if page is not None else 0
+    if page is None:
+        page = context.new_page()
+    settler = PageSettler(page).install() if SETTLE_MODE == "event" else None
+    trace_route = None
+    if TRACE_PROPAGATE and TRACER.enabled and plan.initial_url:
+        trace_route = TraceparentRoute(plan.initial_url)
+        page.route(trace_route.pattern, trace_route.handle)
+
+    run_ss_folder = screenshots_root / f"run_{idx:03d}"
+    run_ss_folder.mkdir(parents=True, exist_ok=True)
+
+    start_ts = time.time()
+    start_str = _timestamp()
+    action_logs: List[ActionLog] = []
+    fail_ss = None
+    final_ss = None
+    status = "PASS"
+    note = ""
+
+    try:
+        # Starting URL is resolved once at compile time
+        initial = plan.initial_url
+        if first_step:
+            print(f"  reusing cached session, resumed at {page.url}")
+            action_logs.extend(skipped_login_logs(plan, row))
+            wait_after_actions(page, 1, settler)
+        elif initial:
+            print(f"  navigating to initial URL: {initial}")
+            page.goto(initial, timeout=NAV_TIMEOUT)
+            wait_after_actions(page, 2, settler)
+
+        # iterate actions
+        for pos in range(first_step, len(plan.steps)):
+            step = plan.steps[pos]
+            i = step.idx
+            b = bind_action(step, row)
+
+            act_span = start_action(step, b, page.url, trace_route)
+            timer = PhaseTimer()
+            # pre-wait in case action references a pageUrl we should be at
+            if b.target and page.url != b.target:
+                with timer.phase("nav"):
+                    try:
+                        page.wait_for_url(b.target, timeout=3000)
+                    except Exception:
+                        if step.explicit_nav:
+                            print(f"  forcing navigation to {b.target} because action contains explicit url")
+                            page.goto(b.target, timeout=step.nav_timeout)
+                            wait_after_actions(page, 1, settler)
+
+            before_ss = None
+            after_ss  = None
+            if SCREENSHOT_EVERY_ACTION:
+                with timer.phase("ss_before"):
+                    before_ss = take_screenshot(page, run_ss_folder, f"before_action{i:02d}", shots)
+
+            # Do the action
+            act_url = b.nav_url if step.kind == "goto" else page.url
+            t_act = time.perf_counter()
+            try:
+                do_action(page, b, settler=settler, timer=timer)
+                with timer.phase("settle"):
+                    wait_after_actions(page, 0.15, settler)
+                act_status = "OK"
+                act_note = ""
+            except Exception as e:
+                act_status = "FAIL"
+                act_note = str(e)
+                status = "FAIL"
+                note = act_note
+                if SCREENSHOT_ON_FAILURE and not fail_ss:
+                    with timer.phase("ss_after"):
+                        fail_ss = take_screenshot(page, run_ss_folder, f"fail_action{i:02d}", shots)
+
+            t_elapsed = time.perf_counter()
+            if SCREENSHOT_EVERY_ACTION:
+                with timer.phase("ss_after"):
+                    after_ss = take_screenshot(page, run_ss_folder, f"after_action{i:02d}", shots)
 
-    # Create a timestamped run folder
+            # Log action
+            action_logs.append(finish_action(step, b, act_span, timer, act_status, act_note, before_ss, after_ss,
+                                             (t_elapsed - t_act) * 1000, act_url))
+
+            if sess_key and not first_step and pos + 1 == plan.login.end and status == "PASS":
+                save_session(page, plan, sessions, sess_key)
+
+        # End-of-run success screenshot
+        if SCREENSHOT_ON_SUCCESS_END and status == "PASS":
+            final_ss = take_screenshot(page, run_ss_folder, "final_page", shots)
+
+        # replaced emojis with ASCII
+        print(f"  [{'PASS' if status=='PASS' else 'FAIL'}] Run {idx} {status}")
+
+    except Exception as e:
+        status = "FAIL"
+        note = f"Run-level error: {e}"
+        if SCREENSHOT_ON_FAILURE and not fail_ss:
+            fail_ss = take_screenshot(page, run_ss_folder, f"fail_runlevel", shots)
+
+    finally:
+        if act_span is not None and not act_span.ended:
+            act_span.fail(note).end()
+        end_ts = time.time()
+        if shots is not None:
+            # frames are written in the background; wait for this row's
+            with TRACER.span("report"):
+                shots.wait(run_ss_folder)
+        try:
+            page.close()
+            if session_ctx is not None:
+                run_metrics.context_closed()
+                session_ctx.close()
+        except Exception:
+            pass
+    return finish_row(idx, row, row_span, status, note, action_logs, fail_ss, final_ss, start_str, start_ts, end_ts,
+                      settler, shots)
+
+def _worker(worker_id: int, plan: ActionPlan, feed: RowFeed, done: "queue.Queue", screenshots_root: Path, part_path: Path,
+            shots: Optional[ScreenshotPipeline] = None, sessions: Optional[SessionCache] = None):
+    """Worker thread: owns one Playwright instance, browser and isolated context
+    (the sync API is bound to the thread that created it) and pulls rows from
+    `feed` until the dataset is exhausted. Each worker streams its action records to its own
+    JSONL part file; results are handed back through `done`."""
+    try:
+        with sync_playwright() as pw:
+            browser = launch_browser(pw, slot=worker_id - 1)   # warm pool or local launch
+            context = browser.new_context()
+            run_metrics.context_opened()
+            try:
+                with open(part_path, "w", encoding="utf-8") as jsonl:
+                    while True:
+                        job = feed.take()
+                        if job is None:
+                            break
+                        idx, row = job
+                        result, records = run_row(context, plan, idx, row, screenshots_root, shots, sessions)
+                        for rec in records:
+                            jsonl.write(json.dumps(rec, ensure_ascii=False) + "\n")
+                        jsonl.flush()
+                        done.put((idx, result, None))
+            finally:
+                run_metrics.context_closed()
+            context.close()
+            browser.close()
+    except Exception as e:
+        done.put((None, None, f"worker {worker_id} crashed: {e}"))
+    finally:
+        done.put((None, None, None))  # worker finished marker
+
+def _merge_action_logs(part_paths: List[Path], out_path: Path):
+    """Merge the per-worker JSONL parts into one file ordered by run/action index.
+    Each part is already ordered (workers take rows in order) so a streaming
+    k-way merge is enough."""
+    files = [open(p, "r", encoding="utf-8") for p in part_paths if p.exists()]
+    try:
+        streams = [(json.loads(line) for line in f if line.strip()) for f in files]
+        with open(out_path, "w", encoding="utf-8") as out:
+            for rec in heapq.merge(*streams, key=lambda r: (r["run_index"], r["action_index"])):
+                out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    finally:
+        for f in files:
+            f.close()
+    for p in part_paths:
+        try:
+            p.unlink()
+        except Exception:
+            pass
+
+def _iter_jsonl(path: Path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def prepare_run_folder(actions, feed: RowFeed, compaction=None) -> Tuple[str, Path, Path]:
+    """Create the timestamped run folder, snapshot the inputs and return
+    (timestamp, run_folder, screenshots_root). Dataset rows are appended to the
+    snapshot by `feed` as they are handed to workers."""
     root_reports = ensure_base(REPORT_DIR)
     ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     run_folder = root_reports / ts
@@ -406,187 +1428,128 @@ def run_all():
     # Persist copies of inputs for traceability
     with open(run_folder / "inputs_snapshot.json", "w", encoding="utf-8") as f:
         json.dump({"actions": actions}, f, indent=2, ensure_ascii=False)
-    with open(run_folder / "data_rows_snapshot.json", "w", encoding="utf-8") as f:
-        json.dump({"rows": data_rows}, f, indent=2, ensure_ascii=False)
+    feed.open_snapshot(run_folder / "data_rows_snapshot.json")
+    if compaction:
+        with open(run_folder / "compaction_report.json", "w", encoding="utf-8") as f:
+            json.dump(compaction, f, indent=2, ensure_ascii=False)
 
     # Where screenshots live
     screenshots_root = run_folder / "screenshots"
     screenshots_root.mkdir(parents=True, exist_ok=True)
+    return ts, run_folder, screenshots_root
+
+def open_report_stream(run_folder: Path, ts: str, actions) -> ReportStream:
+    """Start the incremental results.txt / PDF writer for this run. The dataset is
+    streamed, so its size is only known at the end (Total Runs in the summary)."""
+    project_title = "Data-Driven UI Test Report"
+    usecase_title = f"Run: {ts} | Actions: {len(actions)} | Dataset: {DATA_CSV}"
+    return ReportStream(run_folder, project_title, usecase_title)
+
+def open_tracer(run_folder: Path, engine: str) -> Tracer:
+    """Point TRACER at this run's trace file and open the suite span."""
+    global TRACER
+    TRACER = Tracer(run_folder / "trace.otlp.jsonl" if TRACING else None, service="dd-runner")
+    TRACER.start_root("suite", **{"dd.dataset": str(DATA_CSV), "dd.engine": engine, "dd.run_folder": str(run_folder)})
+    return TRACER
+
+def close_tracer(tracer: Tracer, report: "ReportStream"):
+    if tracer.root is not None:
+        tracer.root.set(**{"dd.rows": report.rows})
+        if report.any_failed or report.error:
+            tracer.root.fail("one or more rows failed")
+    tracer.close()
+    if tracer.enabled:
+        print(f"Trace: {tracer.exported} spans written to {tracer.path}")
+
+def update_latency_history(run_folder: Path):
+    """Feed this run's successful action latencies back into the adaptive timeouts."""
+    if not ADAPTIVE_TIMEOUTS:
+        return
+    history = load_latency_history()
+    n = history.ingest(_iter_jsonl(run_folder / "actions_log.jsonl"))
+    history.save()
+    print(f"Latency history: {n} samples added to {history.path}")
 
-    # Action CSV (flat)
+def write_action_csv(run_folder: Path):
+    """Write actions_log.csv, streamed back from the merged actions_log.jsonl."""
     action_csv_path = run_folder / "actions_log.csv"
     action_json_path = run_folder / "actions_log.jsonl"
-    results_txt_path = run_folder / "results.txt"
-
-    results: List[RunResult] = []
-
-    with sync_playwright() as pw:
-        browser = pw.chromium.launch(headless=False)
-        context = browser.new_context()
-        overall_actions_records = []  # for CSV
-        jsonl = open(action_json_path, "w", encoding="utf-8")
-
-        for idx, row in enumerate(data_rows, start=1):
-            print(f"\n=== RUN {idx}: {row} ===")
-            page = context.new_page()
-
-            run_ss_folder = screenshots_root / f"run_{idx:03d}"
-            run_ss_folder.mkdir(parents=True, exist_ok=True)
-
-            start_ts = time.time()
-            start_str = _timestamp()
-            action_logs: List[ActionLog] = []
-            fail_ss = None
-            final_ss = None
-            status = "PASS"
-            note = ""
-
-            try:
-                # Decide starting URL
-                initial = choose_initial_url(actions)
-                if initial:
-                    print(f"  navigating to initial URL: {initial}")
-                    page.goto(initial, timeout=NAV_TIMEOUT)
-                    wait_after_actions(page, 2)
-
-                # iterate actions
-                for i, action in enumerate(actions, start=1):
-                    # Determine next action pageUrl (for nav wait decision)
-                    next_page_url = None
-                    for a in actions[i:]:
-                        if a.get("pageUrl") or a.get("url"):
-                            next_page_url = a.get("pageUrl") or a.get("url")
-                            break
-
-                    # pre-wait in case action references a pageUrl we should be at
-                    target = action.get("pageUrl") or action.get("url")
-                    if target:
-                        target_r = render(target, row)
-                        if page.url != target_r:
-                            try:
-                                page.wait_for_url(target_r, timeout=3000)
-                            except Exception:
-                                if action.get("type") == "goto" or (action.get("type") == "click" and not action.get("selector") and action.get("url")):
-                                    print(f"  forcing navigation to {target_r} because action contains explicit url")
-                                    page.goto(target_r, timeout=NAV_TIMEOUT)
-                                    wait_after_actions(page, 1)
-
-                    before_ss = None
-                    after_ss  = None
-                    if SCREENSHOT_EVERY_ACTION:
-                        before_ss = take_screenshot(page, run_ss_folder, f"before_action{i:02d}")
-
-                    # Do the action
-                    try:
-                        do_action(page, action, row, next_action_pageUrl=next_page_url)
-                        wait_after_actions(page, 0.15)
-                        act_status = "OK"
-                        act_note = ""
-                    except Exception as e:
-                        act_status = "FAIL"
-                        act_note = str(e)
-                        status = "FAIL"
-                        note = act_note
-                        if SCREENSHOT_ON_FAILURE and not fail_ss:
-                            fail_ss = take_screenshot(page, run_ss_folder, f"fail_action{i:02d}")
-
-                    if SCREENSHOT_EVERY_ACTION:
-                        after_ss = take_screenshot(page, run_ss_folder, f"after_action{i:02d}")
-
-                    # Log action
-                    al = ActionLog(
-                        idx=i,
-                        type=action.get("type"),
-                        selector=render(action.get("selector"), row) if action.get("selector") else None,
-                        value=render(action.get("value"), row) if action.get("value") else None,
-                        status=act_status,
-                        note=act_note,
-                        before_ss=before_ss,
-                        after_ss=after_ss
-                    )
-                    action_logs.append(al)
-                    # also append to overall action CSV list
-                    rec = {
-                        "run_index": idx,
-                        "row": json.dumps(row, ensure_ascii=False),
-                        "action_index": i,
-                        "type": al.type,
-                        "selector": al.selector or "",
-                        "value": al.value or "",
-                        "status": al.status,
-                        "note": al.note,
-                        "before_ss": al.before_ss or "",
-                        "after_ss": al.after_ss or "",
-                        "timestamp": _timestamp(),
-                    }
-                    overall_actions_records.append(rec)
-                    jsonl.write(json.dumps(rec, ensure_ascii=False) + "\n")
-
-                # End-of-run success screenshot
-                if SCREENSHOT_ON_SUCCESS_END and status == "PASS":
-                    final_ss = take_screenshot(page, run_ss_folder, "final_page")
-
-                # replaced emojis with ASCII
-                print(f"  [{'PASS' if status=='PASS' else 'FAIL'}] Run {idx} {status}")
+    with open(action_csv_path, "w", newline="", encoding="utf-8") as cf:
+        writer = csv.DictWriter(cf, fieldnames=ACTION_RECORD_FIELDS)
+        writer.writeheader()
+        for rec in _iter_jsonl(action_json_path):
+            writer.writerow(rec)
+    print(f"Action log CSV written to {action_csv_path}")
 
-            except Exception as e:
-                status = "FAIL"
-                note = f"Run-level error: {e}"
-                if SCREENSHOT_ON_FAILURE and not fail_ss:
-                    fail_ss = take_screenshot(page, run_ss_folder, f"fail_runlevel")
-
-            finally:
-                end_ts = time.time()
-                end_str = _timestamp()
-                dur = max(0.0, end_ts - start_ts)
-                results.append(RunResult(
-                    row=row,
-                    status=status,
-                    note=note,
-                    action_logs=action_logs,
-                    fail_ss=fail_ss,
-                    final_ss=final_ss,
-                    start_time=start_str,
-                    end_time=end_str,
-                    duration_sec=dur
-                ))
-                try:
-                    page.close()
-                except Exception:
-                    pass
-
-        # Close helpers
-        jsonl.close()
-
-        # Write run-level summary txt
-        with open(results_txt_path, "w", encoding="utf-8") as rf:
-            for rr in results:
-                rf.write(f"{rr.row} -> {rr.status} {rr.note}\n")
-        print(f"\nResults written to {results_txt_path}")
-
-        # Write actions CSV
-        with open(action_csv_path, "w", newline="", encoding="utf-8") as cf:
-            writer = csv.DictWriter(cf, fieldnames=list(overall_actions_records[0].keys()) if overall_actions_records else [
-                "run_index","row","action_index","type","selector","value","status","note","before_ss","after_ss","timestamp"
-            ])
-            writer.writeheader()
-            for rec in overall_actions_records:
-                writer.writerow(rec)
-        print(f"Action log CSV written to {action_csv_path}")
-
-        # Build PDF
-        project_title = "Data-Driven UI Test Report"
-        usecase_title = f"Run: {ts} | Actions: {len(actions)} | Dataset rows: {len(data_rows)}"
-        pdf_path = build_pdf(run_folder, project_title, usecase_title, results)
-        print(f"PDF report created at: {pdf_path}")
+def run_all():
+    if ENGINE == "async":
+        import asyncio
+        from runtest_data_driven_async import run_all_async
+        return asyncio.run(run_all_async())
 
-        context.close()
-        browser.close()
+    actions, plan, compaction = load_plan()
+    run_metrics.serve(METRICS_PORT)
+    # rows are parsed lazily; only enough are read ahead to size the pool
+    feed = RowFeed(iter_data(plan_columns(plan)), lookahead=WORKERS)
 
+    ts, run_folder, screenshots_root = prepare_run_folder(actions, feed, compaction)
+    action_json_path = run_folder / "actions_log.jsonl"
+    tracer = open_tracer(run_folder, "sync")
+
+    # Workers pull rows from the feed as they free up; the report stream puts results
+    # back in row order, so output is deterministic regardless of which worker finishes first.
+    shots = new_screenshot_pipeline()
+    sessions = new_session_cache() if plan.login else None
+    report = open_report_stream(run_folder, ts, actions)
+    n_workers = max(1, min(WORKERS, len(feed.head)))
+    done: "queue.Queue" = queue.Queue()
+    part_paths = [run_folder / f"actions_log.w{w:02d}.jsonl" for w in range(1, n_workers + 1)]
+    threads = [
+        threading.Thread(target=_worker, args=(w, plan, feed, done, screenshots_root, part_paths[w - 1], shots, sessions),
+                         name=f"dd-worker-{w}", daemon=True)
+        for w in range(1, n_workers + 1)
+    ]
+    if n_workers > 1:
+        print(f"Running {DATA_CSV} on {n_workers} parallel workers")
+    for t in threads:
+        t.start()
+
+    errors: List[str] = []
+    remaining = n_workers
+    while remaining:
+        idx, result, err = done.get()
+        if idx is not None:
+            report.put(idx, result)
+        elif err:
+            errors.append(err)
+        else:
+            remaining -= 1
+    for t in threads:
+        t.join()
+    feed.close()
+    if feed.error:
+        errors.append(feed.error)
+    with tracer.span("report"):
+        shots.close()
+        report.close()
+        _merge_action_logs(part_paths, action_json_path)
+        write_action_csv(run_folder)
+    close_tracer(tracer, report)
+    for err in errors:
+        print(f"  [WARN] {err}")
+    if errors and not report.rows:
+        raise RuntimeError("; ".join(errors))
+    print(f"Screenshots: {shots.frames} captured, {shots.deduped} deduplicated, {shots.bytes_written/1e6:.1f} MB written")
+    if sessions:
+        print(f"Sessions: {sessions.hits - sessions.invalidated} logins skipped, {sessions.invalidated} expired")
+
+    update_latency_history(run_folder)
     print(f"\nAll artifacts saved under: {run_folder}")
+    exit_for_ci(report, feed.count, errors)
 
-    # ---- CI-friendly exit code (add this block) ----
-    if any(r.status == "FAIL" for r in results):
+def exit_for_ci(report: ReportStream, expected_rows: int, errors: Optional[List[str]] = None):
+    # ---- CI-friendly exit code ----
+    if errors or report.error or report.any_failed or report.rows < expected_rows:
         import sys
         sys.exit(1)
 
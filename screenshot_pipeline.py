@@ -0,0 +1,158 @@
+# screenshot_pipeline.py
+"""
+Background screenshot pipeline for the data-driven runners.
+
+page.screenshot() only grabs the encoded frame from the browser; decoding, perceptual
+hashing, optional re-encoding (WebP) and the disk write happen on a thread pool so
+capture latency no longer dominates each action.
+
+- viewport-only or full-page capture
+- png / jpeg (encoded by the browser) or webp (re-encoded with Pillow)
+- identical consecutive frames in the same folder are not written again - the
+  returned path is aliased to the earlier file, see resolve(). With max_distance=0
+  (default) frames must match pixel for pixel; with max_distance > 0 they are
+  compared by a 256-bit perceptual dHash and frames differing in at most that many
+  bits (cursor blink, spinner, anti-aliasing) are folded too.
+"""
+import hashlib
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional (it ships with reportlab, but be defensive)
+    Image = None
+
+_EXT = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+
+def _frame_hash(data: bytes, perceptual: bool = True):
+    """(256-bit difference hash, digest of the decoded pixels) for an encoded frame.
+    The dHash is None when not `perceptual`, and the digest falls back to the
+    encoded bytes when Pillow is missing."""
+    if Image is None:
+        return None, hashlib.sha1(data).hexdigest()
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            rgb = im.convert("RGB")
+            digest = hashlib.sha1(rgb.tobytes()).hexdigest()
+            if not perceptual:
+                return None, digest
+            small = rgb.convert("L").resize((17, 16))
+        px = list(small.getdata())
+        bits = 0
+        for row in range(16):
+            for col in range(16):
+                bits = (bits << 1) | (px[row * 17 + col] > px[row * 17 + col + 1])
+        return bits, digest
+    except Exception:
+        return None, hashlib.sha1(data).hexdigest()
+
+class ScreenshotPipeline:
+    def __init__(self, fmt="png", quality=70, full_page=True, dedup=True, workers=4, max_distance=0,
+                 on_write: Optional[Callable[[int], None]] = None):
+        if fmt == "webp" and Image is None:
+            print("  [WARN] webp screenshots need Pillow; falling back to png")
+            fmt = "png"
+        self.fmt = fmt
+        self.quality = quality
+        self.full_page = full_page
+        self.dedup = dedup
+        self.max_distance = max_distance   # dHash bits allowed to differ (0 = pixel-identical only)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shots")
+        self._lock = threading.Lock()
+        self._last: Dict[str, Future] = {}    # folder -> future of the last frame submitted there
+        self._aliases: Dict[str, str] = {}    # skipped path -> path of the identical earlier frame
+        self.frames = 0
+        self.deduped = 0
+        self.bytes_written = 0
+        self.on_write = on_write   # called with the byte count of every frame written (metrics)
+
+    def screenshot_kwargs(self) -> dict:
+        """Arguments for page.screenshot() (sync or async API)."""
+        kw = {"full_page": self.full_page}
+        if self.fmt == "jpeg":
+            kw.update(type="jpeg", quality=self.quality)
+        else:
+            kw["type"] = "png"   # webp is re-encoded from png in the background
+        return kw
+
+    def capture(self, page, folder: Path, prefix: str) -> Optional[str]:
+        try:
+            data = page.screenshot(**self.screenshot_kwargs())
+        except Exception:
+            return None
+        return self.submit(data, folder, prefix)
+
+    def submit(self, data: bytes, folder: Path, prefix: str) -> str:
+        """Queue an encoded frame for hashing/writing; returns its (eventual) path."""
+        folder.mkdir(parents=True, exist_ok=True)
+        fp = folder / f"{prefix}_{int(time.time()*1000)}.{_EXT[self.fmt]}"
+        key = str(folder)
+        with self._lock:
+            prev = self._last.get(key)
+            fut = self._pool.submit(self._process, data, str(fp), prev)
+            self._last[key] = fut
+            self.frames += 1
+        return str(fp)
+
+    def _process(self, data: bytes, path: str, prev: Optional[Future]):
+        """Returns (hash, path actually holding this frame) for the next frame in the folder.
+        Frames of one folder complete in submission order, so wait(folder) covers them all."""
+        h = _frame_hash(data, perceptual=self.max_distance > 0) if self.dedup else None
+        prev_hash, prev_path = None, None
+        if prev is not None:
+            try:
+                prev_hash, prev_path = prev.result()
+            except Exception:
+                pass
+        if self.dedup and prev_hash is not None and prev_path:
+            if self._same(h, prev_hash):
+                with self._lock:
+                    self._aliases[path] = prev_path
+                    self.deduped += 1
+                return prev_hash, prev_path
+        if self.fmt == "webp":
+            with Image.open(io.BytesIO(data)) as im:
+                buf = io.BytesIO()
+                im.save(buf, format="WEBP", quality=self.quality)
+                data = buf.getvalue()
+        with open(path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            self.bytes_written += len(data)
+        if self.on_write is not None:
+            self.on_write(len(data))
+        return h, path
+
+    def _same(self, a, b) -> bool:
+        (a_bits, a_digest), (b_bits, b_digest) = a, b
+        if self.max_distance > 0 and a_bits is not None and b_bits is not None:
+            return bin(a_bits ^ b_bits).count("1") <= self.max_distance
+        return a_digest == b_digest
+
+    def wait(self, folder: Optional[Path] = None):
+        """Block until frames queued for `folder` (or all folders) are on disk."""
+        with self._lock:
+            futs = [self._last.get(str(folder))] if folder is not None else list(self._last.values())
+        for fut in futs:
+            if fut is None:
+                continue
+            try:
+                fut.result()
+            except Exception:
+                pass
+
+    def resolve(self, path: Optional[str]) -> Optional[str]:
+        """Map a returned path to the file that actually holds the frame (after dedup)."""
+        if not path:
+            return path
+        with self._lock:
+            return self._aliases.get(path, path)
+
+    def close(self):
+        self.wait()
+        self._pool.shutdown(wait=True)
@@ -0,0 +1,87 @@
+# session_cache.py
+"""
+Playwright storage-state cache used to skip repeated logins.
+
+After a successful login the runner saves context.storage_state() (cookies +
+localStorage) under a key derived from the login identity (app origin + the
+credential values). Later rows / runs with the same identity open their context
+with new_context(storage_state=...) and go straight to the first post-login
+step; the runner validates the state cheaply (the login form must not come
+back) and falls back to a real login - invalidating the entry - if the server
+session has expired.
+
+- entries expire after `ttl_sec` (default SESSION_TTL_SEC in the runners)
+- keys are SHA-256 digests; credentials are never written to disk in clear
+- states are kept in memory too, so concurrent rows of one run share them
+- the cache directory holds live session cookies: keep it out of source control
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+class SessionCache:
+    def __init__(self, cache_dir: Path, ttl_sec: float = 1800):
+        self.cache_dir = Path(cache_dir)
+        self.ttl_sec = ttl_sec
+        self._lock = threading.Lock()
+        self._mem: Dict[str, tuple] = {}   # key -> (saved_at, state)
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    @staticmethod
+    def key(origin: str, identity: Dict[str, Any]) -> str:
+        raw = json.dumps({"origin": origin or "", "identity": identity}, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached storage state for `key`, or None if missing / expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry and now - entry[0] < self.ttl_sec:
+                self.hits += 1
+                return entry[1]
+        p = self._path(key)
+        try:
+            saved_at = p.stat().st_mtime
+            if now - saved_at >= self.ttl_sec:
+                p.unlink()
+                raise FileNotFoundError(p)
+            with open(p, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self._mem.pop(key, None)
+                self.misses += 1
+            return None
+        with self._lock:
+            self._mem[key] = (saved_at, state)
+            self.hits += 1
+        return state
+
+    def save(self, key: str, state: Dict[str, Any]):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        p = self._path(key)
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, p)
+        with self._lock:
+            self._mem[key] = (time.time(), state)
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._mem.pop(key, None)
+            self.invalidated += 1
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
@@ -0,0 +1,115 @@
+# siebel_activity.py
+"""
+Event-driven Siebel readiness shared by the Siebel runners (siebel_template.py,
+Demo/siebel_template_workingsuccess.py).
+
+PageActivity follows a page's navigation and network events, so readiness is
+'nothing happened for quiet_ms and no frame shows a busy indicator' rather than
+sampling frame URLs every 0.8s. Call page_activity(page) right after creating
+the page, then wait_until_quiet(page, max_wait, quiet_ms) wherever the runner
+waits for the app to settle.
+"""
+import time
+from typing import Dict
+
+# Visible while Siebel is still processing (masks, spinners); extend per deployment
+BUSY_INDICATORS = [
+    ".siebui-busy",
+    ".siebui-mask-overlay",
+    "#maskoverlay",
+    ".ui-widget-overlay",
+    ".siebui-loading",
+]
+
+# Evaluated once per frame: true while the document is loading or a busy indicator is visible
+BUSY_PROBE_JS = """
+(sels) => {
+  if (document.readyState !== 'complete') return true;
+  for (const s of sels) {
+    let els;
+    try { els = document.querySelectorAll(s); } catch (e) { continue; }
+    for (const el of els) {
+      const r = el.getBoundingClientRect();
+      if (r.width > 0 && r.height > 0 && getComputedStyle(el).visibility !== 'hidden') return true;
+    }
+  }
+  return false;
+}
+"""
+
+class PageActivity:
+    """
+    Tracks navigation and network activity of a page from Playwright events, so
+    readiness can be decided from 'nothing happened for quiet_ms' instead of
+    sampling frame URLs every 0.8s. Requests open longer than LONG_POLL_SEC
+    (Siebel notification polling) do not count as activity.
+    """
+    LONG_POLL_SEC = 10
+
+    def __init__(self, page):
+        self.inflight = {}
+        self.last_activity = time.perf_counter()
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_request_done)
+        page.on("requestfailed", self._on_request_done)
+        for ev in ("framenavigated", "frameattached", "framedetached", "domcontentloaded", "load"):
+            page.on(ev, self._on_activity)
+
+    def _on_request(self, req):
+        self.inflight[req] = time.perf_counter()
+        self.last_activity = time.perf_counter()
+
+    def _on_request_done(self, req):
+        self.inflight.pop(req, None)
+        self.last_activity = time.perf_counter()
+
+    def _on_activity(self, *_):
+        self.last_activity = time.perf_counter()
+
+    def idle_since(self, since: float) -> float:
+        """Seconds without activity, counted from no earlier than `since`."""
+        now = time.perf_counter()
+        if any(now - t < self.LONG_POLL_SEC for t in self.inflight.values()):
+            return 0.0
+        return now - max(self.last_activity, since)
+
+_ACTIVITY: Dict[int, PageActivity] = {}   # id(page) -> PageActivity
+
+def page_activity(page) -> PageActivity:
+    """Activity tracker for `page`; call right after creating the page so no event is missed."""
+    act = _ACTIVITY.get(id(page))
+    if act is None:
+        act = _ACTIVITY[id(page)] = PageActivity(page)
+        page.on("close", lambda _p: _ACTIVITY.pop(id(page), None))
+    return act
+
+def siebel_busy(page) -> bool:
+    for f in page.frames:
+        try:
+            if f.evaluate(BUSY_PROBE_JS, BUSY_INDICATORS):
+                return True
+        except Exception:
+            continue   # frame detached mid-probe: the activity tracker sees that
+    return False
+
+def wait_until_quiet(page, max_wait: float, quiet_ms: int) -> bool:
+    """
+    True once no navigation / network activity happened for `quiet_ms` and no
+    frame is loading or busy; False after `max_wait` seconds. The quiet window
+    starts no earlier than the call, so a navigation triggered by the preceding
+    click is not missed.
+    """
+    act = page_activity(page)
+    quiet = quiet_ms / 1000.0
+    start = time.perf_counter()
+    while time.perf_counter() - start < max_wait:
+        idle = act.idle_since(start)
+        if idle >= quiet:
+            if not siebel_busy(page):
+                return True
+            page.wait_for_timeout(50)
+        else:
+            # wait_for_timeout (not time.sleep) so Playwright keeps dispatching page events
+            page.wait_for_timeout(max(20, int((quiet - idle) * 1000)))
+    print(f"  ⚠ wait_for_home_ready timed out after {max_wait:.0f}s (inflight={len(act.inflight)})")
+    return False
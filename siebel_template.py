@@ -7,11 +7,21 @@ Robust Siebel replay script with:
 - minimal invasive changes - drop-in replacement
 """
 import json
+import os
+import re
 import time
 import traceback
+from collections import OrderedDict
 from pathlib import Path
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
 
+from session_cache import SessionCache
+from latency_history import LatencyHistory, selector_key, wait_key, page_key
+from tracing import Tracer, TraceparentRoute
+import run_metrics
+from browser_server import launch_browser, default_headless
+from siebel_activity import page_activity, wait_until_quiet
+
 # -------- Config ----------
 ACTIONS_FILE = "recorded_test_siebel.json"
 CONFIG_FILE = "config.json"
@@ -21,6 +31,18 @@ RETRY_COUNT = 6
 RETRY_DELAY = 0.8
 HOME_STABLE_SECONDS = 3   # require no URL/frame changes for this many seconds
 HOME_MAX_WAIT = 60       # max seconds to wait for home to be ready
+HOME_READY_MODE = "event"  # "event": navigation/network quiet + no busy indicator; "legacy": URL-stability polling
+HOME_QUIET_MS = 300        # event mode: no activity for this long means ready
+SESSION_REUSE = True     # reuse the saved login (storage state) while it is still valid
+SESSION_TTL_SEC = 1200   # Siebel sessions time out server-side; keep this below that
+ADAPTIVE_TIMEOUTS = os.environ.get("ADAPTIVE_TIMEOUTS", "1") == "1"  # p99 x 1.5 of past runs instead of the fixed waits
+LATENCY_LOG = os.path.join(REPORT_DIR, "siebel_latency.jsonl")             # per-step latencies, appended every run
+LATENCY_HISTORY_FILE = os.path.join(REPORT_DIR, "siebel_latency_history.json")
+ADAPTIVE_TIMEOUT_CEIL_FACTOR = 2  # learned timeouts never exceed this x the fixed default
+TRACING = os.environ.get("TRACING", "1") == "1"  # suite -> action -> phase spans, OTLP/JSON (tracing.py)
+TRACE_FILE = os.path.join(REPORT_DIR, "siebel_trace.otlp.jsonl")
+TRACE_PROPAGATE = os.environ.get("TRACE_PROPAGATE", "0") == "1"  # traceparent to the Siebel origin only; opt-in (bypasses HTTP cache)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))  # Prometheus /metrics (run_metrics.py); 0 = off
 # ------------------------
 
 def load_config():
@@ -31,12 +53,57 @@ def load_actions():
     with open(ACTIONS_FILE, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def wait_for(page_or_frame, selector, timeout=WAIT_TIMEOUT):
+TRACER = Tracer(Path(TRACE_FILE) if TRACING else None, service="siebel-replay")
+
+# ---------- Latency history ----------
+LATENCY = LatencyHistory(Path(LATENCY_HISTORY_FILE)) if ADAPTIVE_TIMEOUTS else None
+LATENCY_RUN = []  # this run's records, flushed to LATENCY_LOG / the history at the end
+
+def adaptive_ms(key, default_ms, floor_ms=1000):
+    """Learned timeout for `key`, or `default_ms` until enough history exists."""
+    if LATENCY is None:
+        return default_ms
+    return LATENCY.timeout(key, default_ms, floor_ms=floor_ms, ceil_ms=default_ms * ADAPTIVE_TIMEOUT_CEIL_FACTOR)
+
+def note_latency(kind, t0, ok, selector=None, key=None):
+    LATENCY_RUN.append({
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "type": kind,
+        "selector": selector or "",
+        "key": key or selector_key(selector) or "",
+        "status": "OK" if ok else "FAIL",
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+    })
+
+def flush_latency():
+    if not LATENCY_RUN:
+        return
     try:
-        return page_or_frame.wait_for_selector(selector, timeout=timeout)
-    except PWTimeout:
-        print(f"  ⚠ Timeout waiting for selector: {selector}")
-        return None
+        Path(LATENCY_LOG).parent.mkdir(parents=True, exist_ok=True)
+        with open(LATENCY_LOG, "a", encoding="utf-8") as f:
+            for rec in LATENCY_RUN:
+                f.write(json.dumps(rec) + "\n")
+        if LATENCY is not None:
+            LATENCY.ingest(LATENCY_RUN)
+            LATENCY.save()
+    except OSError as e:
+        print(f"  ⚠ could not write latency history: {e}")
+    LATENCY_RUN.clear()
+
+def wait_for(page_or_frame, selector, timeout=None):
+    if timeout is None:
+        timeout = adaptive_ms(wait_key(selector), WAIT_TIMEOUT)
+    t0 = time.perf_counter()
+    with TRACER.span("wait", **{"siebel.selector": selector, "siebel.timeout_ms": timeout}) as span:
+        try:
+            h = page_or_frame.wait_for_selector(selector, timeout=timeout)
+            note_latency("wait", t0, True, selector=selector, key=wait_key(selector))
+            return h
+        except PWTimeout:
+            note_latency("wait", t0, False, selector=selector, key=wait_key(selector))
+            span.fail("timeout")
+            print(f"  ⚠ Timeout waiting for selector: {selector} ({timeout} ms)")
+            return None
 
 # ---------- Fill / click helpers ----------
 def safe_fill(ctx, selector, value):
@@ -61,25 +128,133 @@ def safe_fill(ctx, selector, value):
             print(f"  ⚠ Fill failed for {selector}: {e}")
             return False
 
+class FrameCache:
+    """
+    Remembers which frame last contained a selector (or text) so repeated lookups
+    resolve with a single query instead of scanning every frame. Entries for a
+    frame are dropped when it navigates or detaches, and everything is dropped
+    when a frame is attached (the view layout changed). A hit is still verified
+    by querying the cached frame, so a stale entry costs one extra round-trip.
+    """
+    def __init__(self):
+        self._pages = {}   # id(page) -> {key: frame}
+        self.hits = 0
+        self.misses = 0
+
+    def _entries(self, page):
+        entries = self._pages.get(id(page))
+        if entries is None:
+            entries = self._pages[id(page)] = {}
+            page.on("frameattached", lambda _f: entries.clear())
+            page.on("framenavigated", lambda f: self._drop(entries, f))
+            page.on("framedetached", lambda f: self._drop(entries, f))
+            page.on("close", lambda _p: self._pages.pop(id(page), None))
+        return entries
+
+    @staticmethod
+    def _drop(entries, frame):
+        for k in [k for k, f in entries.items() if f is frame]:
+            entries.pop(k, None)
+
+    def get(self, page, key):
+        f = self._entries(page).get(key)
+        if f is None:
+            self.misses += 1
+        return f
+
+    def put(self, page, key, frame):
+        self._entries(page)[key] = frame
+
+    def forget(self, page, key):
+        self._entries(page).pop(key, None)
+
+FRAME_CACHE = FrameCache()
+
+# Evaluated once per frame: which of the given selectors match in this document
+# (null where querySelector rejects the selector, e.g. Playwright-only syntax)
+PROBE_JS = """
+(sels) => sels.map(s => { try { return document.querySelector(s) !== null; } catch (e) { return null; } })
+"""
+
+def probe_selectors(page, selectors):
+    """
+    Check a whole batch of selectors with one evaluate() per frame (top document
+    first, then child frames) instead of one query_selector per selector x frame.
+    Returns {selector: page-or-frame} with the first context each selector matched in;
+    unmatched selectors are absent. Matches also seed FRAME_CACHE.
+
+    The probe only understands plain CSS and does not pierce shadow roots, so a
+    selector it rejects or misses (recorded `text=`, `:has-text()`, `>> nth=0`,
+    xpath, ...) is retried with frame.query_selector on each frame, as before.
+    """
+    selectors = list(dict.fromkeys(selectors))
+    found = {}
+    frames = page.frames   # page.frames[0] is the main frame
+    for f in frames:
+        pending = [sel for sel in selectors if sel not in found]
+        if not pending:
+            break
+        try:
+            hits = f.evaluate(PROBE_JS, pending)
+        except Exception:
+            continue   # detached / navigating frame
+        for sel, hit in zip(pending, hits):
+            if hit:
+                found[sel] = page if f is page.main_frame else f
+                FRAME_CACHE.put(page, sel, f)
+    for sel in selectors:
+        if sel in found:
+            continue
+        for f in frames:
+            try:
+                if f.query_selector(sel):
+                    found[sel] = page if f is page.main_frame else f
+                    FRAME_CACHE.put(page, sel, f)
+                    break
+            except Exception:
+                continue
+    return found
+
 def find_frame_containing(page, selector):
-    try:
-        h = page.query_selector(selector)
-        if h:
-            return page, h
-    except Exception:
-        pass
-    for f in page.frames:
+    # one hop when the layout has not changed since the last lookup
+    cached = FRAME_CACHE.get(page, selector)
+    if cached is not None:
         try:
-            h = f.query_selector(selector)
+            h = cached.query_selector(selector)
             if h:
-                return f, h
+                FRAME_CACHE.hits += 1
+                # top-level hits are handed back as the page, as before
+                return (page if cached is page.main_frame else cached), h
         except Exception:
-            continue
+            pass
+        FRAME_CACHE.forget(page, selector)
+    ctx = probe_selectors(page, [selector]).get(selector)
+    if ctx is not None:
+        try:
+            h = ctx.query_selector(selector)
+            if h:
+                return ctx, h
+        except Exception:
+            pass
     return None, None
 
+def click_attempts(selector):
+    """Retries sized to how long this selector took to become clickable before (2..RETRY_COUNT)."""
+    budget = adaptive_ms(selector_key(selector), RETRY_COUNT * RETRY_DELAY * 1000)
+    return max(2, min(RETRY_COUNT, -(-budget // int(RETRY_DELAY * 1000))))
+
 def robust_click(page, selector=None, by_text=None):
+    t0 = time.perf_counter()
+    ok = _robust_click(page, selector, by_text)
+    if selector:
+        note_latency("click", t0, ok, selector=selector)
+    return ok
+
+def _robust_click(page, selector=None, by_text=None):
     last_err = None
-    for attempt in range(RETRY_COUNT):
+    for attempt in range(click_attempts(selector) if selector else RETRY_COUNT):
+        if attempt:
+            run_metrics.add_click_retries(1)
         try:
             if selector:
                 ctx, handle = find_frame_containing(page, selector)
@@ -109,12 +284,17 @@ def robust_click(page, selector=None, by_text=None):
                             return True
                     except Exception:
                         pass
-                    for f in page.frames:
+                    # cached frame for this text first, then every frame
+                    text_key = ("text", txt)
+                    cached = FRAME_CACHE.get(page, text_key)
+                    frames = [cached] + [f for f in page.frames if f is not cached] if cached else page.frames
+                    for f in frames:
                         try:
                             loc = f.locator(f'text="{txt}"')
                             if loc.count() > 0:
                                 loc.first.scroll_into_view_if_needed()
                                 loc.first.click(timeout=4000)
+                                FRAME_CACHE.put(page, text_key, f)
                                 return True
                         except Exception:
                             continue
@@ -137,65 +317,217 @@ def safe_select(ctx, selector, value):
         print(f"  ⚠ safe_select failed for {selector}: {e}")
         return False
 
+# ---------- view anchor index ----------
+VIEW_ANCHOR_SELECTOR = "a[href*='SWEView=']"
+
+# Evaluated once per frame: href / text / visibility of every view anchor
+ANCHOR_INDEX_JS = """
+(sel) => Array.from(document.querySelectorAll(sel)).map((a, i) => {
+  const r = a.getBoundingClientRect();
+  return {
+    i,
+    href: a.getAttribute('href') || '',
+    text: (a.innerText || a.textContent || '').trim().slice(0, 200),
+    visible: r.width > 0 && r.height > 0 && getComputedStyle(a).visibility !== 'hidden',
+  };
+})
+"""
+
+class AnchorIndex:
+    """
+    All SWEView anchors of the current view, read with one evaluate() per frame
+    (instead of query_selector_all + one evaluate per anchor) and cached per
+    (view URL, frame URL) for later actions on the same view. Anchors are clicked
+    by position via a locator after checking the href still matches, so a stale
+    entry just fails its click and the caller can invalidate and rescan.
+    """
+    MAX_ENTRIES = 64
+
+    def __init__(self):
+        self._cache = OrderedDict()   # (page url, frame name, frame url) -> [anchor dicts]
+
+    def _key(self, page, frame):
+        return (page.url, frame.name, frame.url)
+
+    def anchors(self, page):
+        """[(frame, {i, href, text, visible}), ...] over all frames of the page."""
+        out = []
+        for f in page.frames:
+            key = self._key(page, f)
+            entries = self._cache.get(key)
+            if entries is None:
+                try:
+                    entries = f.evaluate(ANCHOR_INDEX_JS, VIEW_ANCHOR_SELECTOR)
+                except Exception:
+                    continue
+                self._cache[key] = entries
+                while len(self._cache) > self.MAX_ENTRIES:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.move_to_end(key)
+            out.extend((f, a) for a in entries)
+        return out
+
+    def click(self, page, frame, anchor) -> bool:
+        loc = frame.locator(VIEW_ANCHOR_SELECTOR).nth(anchor["i"])
+        try:
+            # make sure position i is still the indexed anchor before clicking it
+            if not loc.evaluate("(el, h) => (el.getAttribute('href') || '') === h", anchor["href"], timeout=2000):
+                return False
+        except Exception:
+            return False
+        try:
+            loc.click(timeout=2000)
+            return True
+        except Exception:
+            try:
+                loc.evaluate("(el) => el.click()", timeout=2000)
+                return True
+            except Exception:
+                return False
+
+    def invalidate(self, page):
+        for key in [k for k in self._cache if k[0] == page.url]:
+            self._cache.pop(key, None)
+
+ANCHOR_INDEX = AnchorIndex()
+
 # ---------- generic tab handler ----------
+# Each strategy returns True when it clicked/selected the tab.
+def _tab_by_selector(page, sel, val):
+    # recorded selector (frame-aware)
+    return bool(sel) and robust_click(page, selector=sel)
+
+def _tab_by_value_text(page, sel, val):
+    # recorded value as text (if present and not a template); a view anchor with
+    # exactly that text is clicked straight from the index
+    if not (val and isinstance(val, str) and "{{" not in val):
+        return False
+    txt = val.strip()
+    for f, a in ANCHOR_INDEX.anchors(page):
+        if a["visible"] and a["text"] == txt and ANCHOR_INDEX.click(page, f, a):
+            return True
+    return robust_click(page, by_text=txt)
+
+def _tab_by_tokens(page, sel, val):
+    # words of the value, longest first (e.g. "Service Requests" -> "Requests", "Service")
+    if not (val and isinstance(val, str)):
+        return False
+    tokens = [t.strip() for t in val.replace("+", " ").replace("_", " ").split() if t.strip()]
+    for t in sorted(tokens, key=lambda s: -len(s)):
+        if len(t) >= 3 and robust_click(page, by_text=t):
+            return True
+    return False
+
+def _tab_by_select_option(page, sel, val):
+    # selector points to a <select>: choose the option by value
+    if not sel:
+        return False
+    ctx, handle = find_frame_containing(page, sel)
+    if ctx and handle:
+        try:
+            handle.select_option(val)
+            return True
+        except Exception:
+            pass
+    return False
+
+def _tab_by_view_anchor(page, sel, val):
+    # any visible "SWEView=" anchor that is not home / preferences, from the bulk index
+    for attempt in range(2):
+        for f, a in ANCHOR_INDEX.anchors(page):
+            href = a["href"].lower()
+            if not a["visible"] or any(x in href for x in ["home+page", "system+preferences"]):
+                continue
+            if ANCHOR_INDEX.click(page, f, a):
+                return True
+        # index may be stale for this view (content changed without a URL change)
+        ANCHOR_INDEX.invalidate(page)
+    return False
+
+# default order; StrategyRanking reorders per (view, selector, value)
+TAB_STRATEGIES = {
+    "selector": _tab_by_selector,
+    "value_text": _tab_by_value_text,
+    "tokens": _tab_by_tokens,
+    "select_option": _tab_by_select_option,
+    "view_anchor": _tab_by_view_anchor,
+}
+# Only the precise strategies are reordered. The loose ones ("tokens" matches any
+# word of the value, "view_anchor" clicks any visible view link) can click the
+# wrong tab and still report success, so they stay last, in this order.
+RANKED_TAB_STRATEGIES = ("selector", "value_text", "select_option")
+FALLBACK_TAB_STRATEGIES = ("tokens", "view_anchor")
+
+class StrategyRanking:
+    """
+    Persisted order in which click_siebel_tab tries its precise strategies
+    (RANKED_TAB_STRATEGIES), per (view, selector, value). The strategy that won
+    moves to the front and the ones that failed before it move behind it, so
+    replays of the same recording go straight to the working strategy instead of
+    paying robust_click's retry budget on every miss. FALLBACK_TAB_STRATEGIES
+    always run last, and a fallback win leaves the ranking unchanged.
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._ranks = None
+
+    def _load(self):
+        if self._ranks is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._ranks = json.load(f)
+            except (OSError, ValueError):
+                self._ranks = {}
+        return self._ranks
+
+    @staticmethod
+    def key(page, sel, val) -> str:
+        m = re.search(r"SWEView=([^&#]*)", page.url or "")
+        return json.dumps([m.group(1) if m else "", sel or "", val if isinstance(val, str) else ""])
+
+    def order(self, key):
+        known = [n for n in self._load().get(key, []) if n in RANKED_TAB_STRATEGIES]
+        return known + [n for n in RANKED_TAB_STRATEGIES if n not in known] + list(FALLBACK_TAB_STRATEGIES)
+
+    def record(self, key, order, winner):
+        if winner not in RANKED_TAB_STRATEGIES:
+            return
+        ranked = [n for n in order if n in RANKED_TAB_STRATEGIES]
+        failed = ranked[:ranked.index(winner)]
+        rest = ranked[ranked.index(winner) + 1:]
+        new = [winner] + rest + failed
+        if self._load().get(key) != new:
+            self._ranks[key] = new
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_suffix(".tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._ranks, f, indent=2)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"  ⚠ could not save tab strategy ranking: {e}")
+
+TAB_RANKING = StrategyRanking(Path(REPORT_DIR) / "tab_strategy_rank.json")
+
 def click_siebel_tab(page, action):
     """
-    Generic handler: tries recorded selector, recorded value (text),
-    then falls back to any visible text found in the action or the selector's element text.
+    Generic handler: tries recorded selector, recorded value (text) and
+    select_option - in the order that worked last time for this
+    view/selector/value (see StrategyRanking) - then words of the value and
+    finally any SWEView anchor.
     Returns True on success.
     """
     sel = action.get("selector")
     val = action.get("value")
-    # 1) try selector (frame-aware)
-    if sel and robust_click(page, selector=sel):
-        return True
-    # 2) try recorded value as text (if present and not a template)
-    if val and isinstance(val, str) and "{{" not in val:
-        if robust_click(page, by_text=val.strip()):
+    key = TAB_RANKING.key(page, sel, val)
+    order = TAB_RANKING.order(key)
+    for name in order:
+        if TAB_STRATEGIES[name](page, sel, val):
+            if name != order[0] and name in RANKED_TAB_STRATEGIES:
+                print(f"  tab strategy '{name}' won; trying it first next time")
+            TAB_RANKING.record(key, order, name)
             return True
-    # 3) try common label strategies: split value if it contains pipes/commas, or try trimmed words
-    if val and isinstance(val, str):
-        # try tokens from value (e.g., "tabScreen9" might not be helpful, but other values may contain label)
-        tokens = [t.strip() for t in val.replace("+", " ").replace("_", " ").split() if t.strip()]
-        # try longer tokens first
-        tokens = sorted(tokens, key=lambda s: -len(s))
-        for t in tokens:
-            if len(t) >= 3 and robust_click(page, by_text=t):
-                return True
-    # 4) if selector points to a select element, try select_option by value
-    if sel:
-        ctx, handle = find_frame_containing(page, sel)
-        if ctx and handle:
-            try:
-                handle.select_option(val)
-                return True
-            except Exception:
-                pass
-    # 5) fallback: find anchors containing "SWEView=" with any non-home keywords and click the first sensible one
-    try:
-        for f in page.frames:
-            anchors = f.query_selector_all("a[href*='SWEView=']")
-            for a in anchors:
-                try:
-                    href = f.evaluate("(el) => el.getAttribute('href') || ''", a)
-                    if href and not any(x in href.lower() for x in ["home+page", "system+preferences"]):
-                        try:
-                            a.scroll_into_view_if_needed()
-                        except Exception:
-                            pass
-                        try:
-                            a.click(timeout=2000)
-                            return True
-                        except Exception:
-                            try:
-                                f.evaluate("(el) => el.click()", a)
-                                return True
-                            except Exception:
-                                continue
-                except Exception:
-                    continue
-    except Exception:
-        pass
     # all attempts failed
     print("  ⚠ click_siebel_tab: all strategies failed for action:", action)
     return False
@@ -209,46 +541,26 @@ def list_frames_for_debug(page):
     except Exception:
         pass
 
-IFRAME_CANDIDATES = [
-    "iframe[name='swepi']",
-    "iframe[name='swepi_main']",
-    "iframe#s_swepi_iframe",
-    "iframe",
-]
+LOGIN_FIELDS = ["#s_swepi_1", "#s_swepi_2"]
 
-def get_login_context(page, timeout_ms=30000, poll_interval=0.5):
-    waited = 0.0
-    while waited * 1000 < timeout_ms:
+def get_login_context(page, timeout_ms=30000, poll_interval=0.2):
+    """Poll for the login inputs in the page or any frame; each poll is a single
+    batched probe (see probe_selectors), so the interval can stay short."""
+    deadline = time.time() + timeout_ms / 1000.0
+    while True:
         try:
-            if page.query_selector("#s_swepi_1") or page.query_selector("#s_swepi_2"):
-                return page, "page"
+            found = probe_selectors(page, LOGIN_FIELDS)
         except Exception:
-            pass
-        for candidate in IFRAME_CANDIDATES:
-            try:
-                elems = page.query_selector_all(candidate)
-            except Exception:
-                elems = []
-            for e in elems:
-                try:
-                    f = e.content_frame()
-                    if not f:
-                        continue
-                    if f.query_selector("#s_swepi_1") or f.query_selector("#s_swepi_2"):
-                        return f, candidate
-                except Exception:
-                    continue
-        try:
-            for f in page.frames:
-                try:
-                    if f.query_selector("#s_swepi_1") or f.query_selector("#s_swepi_2"):
-                        return f, f.name or f.url or "unnamed-frame"
-                except Exception:
-                    continue
-        except Exception:
-            pass
+            found = {}
+        for sel in LOGIN_FIELDS:
+            ctx = found.get(sel)
+            if ctx is page:
+                return page, "page"
+            if ctx is not None:
+                return ctx, ctx.name or ctx.url or "unnamed-frame"
+        if time.time() >= deadline:
+            break
         time.sleep(poll_interval)
-        waited += poll_interval
     list_frames_for_debug(page)
     return None, None
 
@@ -262,7 +574,39 @@ def current_frame_urls(page):
     except Exception:
         return page.url or "", tuple()
 
-def wait_for_home_ready(page, max_wait=HOME_MAX_WAIT, stable_seconds=HOME_STABLE_SECONDS):
+def home_key(page, caller):
+    """Latency key for a home-readiness wait: post-login, post-tab and post-goto
+    waits take very different times, and all Siebel views share one path (the
+    view is the SWEView parameter), so both the caller and the view are in it."""
+    url = page.url or ""
+    view = re.search(r"[?&]SWEView=([^&#]*)", url)
+    return f"home:{caller}:{page_key(url) or ''}" + (f"#{view.group(1)}" if view else "")
+
+def wait_for_home_ready(page, max_wait=HOME_MAX_WAIT, stable_seconds=HOME_STABLE_SECONDS, quiet_ms=HOME_QUIET_MS,
+                        caller="home"):
+    """
+    Return True once no navigation / network activity happened for `quiet_ms`
+    and no frame is loading or showing a Siebel busy indicator; False on timeout.
+    The quiet window starts no earlier than the call, so a navigation triggered
+    by the preceding click is not missed. HOME_READY_MODE = "legacy" restores
+    the URL-stability polling (which uses `stable_seconds`). With
+    ADAPTIVE_TIMEOUTS, `max_wait` is replaced by the timeout learned for this
+    caller and page (see home_key).
+    """
+    key = home_key(page, caller)
+    max_wait = adaptive_ms(key, max_wait * 1000, floor_ms=5000) / 1000.0
+    t0 = time.perf_counter()
+    with TRACER.span("settle", **{"siebel.max_wait_s": max_wait}) as span:
+        if HOME_READY_MODE != "event":
+            ok = _wait_for_home_ready_polling(page, max_wait, stable_seconds)
+        else:
+            ok = wait_until_quiet(page, max_wait, quiet_ms)
+        if not ok:
+            span.fail("not ready")
+    note_latency("home", t0, ok, key=key)
+    return ok
+
+def _wait_for_home_ready_polling(page, max_wait=HOME_MAX_WAIT, stable_seconds=HOME_STABLE_SECONDS):
     """
     Wait until the page/frame URLs are stable for `stable_seconds` consecutively OR a known Siebel app element appears.
     Return True if ready, False if timeout.
@@ -279,25 +623,12 @@ def wait_for_home_ready(page, max_wait=HOME_MAX_WAIT, stable_seconds=HOME_STABLE
         "#s_sctrl",          # generic control
     ]
     while time.time() - start < max_wait:
-        # 1) check for app selectors in page or frames
+        # 1) check for app selectors in page or frames (one batched probe)
         try:
-            for sel in app_selectors:
-                # check top page
-                try:
-                    if page.query_selector(sel):
-                        # require a short wait to ensure stability
-                        time.sleep(1)
-                        return True
-                except Exception:
-                    pass
-                # check frames
-                for f in page.frames:
-                    try:
-                        if f.query_selector(sel):
-                            time.sleep(1)
-                            return True
-                    except Exception:
-                        continue
+            if probe_selectors(page, app_selectors):
+                # require a short wait to ensure stability
+                time.sleep(1)
+                return True
         except Exception:
             pass
         # 2) check for URL/frame stability
@@ -311,15 +642,24 @@ def wait_for_home_ready(page, max_wait=HOME_MAX_WAIT, stable_seconds=HOME_STABLE
                 return True
         time.sleep(0.8)
     # timed out
-    print(f"  ⚠ wait_for_home_ready timed out after {max_wait}s (last_state={last_state})")
+    print(f"  ⚠ wait_for_home_ready timed out after {max_wait:.0f}s (last_state={last_state})")
     return False
 
 # ---------- debug / screenshot helpers ----------
+DEBUG_SAVES = 0  # save_debug calls so far; an action that saved debug artifacts counts as failed
+
 def save_debug(page, tag="debug"):
+    global DEBUG_SAVES
+    DEBUG_SAVES += 1
+    with TRACER.span("screenshot", **{"siebel.tag": tag}):
+        _save_debug(page, tag)
+
+def _save_debug(page, tag):
     Path(REPORT_DIR).mkdir(parents=True, exist_ok=True)
     try:
         png = Path(REPORT_DIR) / f"{tag}_{int(time.time())}.png"
         page.screenshot(path=str(png), full_page=True)
+        run_metrics.add_screenshot_bytes(png.stat().st_size)
         print(f"Saved screenshot: {png}")
     except Exception:
         pass
@@ -331,10 +671,15 @@ def save_debug(page, tag="debug"):
         pass
 
 def save_success(page, tag="success"):
+    with TRACER.span("screenshot", **{"siebel.tag": tag}):
+        _save_success(page, tag)
+
+def _save_success(page, tag):
     Path(REPORT_DIR).mkdir(parents=True, exist_ok=True)
     try:
         png = Path(REPORT_DIR) / f"{tag}_{int(time.time())}.png"
         page.screenshot(path=str(png), full_page=True)
+        run_metrics.add_screenshot_bytes(png.stat().st_size)
         print(f"Saved success screenshot: {png}")
     except Exception:
         pass
@@ -359,16 +704,163 @@ def is_meaningful_goto(url):
         return True
     return False
 
+# ---------- login ----------
+def login(page, config, sessions=None, sess_key=None):
+    """Fill and submit the Siebel login form, then wait for home; the storage
+    state is saved to `sessions` once home is ready."""
+    # --- find login context and fill ---
+    print("Looking for login inputs/iframe (may take a few seconds)...")
+    login_ctx, where = get_login_context(page, timeout_ms=30000)
+    if not login_ctx:
+        print("  ⚠ Could not find login inputs. See frames above or open browser DevTools.")
+        raise RuntimeError("Login iframe or inputs not found")
+    print(f"Login inputs found in: {where}")
+    print("Filling login credentials...")
+    safe_fill(login_ctx, "#s_swepi_1", config.get("USERNAME"))
+    safe_fill(login_ctx, "#s_swepi_2", config.get("PASSWORD"))
+
+    # Click login button
+    login_btns = ["#s_swepi_22", "#s_swepi_20", "input[type='submit']", "button[type='submit']"]
+    clicked = False
+    for b in login_btns:
+        try:
+            if login_ctx.query_selector(b):
+                print(f"Clicking login button selector: {b}")
+                if robust_click(page, selector=b):
+                    clicked = True
+                    break
+        except Exception:
+            continue
+    if not clicked:
+        for t in ["Sign In", "Log In", "Login"]:
+            if robust_click(page, by_text=t):
+                clicked = True
+                break
+    if not clicked:
+        print("  ⚠ Could not click login button automatically. Please click manually in the opened browser.")
+    else:
+        print("Login click attempted.")
+
+    # Wait for home to be ready (this is the added logic to avoid false failures)
+    print("Waiting for home page to become ready (may take up to {}s)...".format(HOME_MAX_WAIT))
+    ready = wait_for_home_ready(page, max_wait=HOME_MAX_WAIT, stable_seconds=HOME_STABLE_SECONDS, caller="login")
+    if not ready:
+        print("  ⚠ Home did not become ready in time; continuing but results may be flaky.")
+        save_debug(page, "home_not_ready")
+    else:
+        print("Home appears ready.")
+        save_success(page, "home_ready")
+    if ready and sessions and sess_key:
+        try:
+            sessions.save(sess_key, page.context.storage_state())
+        except Exception as e:
+            print(f"  ⚠ could not save session: {e}")
+
+def replay_action(page, idx, action, last_goto):
+    """Replay one recorded action; returns the last meaningful goto URL."""
+    sel = action.get("selector")
+    val = action.get("value")
+    a_type = action.get("type")
+
+    if a_type == "goto":
+        url = action.get("url")
+        if not url:
+            return last_goto
+        if url == last_goto:
+            print(f"Skipping duplicate goto: {url}")
+            return last_goto
+        if is_meaningful_goto(url):
+            try:
+                print(f"Performing meaningful goto: {url}")
+                with TRACER.span("act"):
+                    page.goto(url, timeout=60000, wait_until="domcontentloaded")
+                last_goto = url
+                # wait for home-like readiness after each meaningful goto
+                if wait_for_home_ready(page, max_wait=30, stable_seconds=2, caller="goto"):
+                    save_success(page, "goto_success")
+                else:
+                    save_debug(page, "goto_partial")
+            except Exception as e:
+                print(f"  ⚠ goto failed: {e}")
+                save_debug(page, "goto_fail")
+        else:
+            print(f"Skipping noisy/irrelevant goto: {url}")
+        if HOME_READY_MODE != "event":
+            time.sleep(1)
+        return last_goto
+
+    if not sel:
+        return last_goto
+
+    # generic tab/dropdown/navigation: now works with any tab text/value
+    if sel == "#j_s_sctrl_tabScreen" or (val and isinstance(val, str) and (("tab" in str(val).lower()) or "service" in str(val).lower() or len(str(val).strip())>0)):
+        # We allow any recorded val to be used as text — this generalizes it for any tab
+        print(f"Attempting generic tab/navigation for action #{idx}: sel={sel} val={val}")
+        with TRACER.span("act"):
+            ok = click_siebel_tab(page, action)
+        if ok:
+            # wait for page/app to settle and take success screenshot
+            if wait_for_home_ready(page, max_wait=30, stable_seconds=2, caller="tab"):
+                save_success(page, f"tab_success_{idx}")
+            else:
+                save_debug(page, f"tab_maybe_{idx}")
+        else:
+            print("Navigation attempt failed; saving debug artifacts.")
+            save_debug(page, f"tab_fail_{idx}")
+        if HOME_READY_MODE != "event":
+            page.wait_for_timeout(1000)
+        return last_goto
+
+    # fill / click / select actions (frame-aware)
+    if a_type == "fill":
+        ctx, handle = find_frame_containing(page, sel)
+        if ctx and handle:
+            with TRACER.span("act"):
+                safe_fill(ctx, sel, val)
+        else:
+            print(f"  ⚠ fill target not found for selector {sel}")
+    elif a_type == "click":
+        print(f"Clicking selector: {sel}")
+        with TRACER.span("act"):
+            clicked = robust_click(page, selector=sel)
+        if not clicked:
+            print(f"  ⚠ click failed for {sel}")
+            save_debug(page, "click_fail")
+        else:
+            # on success, capture screenshot to mark pass
+            save_success(page, f"click_success_{idx}")
+    elif a_type == "select":
+        ctx, handle = find_frame_containing(page, sel)
+        if ctx and handle:
+            try:
+                with TRACER.span("act"):
+                    handle.select_option(val)
+                save_success(page, f"select_success_{idx}")
+            except Exception:
+                print(f"  ⚠ select_option failed for {sel}, trying robust_click")
+                if robust_click(page, selector=sel):
+                    save_success(page, f"select_click_success_{idx}")
+                else:
+                    save_debug(page, f"select_fail_{idx}")
+        else:
+            print(f"  ⚠ select target not found for selector {sel}")
+    else:
+        print(f"  ⚠ Unknown/unsupported action type: {a_type} - skipping")
+
+    time.sleep(0.5)
+    return last_goto
+
 # ---------- main flow ----------
 def run_all():
     actions = load_actions()
     config = load_config()
     Path(REPORT_DIR).mkdir(parents=True, exist_ok=True)
+    TRACER.start_root("suite", **{"siebel.actions_file": ACTIONS_FILE})
+    run_metrics.serve(METRICS_PORT)
+    t_suite = time.perf_counter()
 
     with sync_playwright() as pw:
-        browser = pw.chromium.launch(headless=False, args=["--ignore-certificate-errors"])
-        context = browser.new_context(ignore_https_errors=True)
-        page = context.new_page()
+        browser = launch_browser(pw, args=["--ignore-certificate-errors"])
 
         # --- navigate to login page ---
         login_action = next((a for a in actions if a.get("type") == "fill" and a.get("selector") == "#s_swepi_1"), None)
@@ -378,141 +870,72 @@ def run_all():
             login_url = login_action.get("pageUrl")
         elif goto_action and goto_action.get("url"):
             login_url = goto_action.get("url")
+
+        # a saved session for this user/app skips the login form and home wait
+        sessions = SessionCache(Path(REPORT_DIR) / ".session_cache", ttl_sec=SESSION_TTL_SEC) if SESSION_REUSE else None
+        sess_key = SessionCache.key(login_url, {"user": config.get("USERNAME")}) if sessions and login_url else None
+        state = sessions.load(sess_key) if sess_key else None
+        if state:
+            context = browser.new_context(ignore_https_errors=True, storage_state=state)
+        else:
+            context = browser.new_context(ignore_https_errors=True)
+        run_metrics.context_opened()
+        page = context.new_page()
+        page_activity(page)  # start tracking navigation/network for readiness
+        trace_route = None
+        if TRACE_PROPAGATE and TRACER.enabled and login_url:
+            # server-side spans of each action's requests join its trace
+            trace_route = TraceparentRoute(login_url)
+            page.route(trace_route.pattern, trace_route.handle)
         if login_url:
             print(f"Navigating to login page: {login_url}")
             page.goto(login_url, timeout=60000, wait_until="domcontentloaded")
 
-        # --- find login context and fill ---
-        print("Looking for login inputs/iframe (may take a few seconds)...")
-        login_ctx, where = get_login_context(page, timeout_ms=30000)
-        if not login_ctx:
-            print("  ⚠ Could not find login inputs. See frames above or open browser DevTools.")
-            raise RuntimeError("Login iframe or inputs not found")
-        print(f"Login inputs found in: {where}")
-        print("Filling login credentials...")
-        safe_fill(login_ctx, "#s_swepi_1", config.get("USERNAME"))
-        safe_fill(login_ctx, "#s_swepi_2", config.get("PASSWORD"))
-
-        # Click login button
-        login_btns = ["#s_swepi_22", "#s_swepi_20", "input[type='submit']", "button[type='submit']"]
-        clicked = False
-        for b in login_btns:
-            try:
-                if login_ctx.query_selector(b):
-                    print(f"Clicking login button selector: {b}")
-                    if robust_click(page, selector=b):
-                        clicked = True
-                        break
-            except Exception:
-                continue
-        if not clicked:
-            for t in ["Sign In", "Log In", "Login"]:
-                if robust_click(page, by_text=t):
-                    clicked = True
-                    break
-        if not clicked:
-            print("  ⚠ Could not click login button automatically. Please click manually in the opened browser.")
-        else:
-            print("Login click attempted.")
-
-        # Wait for home to be ready (this is the added logic to avoid false failures)
-        print("Waiting for home page to become ready (may take up to {}s)...".format(HOME_MAX_WAIT))
-        ready = wait_for_home_ready(page, max_wait=HOME_MAX_WAIT, stable_seconds=HOME_STABLE_SECONDS)
-        if not ready:
-            print("  ⚠ Home did not become ready in time; continuing but results may be flaky.")
-            save_debug(page, "home_not_ready")
-        else:
-            print("Home appears ready.")
-            save_success(page, "home_ready")
+        restored = False
+        if state:
+            # let the page settle (home view, or the login form of an expired
+            # session), then one probe for the login fields decides
+            wait_for_home_ready(page, caller="restore")
+            if not probe_selectors(page, LOGIN_FIELDS):
+                print("Reusing saved session; login skipped.")
+                restored = True
+            else:
+                print("Saved session expired; logging in.")
+                sessions.invalidate(sess_key)
+
+        if not restored:
+            with TRACER.span("login"):
+                login(page, config, sessions, sess_key)
 
         # iterate actions but filter gotos
         last_goto = None
+        failed = False
         for idx, action in enumerate(actions):
-            sel = action.get("selector")
-            val = action.get("value")
-            a_type = action.get("type")
-
-            if a_type == "goto":
-                url = action.get("url")
-                if not url:
-                    continue
-                if url == last_goto:
-                    print(f"Skipping duplicate goto: {url}")
-                    continue
-                if is_meaningful_goto(url):
-                    try:
-                        print(f"Performing meaningful goto: {url}")
-                        page.goto(url, timeout=60000, wait_until="domcontentloaded")
-                        last_goto = url
-                        # wait for home-like readiness after each meaningful goto
-                        if wait_for_home_ready(page, max_wait=30, stable_seconds=2):
-                            save_success(page, "goto_success")
-                        else:
-                            save_debug(page, "goto_partial")
-                    except Exception as e:
-                        print(f"  ⚠ goto failed: {e}")
-                        save_debug(page, "goto_fail")
-                else:
-                    print(f"Skipping noisy/irrelevant goto: {url}")
-                time.sleep(1)
-                continue
-
-            if not sel:
-                continue
-
-            # generic tab/dropdown/navigation: now works with any tab text/value
-            if sel == "#j_s_sctrl_tabScreen" or (val and isinstance(val, str) and (("tab" in str(val).lower()) or "service" in str(val).lower() or len(str(val).strip())>0)):
-                # We allow any recorded val to be used as text — this generalizes it for any tab
-                print(f"Attempting generic tab/navigation for action #{idx}: sel={sel} val={val}")
-                ok = click_siebel_tab(page, action)
-                if ok:
-                    # wait for page/app to settle and take success screenshot
-                    if wait_for_home_ready(page, max_wait=30, stable_seconds=2):
-                        save_success(page, f"tab_success_{idx}")
-                    else:
-                        save_debug(page, f"tab_maybe_{idx}")
-                else:
-                    print("Navigation attempt failed; saving debug artifacts.")
-                    save_debug(page, f"tab_fail_{idx}")
-                page.wait_for_timeout(1000)
-                continue
-
-            # fill / click / select actions (frame-aware)
-            if a_type == "fill":
-                ctx, handle = find_frame_containing(page, sel)
-                if ctx and handle:
-                    safe_fill(ctx, sel, val)
-                else:
-                    print(f"  ⚠ fill target not found for selector {sel}")
-            elif a_type == "click":
-                print(f"Clicking selector: {sel}")
-                if not robust_click(page, selector=sel):
-                    print(f"  ⚠ click failed for {sel}")
-                    save_debug(page, "click_fail")
-                else:
-                    # on success, capture screenshot to mark pass
-                    save_success(page, f"click_success_{idx}")
-            elif a_type == "select":
-                ctx, handle = find_frame_containing(page, sel)
-                if ctx and handle:
-                    try:
-                        handle.select_option(val)
-                        save_success(page, f"select_success_{idx}")
-                    except Exception:
-                        print(f"  ⚠ select_option failed for {sel}, trying robust_click")
-                        if robust_click(page, selector=sel):
-                            save_success(page, f"select_click_success_{idx}")
-                        else:
-                            save_debug(page, f"select_fail_{idx}")
-                else:
-                    print(f"  ⚠ select target not found for selector {sel}")
-            else:
-                print(f"  ⚠ Unknown/unsupported action type: {a_type} - skipping")
-
-            time.sleep(0.5)
-
-        print("\n✅ Replay completed. Browser remains open for 5 minutes for manual checks.")
-        page.wait_for_timeout(5 * 60 * 1000)
+            with TRACER.span("action", **{"siebel.action_index": idx, "siebel.type": action.get("type") or "",
+                                          "siebel.selector": action.get("selector") or ""}) as span:
+                if trace_route is not None:
+                    trace_route.value = span.traceparent
+                t0, debug_saves = time.perf_counter(), DEBUG_SAVES
+                last_goto = replay_action(page, idx, action, last_goto)
+                status = "FAIL" if DEBUG_SAVES > debug_saves else "OK"
+                if status == "FAIL":
+                    span.fail("debug artifacts saved")
+                failed = failed or status == "FAIL"
+                run_metrics.observe_action(action.get("type") or "", action.get("selector"), status,
+                                           time.perf_counter() - t0)
+
+        flush_latency()
+        run_metrics.observe_row("FAIL" if failed else "PASS", time.perf_counter() - t_suite)
+        TRACER.close()
+        if TRACER.enabled:
+            print(f"Trace: {TRACER.exported} spans written to {TRACER.path}")
+        if default_headless():
+            print("\n✅ Replay completed.")
+        else:
+            print("\n✅ Replay completed. Browser remains open for 5 minutes for manual checks.")
+            page.wait_for_timeout(5 * 60 * 1000)
+        run_metrics.context_closed()
+        context.close()
         browser.close()
 
 if __name__ == "__main__":
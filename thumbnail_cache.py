@@ -0,0 +1,104 @@
+# thumbnail_cache.py
+"""
+On-disk cache of physically resized screenshots for the reports.
+
+The PDF only draws screenshots at PDF_THUMB_WIDTH / 420 px, but embedding the
+full-page PNG makes every page carry megabytes of pixels. ThumbnailCache writes a
+downscaled JPEG once per (screenshot, width) and hands back its path, so PDF
+builds, re-renders and any HTML report embed the small file instead.
+
+- key: absolute path + mtime + size of the source, and the target width; a
+  re-taken screenshot gets a new entry automatically
+- images are rendered at `density` x the drawn width (2x = crisp when printed)
+- prefetch() renders a batch on a thread pool; get() waits for a pending render
+  or renders inline
+- without Pillow every call returns the original path
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow ships with reportlab, but be defensive
+    Image = None
+
+class ThumbnailCache:
+    def __init__(self, cache_dir: Path, density: float = 2.0, quality: int = 80, workers: int = 4):
+        self.cache_dir = Path(cache_dir)
+        self.density = density
+        self.quality = quality
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbs")
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}   # cache key -> future of the render
+        self.hits = 0
+        self.generated = 0
+
+    def _key(self, path: str, width_px: int) -> Optional[str]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        raw = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{width_px}|{self.density}|{self.quality}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _render(self, path: str, width_px: int, out: Path) -> str:
+        target_w = max(1, int(width_px * self.density))
+        with Image.open(path) as im:
+            if im.width <= target_w:
+                return path   # already small enough, embed as-is
+            im = im.convert("RGB")
+            im.thumbnail((target_w, max(1, int(im.height * target_w / im.width))))
+            out.parent.mkdir(parents=True, exist_ok=True)
+            tmp = out.with_suffix(".tmp")
+            im.save(tmp, format="JPEG", quality=self.quality, optimize=True)
+        os.replace(tmp, out)   # atomic, so a crashed build never leaves half a thumbnail
+        with self._lock:
+            self.generated += 1
+        return str(out)
+
+    def _submit(self, path: str, width_px: int) -> Optional[Future]:
+        key = self._key(path, width_px)
+        if key is None:
+            return None
+        out = self.cache_dir / key[:2] / f"{key}.jpg"
+        with self._lock:
+            fut = self._pending.get(key)
+            if fut is not None:
+                return fut
+            if out.exists():
+                self.hits += 1
+                fut = Future()
+                fut.set_result(str(out))
+            else:
+                fut = self._pool.submit(self._render, path, width_px, out)
+            self._pending[key] = fut
+            return fut
+
+    def prefetch(self, paths: Iterable[Optional[str]], width_px: int):
+        """Start rendering thumbnails for `paths` in the background."""
+        if Image is None:
+            return
+        for p in paths:
+            if p:
+                self._submit(p, width_px)
+
+    def get(self, path: Optional[str], width_px: int) -> Optional[str]:
+        """Path of a file holding `path` downscaled for `width_px`; the original on any failure."""
+        if not path or Image is None:
+            return path
+        fut = self._submit(path, width_px)
+        if fut is None:
+            return path
+        try:
+            return fut.result()
+        except Exception:
+            return path
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        with self._lock:
+            self._pending.clear()
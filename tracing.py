@@ -0,0 +1,273 @@
+# tracing.py
+"""
+Span tracing for the runners, exported as OTLP/JSON.
+
+    suite -> row -> action -> phase (nav / wait / act / settle / ss_before / ss_after / report)
+
+Spans are buffered and appended to a local file, one OTLP/JSON
+ExportTraceServiceRequest ({"resourceSpans": [...]}) per line - the format the
+OpenTelemetry collector's file exporter writes and its otlpjsonfile receiver
+reads, so the file can be replayed into Jaeger / Tempo as-is. No OpenTelemetry
+SDK is needed.
+
+The current span lives in a contextvar (asyncio tasks inherit it); spans opened
+on a thread without one are parented to the tracer's root span (the suite), so
+worker threads need no plumbing. With propagation enabled, action spans are
+sent to the app under test (its origin only, see TraceparentRoute) as a W3C
+`traceparent` header, and oracle_demo/app.py logs its request spans with the
+same trace id and the action as parent.
+
+    python tracing.py dd_reports/<run>/trace.otlp.jsonl oracle_demo/traces.otlp.jsonl
+
+prints the slowest actions with their phases and the server time under each.
+"""
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+def _attr_value(v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}   # int64 is a string in OTLP/JSON
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": "" if v is None else str(v)}
+
+def otlp_attributes(attrs: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": k, "value": _attr_value(v)} for k, v in attrs.items()]
+
+class Span:
+    __slots__ = ("tracer", "name", "kind", "trace_id", "span_id", "parent_id", "start_ns", "end_ns",
+                 "attrs", "status", "message", "_token")
+
+    def __init__(self, tracer: Optional["Tracer"], name: str, trace_id: str, parent_id: str = "",
+                 kind: int = SPAN_KIND_INTERNAL, attrs: Optional[Dict[str, Any]] = None):
+        self.tracer = tracer
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attrs = dict(attrs or {})
+        self.status = 0
+        self.message = ""
+        self._token = None
+
+    @property
+    def traceparent(self) -> str:
+        """W3C trace context header value naming this span as the parent."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    @property
+    def ended(self) -> bool:
+        return self.end_ns != 0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        return self
+
+    def fail(self, message: str = ""):
+        self.status = STATUS_ERROR
+        self.message = message[:500]
+        return self
+
+    def end(self):
+        if self.ended:
+            return
+        self.end_ns = time.time_ns()
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:   # ended from another context; leave it to that one
+                pass
+            self._token = None
+        if self.tracer is not None:
+            self.tracer._finish(self)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        d = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": otlp_attributes(self.attrs),
+            "status": {"code": self.status, "message": self.message} if self.status else {},
+        }
+        if self.parent_id:
+            d["parentSpanId"] = self.parent_id
+        return d
+
+class Tracer:
+    """Buffers finished spans and appends them to `path` as OTLP/JSON lines.
+    With path=None the tracer is disabled and every span is a cheap no-op."""
+    def __init__(self, path: Optional[Path], service: str = "dd-runner", batch: int = 256,
+                 resource: Optional[Dict[str, Any]] = None):
+        self.path = Path(path) if path else None
+        self.enabled = self.path is not None
+        self.service = service
+        self.batch = batch
+        self.resource = {"service.name": service, **(resource or {})}
+        self.root: Optional[Span] = None
+        self._lock = threading.Lock()
+        self._buf: List[Span] = []
+        self.exported = 0
+
+    def start(self, name: str, parent: Optional[Span] = None, kind: int = SPAN_KIND_INTERNAL,
+              activate: bool = True, **attrs) -> Span:
+        """Open a span under `parent` (default: the current span, else the root).
+        An activated span is current until it ends."""
+        if not self.enabled:
+            return Span(None, name, "", attrs=None)
+        parent = parent or _current.get() or self.root
+        span = Span(self, name, parent.trace_id if parent else secrets.token_hex(16),
+                    parent.span_id if parent else "", kind, attrs)
+        if activate:
+            span._token = _current.set(span)
+        return span
+
+    def start_root(self, name: str, **attrs) -> Span:
+        """Open the suite span; spans on threads with no current span hang off it."""
+        self.root = self.start(name, parent=None, activate=True, **attrs)
+        return self.root
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[Span] = None, kind: int = SPAN_KIND_INTERNAL, **attrs):
+        span = self.start(name, parent, kind, **attrs)
+        try:
+            yield span
+        except BaseException as e:
+            span.fail(str(e))
+            raise
+        finally:
+            span.end()
+
+    def _finish(self, span: Span):
+        with self._lock:
+            self._buf.append(span)
+            full = len(self._buf) >= self.batch
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            spans, self._buf = self._buf, []
+            if not spans or not self.enabled:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            line = json.dumps({"resourceSpans": [{
+                "resource": {"attributes": otlp_attributes(self.resource)},
+                "scopeSpans": [{"scope": {"name": "tracing.py"}, "spans": [s.to_otlp() for s in spans]}],
+            }]})
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.exported += len(spans)
+
+    def close(self):
+        if self.root is not None:
+            self.root.end()
+        self.flush()
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+class TraceparentRoute:
+    """
+    Adds `traceparent` to requests for one origin only (the app under test).
+    page.set_extra_http_headers would send it everywhere, and a non-safelisted
+    header turns cross-origin XHRs into CORS preflights that third-party (or
+    Siebel) endpoints may reject. Install with page.route(r.pattern, r.handle),
+    or r.handle_async on the async API; set `value` per action.
+    """
+    def __init__(self, url: str):
+        m = re.match(r"^[a-z][a-z0-9+.-]*://[^/?#]+", url or "", re.I)
+        if not m:
+            raise ValueError(f"no origin in {url!r}")
+        self.pattern = m.group(0) + "/**"
+        self.value = ""
+
+    def _headers(self, request) -> Dict[str, str]:
+        return {**request.headers, "traceparent": self.value}
+
+    def handle(self, route, request):
+        if self.value:
+            route.continue_(headers=self._headers(request))
+        else:
+            route.continue_()
+
+    async def handle_async(self, route, request):
+        if self.value:
+            await route.continue_(headers=self._headers(request))
+        else:
+            await route.continue_()
+
+def parse_traceparent(header: Optional[str]):
+    """(trace_id, parent_span_id) from a W3C traceparent header, or (None, None)."""
+    parts = (header or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None, None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None, None
+    return parts[1], parts[2]
+
+# ---------- offline summary ----------
+
+def load_spans(paths) -> List[Dict[str, Any]]:
+    spans = []
+    for p in paths:
+        with open(p, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                for rs in json.loads(line).get("resourceSpans", []):
+                    service = next((a["value"].get("stringValue") for a in rs.get("resource", {}).get("attributes", [])
+                                    if a["key"] == "service.name"), "")
+                    for ss in rs.get("scopeSpans", []):
+                        for s in ss.get("spans", []):
+                            s["service"] = service
+                            s["ms"] = (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6
+                            spans.append(s)
+    return spans
+
+def summarize(paths, top: int = 10):
+    """Print the slowest action spans, their phases and the server spans below them."""
+    spans = load_spans(paths)
+    children: Dict[str, List[Dict[str, Any]]] = {}
+    for s in spans:
+        children.setdefault(s.get("parentSpanId", ""), []).append(s)
+    actions = sorted((s for s in spans if s["name"] == "action"), key=lambda s: s["ms"], reverse=True)
+    for a in actions[:top]:
+        attrs = {x["key"]: next(iter(x["value"].values())) for x in a.get("attributes", [])}
+        server_ms = sum(c["ms"] for c in children.get(a["spanId"], []) if c["kind"] == SPAN_KIND_SERVER)
+        print(f"{a['ms']:8.1f} ms  action {attrs.get('dd.action_index', '?')} {attrs.get('dd.type', '')} "
+              f"{attrs.get('dd.selector', '')}  (server {server_ms:.1f} ms, trace {a['traceId']})")
+        for c in sorted(children.get(a["spanId"], []), key=lambda s: int(s["startTimeUnixNano"])):
+            print(f"           {c['ms']:8.1f} ms  {c['service']}: {c['name']}")
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2:
+        print("usage: python tracing.py TRACE_FILE [TRACE_FILE ...]")
+        sys.exit(2)
+    summarize(sys.argv[1:], top=int(os.environ.get("TRACE_TOP", "10")))